@@ -0,0 +1,126 @@
+"""
+Compares the HTML extractors on speed and on the quality of the snippets cherry picked from their output.
+
+The pages are listed in a JSON lines file, one page per line:
+    {"source": "https://... or path/to/page.html", "question": "...", "answer": "optional expected answer"}
+
+Usage:
+    PYTHONPATH=src python benchmarks/html_extractors.py pages.jsonl [--config research_config.yaml] [--repeat 3]
+
+For each extractor, it reports the median conversion time, the size of the extracted text, the number of chunks
+embedded by the cherry picker, the embedding time, the average similarity of the picked snippets to the question and,
+when an answer is given, the share of pages whose answer is found in the picked snippets.
+"""
+
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+from common.cherry_picker import CherryPicker
+from common.config import Configuration
+from common.semantic_similarity import SemanticSimilarityScorer
+from utils.url_utils import HTML_EXTRACTORS, download_page, html_to_markdown
+
+
+def load_html(source: str) -> str:
+    if source.startswith(("http://", "https://")):
+        return download_page(url=source).text
+    return Path(source).read_text(encoding="utf-8", errors="replace")
+
+
+def benchmark_extractor(
+    extractor: str,
+    pages: list[dict],
+    cherry_picker: CherryPicker,
+    repeat: int,
+) -> dict:
+    conversion_times, text_lengths, chunk_counts, embedding_times = [], [], [], []
+    snippet_similarities, answers_found = [], []
+    for page in pages:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            text = html_to_markdown(page["html"], extractor=extractor)
+            timings.append(time.perf_counter() - start)
+        conversion_times.append(statistics.median(timings))
+        text_lengths.append(len(text))
+        chunk_counts.append(len(cherry_picker.chunk_raw_text(text)))
+
+        start = time.perf_counter()
+        snippets = cherry_picker.cherry_pick(question=page["question"], text=text)
+        embedding_times.append(time.perf_counter() - start)
+        snippets = snippets if isinstance(snippets, list) else snippets.split("\n\n")
+        snippets = [snippet for snippet in snippets if snippet.strip()]
+        if snippets:
+            snippet_similarities.append(
+                statistics.mean(
+                    cherry_picker.similarity_scorer.compute_similarities(
+                        query=page["question"], docs=snippets
+                    )
+                )
+            )
+        if page.get("answer"):
+            answers_found.append(
+                any(page["answer"].lower() in snippet.lower() for snippet in snippets)
+            )
+
+    return {
+        "extractor": extractor,
+        "conversion_ms": 1_000 * statistics.mean(conversion_times),
+        "text_chars": statistics.mean(text_lengths),
+        "chunks": statistics.mean(chunk_counts),
+        "cherry_pick_ms": 1_000 * statistics.mean(embedding_times),
+        "snippet_similarity": (
+            statistics.mean(snippet_similarities) if snippet_similarities else 0.0
+        ),
+        "answer_recall": (
+            statistics.mean(answers_found) if answers_found else float("nan")
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("pages", type=Path, help="JSON lines file of the pages")
+    parser.add_argument("--config", type=Path, default=Path("research_config.yaml"))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    config = Configuration.from_yaml(args.config)
+    scorer = SemanticSimilarityScorer(
+        batch_size=config.semantic_similarity.batch_size,
+        max_length=config.semantic_similarity.max_length,
+        model_name=config.semantic_similarity.model_name,
+        backend=config.semantic_similarity.backend,
+        max_tokens_per_batch=config.semantic_similarity.max_tokens_per_batch,
+    )
+    cherry_picker = CherryPicker(
+        similarity_scorer=scorer,
+        chunk_size=config.snippet_extraction.chunk_size,
+        n_snippets=config.snippet_extraction.num_snippets,
+        snippets_length=config.snippet_extraction.snippet_length,
+    )
+
+    with open(args.pages, "r", encoding="utf-8") as f:
+        pages = [json.loads(line) for line in f if line.strip()]
+    for page in pages:
+        page["html"] = load_html(page["source"])
+    scorer.load()
+
+    print(
+        f"{'extractor':<14}{'conv ms':>10}{'chars':>10}{'chunks':>9}"
+        f"{'pick ms':>10}{'snip sim':>10}{'recall':>8}"
+    )
+    for extractor in HTML_EXTRACTORS:
+        result = benchmark_extractor(extractor, pages, cherry_picker, args.repeat)
+        print(
+            f"{result['extractor']:<14}{result['conversion_ms']:>10.1f}{result['text_chars']:>10.0f}"
+            f"{result['chunks']:>9.0f}{result['cherry_pick_ms']:>10.1f}"
+            f"{result['snippet_similarity']:>10.3f}{result['answer_recall']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,72 @@
 import math
+from typing import Optional
 
+import numpy as np
+
+from common.chunk_store import ChunkedDocument, ChunkStore
+from common.chunking import Chunk, chunk_fixed, chunk_structural
+from common.research_corpus import ResearchCorpus
 from common.semantic_similarity import SemanticSimilarityScorer
+from common.types import ChunkingStrategy
+from common.vector_store import Passage, VectorStore
+
+
+def select_top_windows(
+    scores: list[float], window_size: int, n_windows: int, min_score: float
+) -> list[int]:
+    """
+    Selects the start indices of the best scoring non-overlapping windows of consecutive scores.
+
+    Window averages are computed once for all windows. Windows are then picked greedily by masked argmax,
+    the best remaining window first, until `n_windows` are selected or no remaining window scores above `min_score`.
+    A window containing a non finite score (e.g. a masked chunk) is never selected.
+
+    Args:
+        scores (list[float]): The score of each element, of length >= window_size.
+        window_size (int): Number of consecutive elements in a window.
+        n_windows (int): Maximum number of windows to select.
+        min_score (float): A window is only selected if its average score is strictly above this threshold.
+
+    Returns:
+        list[int]: The start indices of the selected windows, in selection order.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    invalid = ~np.isfinite(scores)
+    scores = np.where(invalid, 0.0, scores)
+    n_candidates = len(scores) - window_size + 1
+
+    # Accumulate the window sums left to right with Neumaier compensation, one vectorized pass per position in
+    # the window. This is the summation used by the builtin `sum` since Python 3.12, so window averages (and ties
+    # between equal windows, e.g. repeated boilerplate chunks) are bit-identical to a per-window `sum()`.
+    window_sums = np.zeros(n_candidates)
+    compensation = np.zeros(n_candidates)
+    for offset in range(window_size):
+        values = scores[offset : offset + n_candidates]
+        partial_sums = window_sums + values
+        compensation += np.where(
+            np.abs(window_sums) >= np.abs(values),
+            (window_sums - partial_sums) + values,
+            (values - partial_sums) + window_sums,
+        )
+        window_sums = partial_sums
+    window_scores = (window_sums + compensation) / window_size
+
+    invalid_prefix = np.concatenate(([0], np.cumsum(invalid)))
+    window_scores[
+        (invalid_prefix[window_size:] - invalid_prefix[:-window_size]) > 0
+    ] = -np.inf
+
+    starts = []
+    for _ in range(n_windows):
+        best_start = int(np.argmax(window_scores))
+        if not window_scores[best_start] > min_score:
+            break
+        starts.append(best_start)
+        # Mask every window overlapping the selected one so its elements are not reused
+        window_scores[
+            max(0, best_start - window_size + 1) : best_start + window_size
+        ] = -np.inf
+    return starts
 
 
 class CherryPicker:
@@ -13,30 +79,88 @@ class CherryPicker:
         n_snippets: int = 10,
         snippets_length: int = 400,
         min_similarity: float = 0.1,
+        chunking: ChunkingStrategy = ChunkingStrategy.FIXED,
+        max_chunk_size: Optional[int] = None,
+        chunk_overlap: int = 0,
+        lexical_prefilter_top_k: Optional[int] = None,
+        chunk_store: Optional[ChunkStore] = None,
+        vector_store: Optional[VectorStore] = None,
+        corpus: Optional[ResearchCorpus] = None,
     ):
         self.similarity_scorer = similarity_scorer
         self.chunk_size = chunk_size
         self.n_snippets = n_snippets
         self.snippets_length = snippets_length
         self.min_similarity = min_similarity
+        self.chunking = chunking
+        self.max_chunk_size = max_chunk_size or 2 * chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.lexical_prefilter_top_k = lexical_prefilter_top_k
+        self.chunk_store = chunk_store
+        self.vector_store = vector_store
+        self.corpus = corpus
+
+    def chunk_text(self, text: str) -> list[Chunk]:
+        if self.chunking == ChunkingStrategy.STRUCTURAL:
+            return chunk_structural(
+                text,
+                target_size=self.chunk_size,
+                max_size=self.max_chunk_size,
+                overlap=self.chunk_overlap,
+            )
+        return chunk_fixed(text, chunk_size=self.chunk_size)
 
     def chunk_raw_text(self, text: str) -> list[str]:
-        return [
-            text[idx : idx + self.chunk_size]
-            for idx in range(0, len(text), self.chunk_size)
+        return [chunk.text for chunk in self.chunk_text(text)]
+
+    def get_candidate_chunks(
+        self, question: str, document: ChunkedDocument, window_size: int
+    ) -> np.ndarray:
+        """
+        Ranks the chunks against the question with BM25 and keeps the `lexical_prefilter_top_k` best ones, along with
+        their neighbors in every window containing them, so that those windows can be fully scored.
+
+        Returns:
+            np.ndarray: The sorted indices of the candidate chunks. All the chunks are candidates when the prefilter is
+                disabled, when there are not more chunks than candidates or when no chunk shares a term with the
+                question.
+        """
+        all_indices = np.arange(len(document))
+        if (
+            self.lexical_prefilter_top_k is None
+            or len(document) <= self.lexical_prefilter_top_k
+        ):
+            return all_indices
+
+        lexical_scores = document.lexical_index.score(question)
+        n_matches = int(np.count_nonzero(lexical_scores))
+        if n_matches == 0:
+            return all_indices
+        top_indices = np.argsort(-lexical_scores, kind="stable")[
+            : min(self.lexical_prefilter_top_k, n_matches)
         ]
 
+        # Mark the ranges [idx - window_size + 1, idx + window_size) around the top chunks
+        range_bounds = np.zeros(len(document) + 1, dtype=np.int64)
+        np.add.at(range_bounds, np.maximum(top_indices - window_size + 1, 0), 1)
+        np.add.at(
+            range_bounds, np.minimum(top_indices + window_size, len(document)), -1
+        )
+        return np.flatnonzero(np.cumsum(range_bounds[:-1]) > 0)
+
     def cherry_pick(
         self,
         question: str,
         text: str,
-    ):
+    ) -> str:
         """
         Selects the most relevant text snippets from a given text based on similarity w.r.t the question.
-        - Splits the input text into chunks.
-        - Computes semantic similarity between the question and each chunk using the similarity scorer.
-        - Slides a window over the similarity scores to identify high-scoring spans.
-        - Picks the top N most relevant snippets that exceed a similarity threshold.
+        - Splits the input text into chunks, fixed size windows or structural chunks depending on `chunking`.
+        - Computes semantic similarity between the question and each chunk using the similarity scorer. With
+          `lexical_prefilter_top_k`, only the best chunks according to BM25 and their neighbors are scored, the others
+          are left out of the selection.
+        - Scores every window of consecutive chunks by its average similarity to identify high-scoring spans.
+        - Picks the top N most relevant non-overlapping snippets that exceed a similarity threshold.
 
         Args:
             question (str): The question used to assess relevance.
@@ -45,40 +169,118 @@ class CherryPicker:
         Returns:
             str: A string containing the top-ranked non-overlapping snippets, separated by double newlines.
         """
+        return self.cherry_pick_many(questions=[question], text=text)[0]
+
+    def cherry_pick_many(
+        self, questions: list[str], text: str, source: Optional[str] = None
+    ) -> list[str]:
+        """
+        Selects the most relevant text snippets of a text for each of the questions, as `cherry_pick` does for a
+        single question.
+
+        The text is chunked and its chunks are encoded once for all the questions, and the chunks encoded for
+        previous calls are reused from the chunk store, if any. All the questions are then scored against the chunks
+        in a single matrix product. The encoded chunks are added to the vector store, if any, to be retrieved later
+        for other questions, and the text along with its encoded chunks to the corpus, if any, to be searched in later
+        sessions.
+
+        Args:
+            questions (list[str]): The questions used to assess relevance.
+            text (str): The raw text from which to extract relevant snippets.
+            source (Optional[str]): The URL of the text, the chunks are only added to the vector store and the corpus
+                with a source.
+
+        Returns:
+            list[str]: For each question, the top-ranked non-overlapping snippets, separated by double newlines.
+        """
         chunks_per_snippet = math.ceil(self.snippets_length / self.chunk_size)
-        chunks = self.chunk_raw_text(text=text)
+        document = (
+            self.chunk_store.get_or_chunk(text, chunk_text=self.chunk_text)
+            if self.chunk_store is not None
+            else ChunkedDocument(chunks=self.chunk_text(text))
+        )
 
         # If not enough chunks for even one snippet, return the full text once
-        if len(chunks) < chunks_per_snippet:
-            snippet = text[: self.snippets_length]
-            return [snippet]
+        if len(document) < chunks_per_snippet:
+            return [text[: self.snippets_length]] * len(questions)
+
+        candidates = [
+            self.get_candidate_chunks(
+                question=question, document=document, window_size=chunks_per_snippet
+            )
+            for question in questions
+        ]
+        candidate_indices = np.unique(np.concatenate(candidates))
 
-        # Eval semantic similarity w.r.t the question
-        similarities = self.similarity_scorer.compute_similarities(
-            query=question, docs=chunks
+        # Eval semantic similarity w.r.t the questions, the chunks are encoded once for all the questions
+        chunk_embeddings = document.get_embeddings(
+            candidate_indices, encode=self.similarity_scorer.encode_passages
         )
+        if self.vector_store is not None and source is not None:
+            self.vector_store.add(
+                chunk_embeddings,
+                passages=[
+                    Passage(
+                        source=source,
+                        text=document.chunks[idx].text,
+                        start=document.chunks[idx].start,
+                        end=document.chunks[idx].end,
+                    )
+                    for idx in candidate_indices
+                ],
+            )
+        if self.corpus is not None and source is not None:
+            self.corpus.add(
+                url=source,
+                text=text,
+                chunks=[document.chunks[idx] for idx in candidate_indices],
+                embeddings=chunk_embeddings,
+            )
+        question_embeddings = self.similarity_scorer.encode_queries(questions)
+        candidate_similarities = question_embeddings @ chunk_embeddings.T
+
+        snippets_per_question = []
+        for question_idx, question_candidates in enumerate(candidates):
+            # Chunks not scored are masked, the windows containing them are never selected
+            similarities = np.full(len(document), -np.inf)
+            similarities[candidate_indices] = candidate_similarities[question_idx]
+            is_candidate = np.zeros(len(document), dtype=bool)
+            is_candidate[question_candidates] = True
+            similarities[~is_candidate] = -np.inf
+            snippets_per_question.append(
+                self.select_snippets(
+                    text=text,
+                    chunks=document.chunks,
+                    similarities=similarities,
+                    chunks_per_snippet=chunks_per_snippet,
+                )
+            )
+        return snippets_per_question
 
+    def select_snippets(
+        self,
+        text: str,
+        chunks: list[Chunk],
+        similarities: np.ndarray,
+        chunks_per_snippet: int,
+    ) -> str:
         snippets = []
-        for _ in range(0, self.n_snippets):
-            best_start_index = 0
-            best_score = -math.inf
-
-            # Find the best snippet window based on average similarity
-            for j in range(0, len(similarities) - chunks_per_snippet + 1):
-                window_scores = similarities[j : j + chunks_per_snippet]
-                window_score = sum(window_scores) / len(window_scores)
-                if window_score > best_score:
-                    best_score = window_score
-                    best_start_index = j
-
-            snippet_start_idx = int(best_start_index * self.chunk_size)
-            snippet_end_idx = min(snippet_start_idx + self.snippets_length, len(text))
-
-            if best_score > self.min_similarity:
-                snippets.append(text[snippet_start_idx:snippet_end_idx])
-
-            # Mask used chunks so they're not reused in future iterations
-            for k in range(best_start_index, best_start_index + chunks_per_snippet):
-                similarities[k] = -math.inf
+        for best_start_index in select_top_windows(
+            scores=similarities,
+            window_size=chunks_per_snippet,
+            n_windows=self.n_snippets,
+            min_score=self.min_similarity,
+        ):
+            window = chunks[best_start_index : best_start_index + chunks_per_snippet]
+            snippet_start_idx = window[0].start
+            max_end_idx = snippet_start_idx + self.snippets_length
+            snippet_end_idx = min(window[-1].end, max_end_idx)
+            if self.chunking == ChunkingStrategy.STRUCTURAL:
+                # Structural chunks can be up to `max_chunk_size` long, so the window can exceed the snippet length:
+                # the snippet ends at the last chunk boundary within the length, or is cut if the first chunk is longer
+                chunk_ends = [chunk.end for chunk in window if chunk.end <= max_end_idx]
+                if len(chunk_ends) > 0:
+                    snippet_end_idx = chunk_ends[-1]
+            snippets.append(text[snippet_start_idx:snippet_end_idx])
 
         return "\n\n".join(snippets)
@@ -0,0 +1,93 @@
+import hashlib
+import threading
+from typing import Callable, Optional
+
+import numpy as np
+
+from common.chunking import Chunk
+from common.lexical import BM25
+from utils.lru_cache import LRUCache
+
+
+class ChunkedDocument:
+    """
+    The chunks of a document and their embeddings, encoded on demand.
+
+    The embeddings of the chunks do not depend on the question, once encoded they are reused to score the document
+    against any number of questions.
+    """
+
+    def __init__(self, chunks: list[Chunk]):
+        self.chunks = chunks
+        self.embeddings: Optional[np.ndarray] = None
+        self.is_encoded = np.zeros(len(chunks), dtype=bool)
+        self._lexical_index: Optional[BM25] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def texts(self) -> list[str]:
+        return [chunk.text for chunk in self.chunks]
+
+    @property
+    def lexical_index(self) -> BM25:
+        if self._lexical_index is None:
+            self._lexical_index = BM25(self.texts)
+        return self._lexical_index
+
+    def get_embeddings(
+        self,
+        indices: np.ndarray,
+        encode: Callable[[list[str]], np.ndarray],
+    ) -> np.ndarray:
+        """
+        Returns the embeddings of the chunks at `indices`, encoding only the chunks never encoded before.
+
+        Args:
+            indices (np.ndarray): The indices of the chunks.
+            encode (Callable[[list[str]], np.ndarray]): Encodes passages into embeddings of shape (n, hidden_dim).
+        """
+        with self._lock:
+            missing = indices[~self.is_encoded[indices]]
+            if len(missing) > 0:
+                missing_embeddings = encode([self.chunks[idx].text for idx in missing])
+                if self.embeddings is None:
+                    self.embeddings = np.zeros(
+                        (len(self.chunks), missing_embeddings.shape[1]),
+                        dtype=np.float32,
+                    )
+                self.embeddings[missing] = missing_embeddings
+                self.is_encoded[missing] = True
+            return self.embeddings[indices]
+
+
+class ChunkStore:
+    """
+    Per session store of the chunked documents, keyed by the hash of their text, so that a page visited again for
+    another question is neither chunked nor encoded again. The least recently used documents are evicted beyond
+    `max_documents`.
+    """
+
+    def __init__(self, max_documents: int = 256):
+        self._documents = LRUCache(max_size=max_documents)
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_or_chunk(
+        self, text: str, chunk_text: Callable[[str], list[Chunk]]
+    ) -> ChunkedDocument:
+        key = self.key(text)
+        document = self._documents.get(key)
+        if document is None:
+            document = ChunkedDocument(chunks=chunk_text(text))
+            self._documents.put(key, document)
+        return document
+
+    def clear(self) -> None:
+        self._documents.clear()
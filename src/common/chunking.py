@@ -0,0 +1,150 @@
+import re
+from dataclasses import dataclass
+
+# A markdown heading, ATX (# Title) or setext (Title followed by a line of = or -)
+_HEADING = re.compile(r"^(#{1,6}[ \t].*|.+\n[=-]{3,}[ \t]*)$", re.MULTILINE)
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n\s*")
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？])[\"')\]]*\s+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class Chunk:
+    """A chunk of a text, `text[start:end]` of the chunked text."""
+
+    text: str
+    start: int
+    end: int
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+
+def chunk_fixed(text: str, chunk_size: int) -> list[Chunk]:
+    """Splits the text into consecutive windows of `chunk_size` characters."""
+    return [
+        Chunk(
+            text=text[idx : idx + chunk_size],
+            start=idx,
+            end=min(idx + chunk_size, len(text)),
+        )
+        for idx in range(0, len(text), chunk_size)
+    ]
+
+
+def _split_spans(
+    text: str, start: int, end: int, pattern: re.Pattern
+) -> list[tuple[int, int]]:
+    spans = []
+    for match in pattern.finditer(text, start, end):
+        spans.append((start, match.start()))
+        start = match.end()
+    spans.append((start, end))
+    return spans
+
+
+def _strip_span(text: str, start: int, end: int) -> tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _split_words(
+    text: str, start: int, end: int, max_size: int
+) -> list[tuple[int, int]]:
+    """Splits a span longer than `max_size` at the last whitespace before the limit, or anywhere without whitespace."""
+    spans = []
+    while end - start > max_size:
+        cut = text.rfind(" ", start + 1, start + max_size + 1)
+        cut = cut if cut > start else start + max_size
+        spans.append((start, cut))
+        start = cut
+    spans.append((start, end))
+    return spans
+
+
+def _get_units(text: str, max_size: int) -> list[tuple[int, int, bool]]:
+    """
+    Splits the text into its smallest structural units, as (start, end, is_heading) spans: headings and paragraphs,
+    the paragraphs longer than `max_size` being split into sentences, and the sentences longer than `max_size` into
+    words.
+    """
+    blocks = []
+    position = 0
+    for heading in _HEADING.finditer(text):
+        blocks.extend(
+            (start, end, False)
+            for start, end in _split_spans(
+                text, position, heading.start(), _PARAGRAPH_BREAK
+            )
+        )
+        blocks.append((heading.start(), heading.end(), True))
+        position = heading.end()
+    blocks.extend(
+        (start, end, False)
+        for start, end in _split_spans(text, position, len(text), _PARAGRAPH_BREAK)
+    )
+
+    units = []
+    for block_start, block_end, is_heading in blocks:
+        block_start, block_end = _strip_span(text, block_start, block_end)
+        if block_start == block_end:
+            continue
+        if block_end - block_start <= max_size:
+            units.append((block_start, block_end, is_heading))
+            continue
+        for sentence_start, sentence_end in _split_spans(
+            text, block_start, block_end, _SENTENCE_END
+        ):
+            for start, end in _split_words(
+                text, sentence_start, sentence_end, max_size
+            ):
+                start, end = _strip_span(text, start, end)
+                if start < end:
+                    units.append((start, end, False))
+    return units
+
+
+def chunk_structural(
+    text: str, target_size: int, max_size: int, overlap: int = 0
+) -> list[Chunk]:
+    """
+    Splits the text on its structure: chunks are made of whole paragraphs, sentences or words, and start at headings.
+
+    Consecutive units are merged into a chunk until it reaches `target_size` characters, without ever exceeding
+    `max_size`, and a heading always starts a new chunk so that it stays with the section it introduces.
+    With `overlap`, each chunk also starts up to `overlap` characters before the end of the previous one, on a word
+    boundary.
+
+    Args:
+        text (str): The text to chunk.
+        target_size (int): The size (in characters) from which a chunk is complete.
+        max_size (int): The maximum size (in characters) of a chunk, before overlap.
+        overlap (int): The number of characters of the previous chunk repeated at the start of a chunk.
+
+    Returns:
+        list[Chunk]: The chunks, with their offsets in the text.
+    """
+    spans = []
+    for start, end, is_heading in _get_units(text, max_size=max_size):
+        if spans and not is_heading:
+            chunk_start, chunk_end = spans[-1]
+            if chunk_end - chunk_start < target_size and end - chunk_start <= max_size:
+                spans[-1] = (chunk_start, end)
+                continue
+        spans.append((start, end))
+
+    if overlap > 0:
+        for idx in range(len(spans) - 1, 0, -1):
+            start, end = spans[idx]
+            previous_start, previous_end = spans[idx - 1]
+            overlap_start = max(previous_start, previous_end - overlap)
+            # Start the overlap on a word boundary
+            word_match = _WHITESPACE.search(text, overlap_start, previous_end)
+            if overlap_start > previous_start and word_match is not None:
+                overlap_start = word_match.end()
+            spans[idx] = (min(overlap_start, start), end)
+
+    return [Chunk(text=text[start:end], start=start, end=end) for start, end in spans]
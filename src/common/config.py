@@ -3,9 +3,132 @@ from typing import Optional
 import yaml
 from pydantic import BaseModel, Field
 
+from common.types import (
+    ChunkingStrategy,
+    EmbeddingBackendType,
+    HtmlExtractorType,
+    QueryRewriteMode,
+    SearchProviderType,
+    SearchRouting,
+    VectorIndexType,
+)
 from llms import Provider
 
 
+class LLMCacheConfig(BaseModel):
+    enabled: bool = Field(
+        default=False,
+        description="Cache the LLM completions, a cache hit does not count against the token budget.",
+    )
+    cache_dir: Optional[str] = Field(
+        default=None,
+        description="Directory of the on-disk completion cache, shared across sessions. Completions are only cached in memory if not set.",
+    )
+    ttl_seconds: Optional[float] = Field(
+        default=None,
+        description="Time to live of a cached completion, in seconds. Completions never expire if not set.",
+    )
+    max_memory_entries: int = Field(
+        default=1_000,
+        description="Maximum number of completions kept in memory.",
+    )
+    max_disk_bytes: Optional[int] = Field(
+        default=None,
+        description="Maximum size of the on-disk cache, the least recently used completions are evicted first. Unbounded if not set.",
+    )
+    replay: bool = Field(
+        default=False,
+        description="Only serve completions from the cache and fail on a cache miss, e.g. to replay a previous run.",
+    )
+
+
+class HttpCacheConfig(BaseModel):
+    enabled: bool = Field(
+        default=False,
+        description="Cache the fetched pages on disk, shared across sessions.",
+    )
+    cache_dir: str = Field(
+        default=".cache/http",
+        description="Directory of the on-disk page cache.",
+    )
+    ttl_seconds: float = Field(
+        default=86_400,
+        description="Age in seconds under which a cached page is served without any request, older pages are revalidated with the server.",
+    )
+    negative_ttl_seconds: float = Field(
+        default=900,
+        description="Time in seconds during which a URL that failed to be fetched is not fetched again.",
+    )
+    max_disk_bytes: Optional[int] = Field(
+        default=None,
+        description="Maximum size of the page cache, the least recently used pages are evicted first. Unbounded if not set.",
+    )
+
+
+class VectorStoreConfig(BaseModel):
+    enabled: bool = Field(
+        default=False,
+        description=(
+            "Index the passages read during a research session, and recall the ones relevant to each question "
+            "before searching or visiting again."
+        ),
+    )
+    index: VectorIndexType = Field(
+        default=VectorIndexType.BRUTE_FORCE,
+        description="Search the passages by brute force, or with an IVF index once there are enough passages.",
+    )
+    n_lists: int = Field(
+        default=64,
+        description="Number of lists (clusters) of the IVF index.",
+    )
+    n_probe: int = Field(
+        default=8,
+        description="Number of lists of the IVF index scanned per query.",
+    )
+    max_bytes: Optional[int] = Field(
+        default=256_000_000,
+        description="Maximum memory used by the passages and their embeddings, no passage is added beyond. Unbounded if not set.",
+    )
+    recall_top_k: int = Field(
+        default=5,
+        description="Maximum number of passages recalled for a question.",
+    )
+    recall_min_similarity: float = Field(
+        default=0.8,
+        description="Minimum cosine similarity between a question and a passage for the passage to be recalled.",
+    )
+
+
+class CorpusConfig(BaseModel):
+    enabled: bool = Field(
+        default=False,
+        description=(
+            "Store the documents read and the embeddings of their chunks on disk, and search them as a local source "
+            "next to the web in the following sessions."
+        ),
+    )
+    directory: str = Field(
+        default=".cache/corpus",
+        description="Directory of the on-disk corpus.",
+    )
+    ttl_seconds: Optional[float] = Field(
+        default=None,
+        description="Age in seconds beyond which a document is no longer searched, and removed by the next compaction. Never expires if not set.",
+    )
+    compaction_ratio: float = Field(
+        default=0.5,
+        description="Share of dead chunks (of superseded or expired documents) from which the corpus is compacted when loaded.",
+    )
+    search_top_k: int = Field(
+        default=5,
+        description="Maximum number of documents of the corpus returned for a search query.",
+    )
+    search_min_similarity: float = Field(
+        default=0.8,
+        description="Minimum cosine similarity between a search query and a chunk for its document to be returned.",
+    )
+
+
 class ReflectStepConfig(BaseModel):
     max_decomposition_questions: Optional[int] = Field(
         default=3,
@@ -13,6 +136,16 @@ class ReflectStepConfig(BaseModel):
     )
 
 
+class RateLimitConfig(BaseModel):
+    requests_per_second: float = Field(
+        description="Sustained number of requests allowed per second.",
+    )
+    burst: int = Field(
+        default=1,
+        description="Maximum number of requests allowed at once when the limit has not been reached recently.",
+    )
+
+
 class SearchStepConfig(BaseModel):
     max_questions_to_search: Optional[int] = Field(
         default=3,
@@ -22,6 +155,48 @@ class SearchStepConfig(BaseModel):
         default=5,
         description="Top k search results for each question.",
     )
+    max_concurrent_searches: Optional[int] = Field(
+        default=1,
+        description="Maximum number of queries searched concurrently, 1 searches the queries one at a time.",
+    )
+    rate_limits: Optional[dict[str, RateLimitConfig]] = Field(
+        default_factory=lambda: {
+            "duckduckgo": RateLimitConfig(requests_per_second=0.5),
+            "google": RateLimitConfig(requests_per_second=1, burst=2),
+        },
+        description="Rate limit of each search engine (duckduckgo, google), shared by all the search steps and sessions of the process.",
+    )
+    query_rewrite_mode: Optional[QueryRewriteMode] = Field(
+        default=QueryRewriteMode.SEQUENTIAL,
+        description="How the search queries are rewritten: one LLM call per query (sequential), a single LLM call for all the queries (batched) or one LLM call per query, all in flight at once (concurrent).",
+    )
+    providers: list[SearchProviderType] = Field(
+        default_factory=lambda: [
+            SearchProviderType.DUCKDUCKGO,
+            SearchProviderType.GOOGLE,
+        ],
+        description="Search providers the queries are routed to: duckduckgo, google or local_index.",
+    )
+    routing: SearchRouting = Field(
+        default=SearchRouting.WEIGHTED,
+        description=(
+            "How the queries are routed to the providers: a single provider per query drawn according to the provider "
+            "weights (weighted), the providers in order until one returns results (failover), or all the providers "
+            "at once with their results merged (parallel)."
+        ),
+    )
+    provider_weights: dict[str, float] = Field(
+        default_factory=dict,
+        description="Weight of each provider for the weighted routing, 1 for the providers not listed.",
+    )
+    seed: Optional[int] = Field(
+        default=None,
+        description="Seed of the weighted routing, reset at each research session. The routing is not reproducible if not set.",
+    )
+    local_index_dir: Optional[str] = Field(
+        default=None,
+        description="Directory of the HTML, markdown and text files searched by the local_index provider. The visit step only reads the local files under it.",
+    )
 
 
 class VisitStepConfig(BaseModel):
@@ -29,6 +204,53 @@ class VisitStepConfig(BaseModel):
         default=5,
         description="Maximum number of urls to visit.",
     )
+    max_concurrent_requests: Optional[int] = Field(
+        default=1,
+        description="Maximum number of urls fetched concurrently in a visit step, 1 visits the urls one at a time.",
+    )
+    max_requests_per_host: Optional[int] = Field(
+        default=2,
+        description="Maximum number of concurrent requests sent to the same host.",
+    )
+    prefetch_top_n: Optional[int] = Field(
+        default=0,
+        description=(
+            "Number of top reranked urls fetched in the background while the agent picks its next action, "
+            "so that a visit finds them ready. 0 disables prefetching."
+        ),
+    )
+    prefetch_max_cached_pages: Optional[int] = Field(
+        default=16,
+        description="Maximum number of prefetched pages kept until a visit consumes them.",
+    )
+    prefetch_max_wasted_bytes: Optional[int] = Field(
+        default=20_000_000,
+        description=(
+            "Prefetching stops once the pages prefetched but never visited in a research reach this size. "
+            "The cap is approximate, the downloads in flight when it is reached are completed."
+        ),
+    )
+    max_page_bytes: Optional[int] = Field(
+        default=None,
+        description=(
+            "Maximum number of bytes read from a page, the download stops there and the page is truncated. "
+            "PDF files larger than this are skipped. Unbounded if not set."
+        ),
+    )
+    cherry_pick_user_query: bool = Field(
+        default=False,
+        description=(
+            "Also cherry pick the snippets relevant to the user query from the pages visited for a sub-question, "
+            "the page is encoded once for both questions."
+        ),
+    )
+    html_extractor: HtmlExtractorType = Field(
+        default=HtmlExtractorType.MARKDOWNIFY,
+        description=(
+            "How HTML pages are converted to text: markdownify converts the whole page, main_content only keeps "
+            "the main content and drops the navigation, footers, scripts, banners and other boilerplate."
+        ),
+    )
 
 
 class AnswerStepConfig(BaseModel):
@@ -36,6 +258,27 @@ class AnswerStepConfig(BaseModel):
         default=2,
         description="Maximum number of failed answer generation attempts before aborting.",
     )
+    concurrent_evaluation: Optional[bool] = Field(
+        default=False,
+        description="Run all the answer evaluation metrics concurrently instead of one after the other.",
+    )
+
+
+class QueryDeduplicationConfig(BaseModel):
+    semantic_fast_path: bool = Field(
+        default=False,
+        description="Deduplicate the queries with their embeddings first, and only ask the LLM about the ambiguous ones.",
+    )
+    duplicate_threshold: float = Field(
+        default=0.97,
+        description="Cosine similarity from which two queries are duplicates without asking the LLM. "
+        "Calibrated for e5 models, whose cosine similarities lie between 0.7 and 1.",
+    )
+    distinct_threshold: float = Field(
+        default=0.9,
+        description="Cosine similarity under which two queries are distinct without asking the LLM. "
+        "Calibrated for e5 models, whose cosine similarities lie between 0.7 and 1.",
+    )
 
 
 class SnippetExtractionConfig(BaseModel):
@@ -54,11 +297,82 @@ class SnippetExtractionConfig(BaseModel):
         default=0.3,
         description="Minimum cosine similarity threshold required for a snippet to be included.",
     )
+    chunking: ChunkingStrategy = Field(
+        default=ChunkingStrategy.FIXED,
+        description=(
+            "How documents are chunked: fixed cuts windows of chunk_size characters, structural splits on headings, "
+            "paragraphs and sentences and merges them into chunks of about chunk_size characters."
+        ),
+    )
+    max_chunk_size: Optional[int] = Field(
+        default=None,
+        description="Maximum size (in characters) of a structural chunk. Twice the chunk size if not set.",
+    )
+    chunk_overlap: int = Field(
+        default=0,
+        description="Number of characters of the previous structural chunk repeated at the start of a chunk.",
+    )
+    lexical_prefilter_top_k: Optional[int] = Field(
+        default=None,
+        description=(
+            "Number of chunks ranked best by BM25 against the question that are scored by the embedding model, "
+            "along with their neighbors. All the chunks are scored if not set."
+        ),
+    )
+    chunk_store_max_documents: int = Field(
+        default=0,
+        description=(
+            "Maximum number of chunked documents whose chunk embeddings are kept during a research session, so that "
+            "a page scored again for another question is not encoded again. 0 disables the store."
+        ),
+    )
 
 
 class SemanticSimilarityConfig(BaseModel):
     batch_size: int = Field(default=32, description="")
     max_length: int = Field(default=512, description="")
+    model_name: str = Field(
+        default="intfloat/multilingual-e5-small",
+        description="Name or path of the embedding model used to score semantic similarity.",
+    )
+    cache_size: int = Field(
+        default=0,
+        description="Maximum number of embeddings kept in the in-memory cache, 0 disables the in-memory tier.",
+    )
+    cache_dir: Optional[str] = Field(
+        default=None,
+        description="Directory of the on-disk embedding cache, shared across sessions. Disabled if not set.",
+    )
+    backend: EmbeddingBackendType = Field(
+        default=EmbeddingBackendType.TORCH,
+        description="Inference backend of the embedding model in (torch, onnx). The onnx backend needs the onnx extra.",
+    )
+    onnx_model_dir: str = Field(
+        default=".cache/onnx",
+        description="Directory where the ONNX export of the embedding model is stored and reused across sessions.",
+    )
+    quantize: bool = Field(
+        default=True,
+        description="Whether the onnx backend applies int8 dynamic quantization to the model weights.",
+    )
+    num_threads: Optional[int] = Field(
+        default=None,
+        description="Number of threads used by the onnx backend per inference, defaults to the number of cores.",
+    )
+    max_tokens_per_batch: Optional[int] = Field(
+        default=None,
+        description=(
+            "Token budget of a batch (inputs x longest input). If set, inputs are sorted by length and batched "
+            "under this budget to limit padding, otherwise they are batched by batch_size in their original order."
+        ),
+    )
+    parity_tolerance: Optional[float] = Field(
+        default=0.02,
+        description=(
+            "Maximum cosine distance allowed between the onnx and the torch embeddings on probe texts, "
+            "the torch backend is used if it is exceeded. Set to null to skip the check."
+        ),
+    )
 
 
 class Configuration(BaseModel):
@@ -74,6 +388,44 @@ class Configuration(BaseModel):
         default=50_000,
         description="Upper limit on the total number of tokens allowed for a full response context.",
     )
+    max_wall_clock_seconds: Optional[float] = Field(
+        default=None,
+        description=(
+            "Upper limit on the duration of a research in seconds. Search, visit and LLM calls are given timeouts "
+            "within the time left. Unlimited if not set."
+        ),
+    )
+    final_answer_time_share: float = Field(
+        default=0.15,
+        description="Share of max_wall_clock_seconds reserved for writing the final answer once time is nearly out.",
+    )
+    max_parallel_gaps: int = Field(
+        default=1,
+        description=(
+            "Maximum number of pending sub-questions researched concurrently, each with its own action. "
+            "1 researches them one at a time."
+        ),
+    )
+    max_concurrent_llm_calls: Optional[int] = Field(
+        default=4,
+        description="Maximum number of LLM calls in flight when independent calls are run concurrently.",
+    )
+    llm_cache: Optional[LLMCacheConfig] = Field(
+        default_factory=LLMCacheConfig,
+        description="Configuration options for the LLM completion cache.",
+    )
+    vector_store: Optional[VectorStoreConfig] = Field(
+        default_factory=VectorStoreConfig,
+        description="Configuration options for the session index of the passages read.",
+    )
+    http_cache: Optional[HttpCacheConfig] = Field(
+        default_factory=HttpCacheConfig,
+        description="Configuration options for the cache of the fetched pages.",
+    )
+    corpus: Optional[CorpusConfig] = Field(
+        default_factory=CorpusConfig,
+        description="Configuration options for the local corpus of the documents read across sessions.",
+    )
     reflect_step: Optional[ReflectStepConfig] = Field(
         default_factory=ReflectStepConfig,
         description="Configuration options for the Reflect Step.",
@@ -90,6 +442,10 @@ class Configuration(BaseModel):
         default_factory=AnswerStepConfig,
         description="Configuration options for the Answer Step.",
     )
+    query_deduplication: Optional[QueryDeduplicationConfig] = Field(
+        default_factory=QueryDeduplicationConfig,
+        description="Configuration options for the deduplication of the search queries and sub-questions.",
+    )
     top_k_urls_rerank: Optional[int] = Field(
         default=20,
         description="Top k relevant urls to include in the agent's context for the current question after reranking.",
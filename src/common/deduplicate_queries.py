@@ -1,13 +1,49 @@
 import json
+import re
+from typing import Optional
 
 from common.schemas import DeduplicateQueriesSchema
+from common.semantic_similarity import SemanticSimilarityScorer
 from llms.base_llm import BaseLLM
 from prompts.deduplicate_prompts import get_query_dedup_prompts
+from utils.logger import get_logger
+
+LOGGER = get_logger(__name__, step="OTHER")
+
+# The search operators changing the results of a query, see the operators listed in the LLM deduplication prompt
+_SEARCH_OPERATORS = re.compile(
+    r"""(?:^|(?<=\s))(?:"""
+    r"""[+-]?(?:site|filetype|ext|lang|loc|location|intitle|inbody|intext|inurl|allintitle|allintext|allinurl|"""
+    r"""before|after|related):\S+"""
+    r"""|[+-]\S+"""
+    r"""|"[^"]+")""",
+    re.IGNORECASE,
+)
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def get_search_operators(query: str) -> frozenset[str]:
+    """Returns the search operators of the query: site, file type, language filters, exact phrases, +/- terms..."""
+    return frozenset(
+        _normalize_query(operator) for operator in _SEARCH_OPERATORS.findall(query)
+    )
 
 
 class DeduplicateQueries:
-    def __init__(self, llm: BaseLLM):
+    def __init__(
+        self,
+        llm: BaseLLM,
+        similarity_scorer: Optional[SemanticSimilarityScorer] = None,
+        duplicate_threshold: float = 0.97,
+        distinct_threshold: float = 0.9,
+    ):
         self.llm = llm
+        self.similarity_scorer = similarity_scorer
+        self.duplicate_threshold = duplicate_threshold
+        self.distinct_threshold = distinct_threshold
 
     def dedup(
         self,
@@ -15,9 +51,74 @@ class DeduplicateQueries:
         queries: list[str],
     ) -> list[str]:
         queries = queries + new_queries
+        if self.similarity_scorer is not None:
+            return self.semantic_dedup(queries=queries)
+        return self.llm_dedup(queries=queries)
+
+    def llm_dedup(self, queries: list[str]) -> list[str]:
         dedup_queries_output = self.llm.complete(
             messages=get_query_dedup_prompts(queries=queries),
             response_format=DeduplicateQueriesSchema,
         )
 
         return json.loads(dedup_queries_output)["queries"]
+
+    def semantic_dedup(self, queries: list[str]) -> list[str]:
+        """
+        Deduplicates the queries with their embeddings first, and only escalates the ambiguous ones to the LLM.
+
+        Queries are visited in order and compared to the previously retained ones:
+        - identical (up to case and spacing) or with a cosine similarity >= `duplicate_threshold` to any of them, they are dropped,
+        - with a cosine similarity < `distinct_threshold` to all of them, they are kept,
+        - otherwise they are ambiguous, and the LLM decides on them, given the queries they are close to.
+        Queries with different search operators (e.g. `site:` or `filetype:`) search different results, they are never
+        compared: their embeddings are almost the same, the operators barely changing them.
+
+        Returns:
+            list[str]: The unique queries, in their original order.
+        """
+        first_occurrences = {}
+        for query in queries:
+            first_occurrences.setdefault(_normalize_query(query), query)
+        candidates = list(first_occurrences.values())
+        if len(candidates) <= 1:
+            return candidates
+
+        similarities = self.similarity_scorer.compute_pairwise_similarities(candidates)
+        operators = [get_search_operators(query) for query in candidates]
+        kept, ambiguous, ambiguous_neighbors = [], [], set()
+        for idx in range(len(candidates)):
+            previous = [j for j in kept + ambiguous if operators[j] == operators[idx]]
+            if any(similarities[idx, j] >= self.duplicate_threshold for j in previous):
+                continue
+            neighbors = [
+                j for j in previous if similarities[idx, j] >= self.distinct_threshold
+            ]
+            if len(neighbors) > 0:
+                ambiguous.append(idx)
+                ambiguous_neighbors.update(neighbors)
+            else:
+                kept.append(idx)
+
+        LOGGER.info(
+            "Semantic dedup of %d queries: %d kept, %d dropped, %d ambiguous",
+            len(queries),
+            len(kept),
+            len(candidates) - len(kept) - len(ambiguous),
+            len(ambiguous),
+        )
+        if len(ambiguous) > 0:
+            escalated = sorted(set(ambiguous) | ambiguous_neighbors)
+            unique_queries = {
+                _normalize_query(query)
+                for query in self.llm_dedup(
+                    queries=[candidates[idx] for idx in escalated]
+                )
+            }
+            kept += [
+                idx
+                for idx in ambiguous
+                if _normalize_query(candidates[idx]) in unique_queries
+            ]
+
+        return [candidates[idx] for idx in sorted(kept)]
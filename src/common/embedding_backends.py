@@ -0,0 +1,340 @@
+import hashlib
+import json
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from transformers import AutoModel, AutoTokenizer
+
+from common.types import EmbeddingBackendType
+from utils.logger import get_logger
+
+LOGGER = get_logger(__name__, step="OTHER")
+
+_PARITY_PROBE_TEXTS = [
+    "query: how does dynamic quantization affect embedding quality?",
+    "query: quelle est la capitale de l'Australie ?",
+    "passage: Canberra is the capital city of Australia, located in the Australian Capital Territory.",
+    "passage: The transformer architecture relies on self-attention to model dependencies between tokens, "
+    "without recurrence or convolutions.",
+    "passage: 2024年の世界経済は、インフレの鈍化と金利の高止まりが続いた。",
+]
+
+
+class EmbeddingBackend(ABC):
+    """Inference backend turning texts into mean pooled embeddings of an encoder model."""
+
+    def __init__(self, model_name: str, max_length: int = 512):
+        self.model_name = model_name
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    @property
+    def name(self) -> str:
+        return self.__class__.__name__
+
+    @property
+    @abstractmethod
+    def hidden_size(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def encode(
+        self, inputs: list[str], normalize_embeddings: bool = True
+    ) -> np.ndarray:
+        """Encodes the inputs into float32 embeddings of shape (len(inputs), hidden_dim)."""
+        raise NotImplementedError
+
+
+class TorchBackend(EmbeddingBackend):
+    """Runs the model in eager PyTorch."""
+
+    def __init__(self, model_name: str, max_length: int = 512):
+        super().__init__(model_name=model_name, max_length=max_length)
+        self.model = AutoModel.from_pretrained(model_name)
+        self.model.eval()
+
+    @property
+    def name(self) -> str:
+        return "torch"
+
+    @property
+    def hidden_size(self) -> int:
+        return self.model.config.hidden_size
+
+    @torch.no_grad()
+    def encode(
+        self, inputs: list[str], normalize_embeddings: bool = True
+    ) -> np.ndarray:
+        # Tokenize input texts
+        input_dict = self.tokenizer(
+            inputs,
+            max_length=self.max_length,
+            padding=True,
+            truncation=True,
+            return_tensors="pt",
+        )
+
+        # Get the embeddings
+        outputs = self.model(**input_dict)
+        embeddings = self.average_pool(
+            outputs.last_hidden_state, input_dict["attention_mask"]
+        )
+        if normalize_embeddings:
+            embeddings = F.normalize(embeddings, p=2, dim=1)
+        return embeddings.numpy()
+
+    def average_pool(
+        self, last_hidden_states: torch.Tensor, attention_mask: torch.Tensor
+    ) -> torch.Tensor:
+        last_hidden = last_hidden_states.masked_fill(
+            ~attention_mask[..., None].bool(), 0.0
+        )
+        return last_hidden.sum(dim=1) / attention_mask.sum(dim=1)[..., None]
+
+
+class _LastHiddenState(torch.nn.Module):
+    """Exposes the last hidden state of the encoder as the single output of the exported graph."""
+
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(
+        self, input_ids: torch.Tensor, attention_mask: torch.Tensor
+    ) -> torch.Tensor:
+        return self.model(
+            input_ids=input_ids, attention_mask=attention_mask
+        ).last_hidden_state
+
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    Runs an ONNX export of the model with ONNX Runtime on CPU, optionally with int8 dynamic quantization of the weights.
+
+    The graph is exported from the PyTorch model and quantized once, then reused from `model_dir` by the next sessions.
+    Its parity with the PyTorch model is checked once as well, and recorded next to the graph.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        max_length: int = 512,
+        model_dir: str | os.PathLike = ".cache/onnx",
+        quantize: bool = True,
+        num_threads: Optional[int] = None,
+    ):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError(
+                "The ONNX embedding backend requires onnxruntime and onnx, "
+                "install them with `pip install 'deep-research[onnx]'`"
+            ) from e
+
+        super().__init__(model_name=model_name, max_length=max_length)
+        self.quantize = quantize
+        self.model_dir = (
+            Path(model_dir) / hashlib.sha1(model_name.encode("utf-8")).hexdigest()[:16]
+        )
+        self.model_path = self.get_or_export_model()
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        if num_threads is not None:
+            session_options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(
+            self.model_path.as_posix(),
+            sess_options=session_options,
+            providers=["CPUExecutionProvider"],
+        )
+        self._hidden_size = self.session.get_outputs()[0].shape[-1]
+
+    @property
+    def name(self) -> str:
+        return "onnx-int8" if self.quantize else "onnx"
+
+    @property
+    def hidden_size(self) -> int:
+        return self._hidden_size
+
+    def get_or_export_model(self) -> Path:
+        """Returns the path of the ONNX graph to run, exporting and quantizing the model on first use."""
+        fp32_path = self.model_dir / "model.onnx"
+        int8_path = self.model_dir / "model.int8.onnx"
+        model_path = int8_path if self.quantize else fp32_path
+        if model_path.exists():
+            return model_path
+
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+        if not fp32_path.exists():
+            LOGGER.info("Exporting %s to ONNX in %s", self.model_name, fp32_path)
+            self.export(fp32_path)
+
+        if self.quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            LOGGER.info("Quantizing %s to int8 in %s", fp32_path, int8_path)
+            tmp_path = int8_path.with_suffix(f".{os.getpid()}.tmp")
+            quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, int8_path)
+        return model_path
+
+    @property
+    def parity_path(self) -> Path:
+        return self.model_path.with_suffix(".parity.json")
+
+    def get_parity(self) -> float:
+        """
+        Returns the lowest cosine similarity between the embeddings of the graph and of the PyTorch model on the probe
+        texts. It is computed when the graph is first used, loading the PyTorch model, and read from `parity_path`
+        afterwards, until the graph is exported again.
+        """
+        graph_stat = self.model_path.stat()
+        graph_id = {
+            "size": graph_stat.st_size,
+            "mtime_ns": graph_stat.st_mtime_ns,
+            "max_length": self.max_length,
+        }
+        try:
+            with open(self.parity_path, "r", encoding="utf-8") as f:
+                parity = json.load(f)
+            if parity["graph"] == graph_id:
+                return parity["min_cosine"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        torch_backend = TorchBackend(
+            model_name=self.model_name, max_length=self.max_length
+        )
+        min_cosine = check_backend_parity(torch_backend, self)
+        tmp_path = self.parity_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"graph": graph_id, "min_cosine": min_cosine}, f)
+        os.replace(tmp_path, self.parity_path)
+        return min_cosine
+
+    def export(self, path: Path) -> None:
+        model = AutoModel.from_pretrained(self.model_name)
+        model.eval()
+        dummy_inputs = self.tokenizer(
+            ["query: dummy input", "passage: a longer dummy input to export"],
+            padding=True,
+            return_tensors="pt",
+        )
+
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with torch.no_grad():
+            torch.onnx.export(
+                _LastHiddenState(model),
+                (dummy_inputs["input_ids"], dummy_inputs["attention_mask"]),
+                tmp_path.as_posix(),
+                input_names=["input_ids", "attention_mask"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "last_hidden_state": {0: "batch", 1: "sequence"},
+                },
+                opset_version=17,
+                dynamo=False,
+            )
+        os.replace(tmp_path, path)
+
+    def encode(
+        self, inputs: list[str], normalize_embeddings: bool = True
+    ) -> np.ndarray:
+        input_dict = self.tokenizer(
+            inputs,
+            max_length=self.max_length,
+            padding=True,
+            truncation=True,
+            return_tensors="np",
+        )
+        attention_mask = input_dict["attention_mask"].astype(np.int64)
+        (last_hidden_states,) = self.session.run(
+            ["last_hidden_state"],
+            {
+                "input_ids": input_dict["input_ids"].astype(np.int64),
+                "attention_mask": attention_mask,
+            },
+        )
+
+        # Average pooling over the non padded tokens
+        mask = attention_mask[..., None].astype(np.float32)
+        embeddings = (last_hidden_states * mask).sum(axis=1) / mask.sum(axis=1)
+        if normalize_embeddings:
+            embeddings /= np.maximum(
+                np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12
+            )
+        return embeddings.astype(np.float32)
+
+
+def check_backend_parity(
+    reference: EmbeddingBackend,
+    candidate: EmbeddingBackend,
+    texts: Optional[list[str]] = None,
+) -> float:
+    """
+    Encodes probe texts with both backends.
+
+    Returns:
+        float: The lowest cosine similarity between the embeddings of the same text, 1.0 means identical embeddings.
+    """
+    texts = texts or _PARITY_PROBE_TEXTS
+    reference_embeddings = reference.encode(texts)
+    candidate_embeddings = candidate.encode(texts)
+    return float(np.min(np.sum(reference_embeddings * candidate_embeddings, axis=1)))
+
+
+def get_embedding_backend(
+    backend: EmbeddingBackendType,
+    model_name: str,
+    max_length: int = 512,
+    onnx_model_dir: str | os.PathLike = ".cache/onnx",
+    quantize: bool = True,
+    num_threads: Optional[int] = None,
+    parity_tolerance: Optional[float] = 0.02,
+) -> EmbeddingBackend:
+    """
+    Builds the inference backend of the embedding model.
+
+    When `parity_tolerance` is set, the ONNX backend is checked against the PyTorch backend on a few probe texts and
+    the PyTorch backend is used instead if their cosine similarity drops below `1 - parity_tolerance`. The check runs
+    once per exported graph, the PyTorch model is not loaded by the next sessions unless the check failed.
+    """
+    if backend == EmbeddingBackendType.TORCH:
+        return TorchBackend(model_name=model_name, max_length=max_length)
+    if backend == EmbeddingBackendType.ONNX:
+        onnx_backend = OnnxBackend(
+            model_name=model_name,
+            max_length=max_length,
+            model_dir=onnx_model_dir,
+            quantize=quantize,
+            num_threads=num_threads,
+        )
+        if parity_tolerance is None:
+            return onnx_backend
+
+        min_cosine = onnx_backend.get_parity()
+        if 1.0 - min_cosine > parity_tolerance:
+            LOGGER.warning(
+                "The %s backend diverges from the torch backend (min cosine %.4f < %.4f), falling back to torch",
+                onnx_backend.name,
+                min_cosine,
+                1.0 - parity_tolerance,
+            )
+            return TorchBackend(model_name=model_name, max_length=max_length)
+        LOGGER.info(
+            "The %s backend matches the torch backend (min cosine %.4f)",
+            onnx_backend.name,
+            min_cosine,
+        )
+        return onnx_backend
+    raise ValueError(f"Unsupported embedding backend '{backend}'")
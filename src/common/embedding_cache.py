@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from utils.file_lock import file_lock
+from utils.logger import get_logger
+from utils.lru_cache import LRUCache
+from utils.mmap_matrix import MemoryMappedMatrix
+
+LOGGER = get_logger(__name__, step="OTHER")
+
+# Each line of the key index is a SHA-1 hex digest and a newline
+_KEY_RECORD_BYTES = 41
+
+
+class EmbeddingCache:
+    """
+    Content-addressed store of text embeddings.
+
+    Embeddings are keyed by a hash of the namespace (model name and encoding settings) and the text, and kept in:
+    - an in-memory LRU tier holding float32 vectors,
+    - an optional on-disk tier holding a memory-mapped float16 matrix and an append-only index of the row keys,
+      so that embeddings survive across sessions. The rows and the keys are appended under a file lock, at the end of
+      the files, so that several processes can share the same `cache_dir`.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_memory_entries: int = 10_000,
+        cache_dir: Optional[str | os.PathLike] = None,
+    ):
+        self.namespace = namespace
+        self._memory = LRUCache(max_size=max_memory_entries)
+        self._lock = threading.Lock()
+
+        self._disk_dir = None
+        self._disk_matrix: Optional[MemoryMappedMatrix] = None
+        self._disk_index: dict[str, int] = {}
+        self._n_disk_keys = 0
+        if cache_dir is not None:
+            namespace_hash = hashlib.sha1(namespace.encode("utf-8")).hexdigest()[:16]
+            self._disk_dir = Path(cache_dir) / namespace_hash
+            self._load_disk_tier()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.namespace}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _lock_disk_tier(self):
+        return file_lock(self._disk_dir / "lock")
+
+    def _load_disk_tier(self) -> None:
+        meta_path = self._disk_dir / "meta.json"
+        if not meta_path.exists():
+            return
+
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self._disk_matrix = MemoryMappedMatrix(
+            self._disk_dir / "embeddings.f16", dim=meta["dim"]
+        )
+        with self._lock_disk_tier():
+            self._sync_disk_tier()
+        LOGGER.debug(
+            "Loaded %d cached embeddings from %s", len(self._disk_index), self._disk_dir
+        )
+
+    def _sync_disk_tier(self) -> int:
+        """
+        Indexes the keys appended to the disk tier since the last sync, by this process or another one, and returns the
+        number of rows. Must be called holding the lock of the disk tier.
+        """
+        keys_path = self._disk_dir / "keys.txt"
+        keys_path.touch(exist_ok=True)
+        keys_bytes = keys_path.stat().st_size
+        n_matrix_rows = self._disk_matrix.refresh()
+        n_rows = min(keys_bytes // _KEY_RECORD_BYTES, n_matrix_rows)
+
+        # Rows and keys are written one after the other, drop whatever an interrupted write left unpaired
+        if keys_bytes != n_rows * _KEY_RECORD_BYTES or n_matrix_rows != n_rows:
+            LOGGER.warning(
+                "Dropping the unpaired entries of the embedding cache %s (%d keys, %d embeddings)",
+                self._disk_dir,
+                keys_bytes // _KEY_RECORD_BYTES,
+                n_matrix_rows,
+            )
+            self._disk_matrix.truncate(n_rows)
+            with open(keys_path, "r+b") as f:
+                f.truncate(n_rows * _KEY_RECORD_BYTES)
+
+        if n_rows > self._n_disk_keys:
+            with open(keys_path, "rb") as f:
+                f.seek(self._n_disk_keys * _KEY_RECORD_BYTES)
+                new_keys = f.read((n_rows - self._n_disk_keys) * _KEY_RECORD_BYTES)
+            for offset, key in enumerate(new_keys.decode("ascii").splitlines()):
+                self._disk_index.setdefault(key, self._n_disk_keys + offset)
+            self._n_disk_keys = n_rows
+        return n_rows
+
+    def _init_disk_tier(self, dim: int) -> None:
+        self._disk_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock_disk_tier():
+            # Another process may have created it since this cache was loaded
+            if not (self._disk_dir / "meta.json").exists():
+                with open(self._disk_dir / "meta.json", "w", encoding="utf-8") as f:
+                    json.dump({"namespace": self.namespace, "dim": dim}, f)
+        self._load_disk_tier()
+
+    def get_many(self, texts: list[str]) -> list[Optional[np.ndarray]]:
+        """Returns the cached embedding of each text, or None for the texts that were never encoded."""
+        embeddings = []
+        for text in texts:
+            key = self.key(text)
+            embedding = self._memory.get(key)
+            if embedding is None and key in self._disk_index:
+                embedding = self._disk_matrix[self._disk_index[key]].astype(np.float32)
+                self._memory.put(key, embedding)
+            embeddings.append(embedding)
+        return embeddings
+
+    def put_many(self, texts: list[str], embeddings: np.ndarray) -> None:
+        keys = [self.key(text) for text in texts]
+        for key, embedding in zip(keys, embeddings):
+            self._memory.put(key, np.asarray(embedding, dtype=np.float32))
+
+        if self._disk_dir is None:
+            return
+
+        with self._lock:
+            if self._disk_matrix is None:
+                self._init_disk_tier(dim=embeddings.shape[1])
+
+            with self._lock_disk_tier():
+                self._sync_disk_tier()
+                new_rows = {}
+                for key, embedding in zip(keys, embeddings):
+                    if key not in self._disk_index and key not in new_rows:
+                        new_rows[key] = embedding
+                if len(new_rows) == 0:
+                    return
+
+                start = self._disk_matrix.append(np.stack(list(new_rows.values())))
+                with open(self._disk_dir / "keys.txt", "a", encoding="ascii") as f:
+                    f.write("".join(f"{key}\n" for key in new_rows))
+                for offset, key in enumerate(new_rows):
+                    self._disk_index[key] = start + offset
+                self._n_disk_keys = start + len(new_rows)
@@ -6,3 +6,13 @@ class CouldNotSearchQuery(Exception):
 class CouldNotReadUrl(Exception):
     def __init__(self, message, *args, **kwargs):
         super().__init__(message)
+
+
+class UnsupportedContent(CouldNotReadUrl):
+    def __init__(self, message, *args, **kwargs):
+        super().__init__(message)
+
+
+class LLMCacheMiss(Exception):
+    def __init__(self, message, *args, **kwargs):
+        super().__init__(message)
@@ -0,0 +1,124 @@
+import math
+import re
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class BM25:
+    """
+    In-memory Okapi BM25 index of a small set of documents, e.g. the chunks of a page.
+
+    Only the term counts of the documents are kept, the document frequencies are computed for the query terms only.
+    """
+
+    def __init__(self, documents: list[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(document)) for document in documents]
+        self.lengths = np.array(
+            [sum(counts.values()) for counts in self.term_counts], dtype=np.float64
+        )
+        self.avg_length = max(float(self.lengths.mean()), 1.0) if documents else 1.0
+
+    def __len__(self) -> int:
+        return len(self.term_counts)
+
+    def idf(self, term: str) -> float:
+        document_frequency = sum(1 for counts in self.term_counts if term in counts)
+        return math.log(
+            1.0 + (len(self) - document_frequency + 0.5) / (document_frequency + 0.5)
+        )
+
+    def score(self, query: str) -> np.ndarray:
+        """Returns the BM25 score of each document for the query, 0 for the documents sharing no term with it."""
+        scores = np.zeros(len(self), dtype=np.float64)
+        length_norm = self.k1 * (1.0 - self.b + self.b * self.lengths / self.avg_length)
+        for term in set(tokenize(query)):
+            term_frequencies = np.array(
+                [counts.get(term, 0) for counts in self.term_counts], dtype=np.float64
+            )
+            if not term_frequencies.any():
+                continue
+            scores += (
+                self.idf(term)
+                * term_frequencies
+                * (self.k1 + 1.0)
+                / (term_frequencies + length_norm)
+            )
+        return scores
+
+
+class InvertedIndex:
+    """
+    Okapi BM25 index of a collection of documents, e.g. a local document collection.
+
+    Each term maps to its postings, the documents containing it and its frequency in each of them, so that a query
+    only scores the documents sharing a term with it.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, tuple[list[int], list[int]]] = {}
+        self._lengths: list[int] = []
+        # Postings as arrays, built on the first search after documents are added
+        self._arrays: Optional[dict[str, tuple[np.ndarray, np.ndarray]]] = None
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, document: str) -> int:
+        """Indexes the document and returns its index."""
+        doc_idx = len(self._lengths)
+        term_counts = Counter(tokenize(document))
+        for term, count in term_counts.items():
+            doc_indices, frequencies = self._postings.setdefault(term, ([], []))
+            doc_indices.append(doc_idx)
+            frequencies.append(count)
+        self._lengths.append(sum(term_counts.values()))
+        self._arrays = None
+        return doc_idx
+
+    def search(self, query: str, top_k: int = 10) -> list[tuple[int, float]]:
+        """
+        Returns the (document index, BM25 score) of the `top_k` best documents for the query, best first. Ties are
+        broken by document index, the documents sharing no term with the query are never returned.
+        """
+        if len(self) == 0:
+            return []
+        if self._arrays is None:
+            self._arrays = {
+                term: (np.array(doc_indices), np.array(frequencies, dtype=np.float64))
+                for term, (doc_indices, frequencies) in self._postings.items()
+            }
+        lengths = np.array(self._lengths, dtype=np.float64)
+        length_norm = self.k1 * (
+            1.0 - self.b + self.b * lengths / max(float(lengths.mean()), 1.0)
+        )
+
+        scores = np.zeros(len(self), dtype=np.float64)
+        for term in set(tokenize(query)):
+            if term not in self._arrays:
+                continue
+            doc_indices, frequencies = self._arrays[term]
+            idf = math.log(
+                1.0 + (len(self) - len(doc_indices) + 0.5) / (len(doc_indices) + 0.5)
+            )
+            scores[doc_indices] += (
+                idf
+                * frequencies
+                * (self.k1 + 1.0)
+                / (frequencies + length_norm[doc_indices])
+            )
+
+        matches = np.flatnonzero(scores)
+        top = matches[np.argsort(-scores[matches], kind="stable")][:top_k]
+        return [(int(idx), float(scores[idx])) for idx in top]
@@ -0,0 +1,452 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from common.chunking import Chunk
+from common.vector_store import Passage
+from utils.file_lock import file_lock
+from utils.logger import get_logger
+from utils.lru_cache import LRUCache
+from utils.mmap_matrix import MemoryMappedMatrix
+
+LOGGER = get_logger(__name__, step="OTHER")
+
+# Number of stored vectors converted to float32 at once when searching
+_SEARCH_BLOCK_SIZE = 16_384
+
+
+@dataclass
+class CorpusDocument:
+    """A document of the corpus, its text being stored in `texts/<doc_id>.md`."""
+
+    doc_id: str
+    url: str
+    added_at: float
+
+
+class ResearchCorpus:
+    """
+    On-disk corpus of the documents read across research sessions, with the embeddings of their chunks.
+
+    The corpus is stored in a directory per embedding namespace (model name and encoding settings), made of:
+    - `texts/<doc_id>.md`: the text of each document,
+    - `documents.<generation>.jsonl`: an append-only log of the documents, a URL added again with another text
+      superseding its previous document,
+    - `chunks.<generation>.jsonl`: an append-only log of the (doc_id, start, end) chunks, one line per embedding row,
+    - `embeddings.<generation>.f16`: the memory-mapped float16 matrix of the chunk embeddings,
+    - `meta.json`: the namespace, the embedding dimension and the current generation of the files.
+
+    The chunks of superseded and expired documents are dead rows, skipped by the search. Compaction rewrites the
+    live rows into the files of the next generation, then switches `meta.json` to them, so that an interrupted
+    compaction leaves the corpus untouched. It runs on load once the dead rows exceed `compaction_ratio` of the rows.
+    Embeddings are expected to be normalized, the scores are cosine similarities.
+
+    Several processes can share the corpus: the writes hold a file lock, and first read what the other processes
+    appended, or reload the corpus when another process compacted it in the meantime.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        namespace: str,
+        ttl_seconds: Optional[float] = None,
+        compaction_ratio: float = 0.5,
+        max_cached_texts: int = 64,
+    ):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.compaction_ratio = compaction_ratio
+        namespace_hash = hashlib.sha1(namespace.encode("utf-8")).hexdigest()[:16]
+        self.directory = Path(directory) / namespace_hash
+        self._texts = LRUCache(max_size=max_cached_texts)
+        self._lock = threading.Lock()
+        with self._lock_files():
+            self._load()
+        if self.dead_ratio > self.compaction_ratio:
+            self.compact()
+
+    def __len__(self) -> int:
+        """Number of live chunks."""
+        return int(self._live[: self._n_rows].sum())
+
+    @property
+    def dead_ratio(self) -> float:
+        if self._n_rows == 0:
+            return 0.0
+        return 1.0 - len(self) / self._n_rows
+
+    def _path(self, name: str) -> Path:
+        return self.directory / name.format(generation=self._generation)
+
+    def _lock_files(self):
+        return file_lock(self.directory / "lock")
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(self.directory / "meta.json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _is_stale(self) -> bool:
+        """Whether another process created or compacted the corpus since it was loaded."""
+        meta = self._read_meta()
+        generation = meta["generation"] if meta is not None else None
+        return generation != (self._generation if self._matrix is not None else None)
+
+    def _load(self) -> None:
+        """Loads the corpus from its files. Must be called holding the file lock."""
+        self._generation = 0
+        self._dim: Optional[int] = None
+        self._matrix: Optional[MemoryMappedMatrix] = None
+        self._documents: dict[str, CorpusDocument] = {}
+        self._doc_urls: dict[str, str] = {}
+        self._rows_by_doc: dict[str, list[int]] = {}
+        self._row_chunks: list[tuple[str, int, int]] = []
+        self._chunk_keys: set[tuple[str, int, int]] = set()
+        self._live = np.zeros(0, dtype=bool)
+        self._n_rows = 0
+        self._documents_offset = 0
+        self._chunks_offset = 0
+
+        meta = self._read_meta()
+        if meta is None:
+            return
+        self._generation = meta["generation"]
+        self._dim = meta["dim"]
+        self._matrix = MemoryMappedMatrix(
+            self._path("embeddings.{generation}.f16"), dim=self._dim
+        )
+        self._read_new_entries()
+        LOGGER.debug(
+            "Loaded %d documents and %d chunks (%d live) from %s",
+            len(self._documents),
+            self._n_rows,
+            len(self),
+            self.directory,
+        )
+
+    def _sync(self) -> None:
+        """
+        Catches up with the writes of the other processes sharing the corpus: reloads it if it was compacted, or reads
+        the documents and rows appended since the last read. Must be called holding the file lock.
+        """
+        if self._is_stale():
+            self._load()
+        elif self._matrix is not None:
+            self._read_new_entries()
+
+    def _reload_if_compacted(self) -> None:
+        """Reloads the corpus if another process compacted it, its files of the previous generation being deleted."""
+        if self._is_stale():
+            with self._lock_files():
+                self._load()
+                self._texts.clear()
+
+    @staticmethod
+    def _read_lines(path: Path, offset: int) -> list[tuple[bytes, int]]:
+        """
+        Returns the lines of the file from `offset` with the offset of their end. A last line cut by an interrupted
+        write is removed from the file. Must be called holding the file lock.
+        """
+        lines = []
+        if not path.exists():
+            return lines
+        with open(path, "r+b") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    f.truncate(offset)
+                    break
+                offset += len(line)
+                lines.append((line, offset))
+        return lines
+
+    def _read_new_entries(self) -> None:
+        """Reads the documents and the rows appended since the last read. Must be called holding the file lock."""
+        documents_path = self._path("documents.{generation}.jsonl")
+        for line, end in self._read_lines(documents_path, self._documents_offset):
+            self._documents_offset = end
+            try:
+                document = CorpusDocument(**json.loads(line))
+            except (json.JSONDecodeError, TypeError):
+                continue
+            # The last document of a URL supersedes the previous ones
+            previous_document = self._documents.get(document.url)
+            if (
+                previous_document is not None
+                and previous_document.doc_id != document.doc_id
+            ):
+                self._live[self._rows_by_doc.get(previous_document.doc_id, [])] = False
+            self._documents[document.url] = document
+            self._doc_urls[document.doc_id] = document.url
+
+        row_chunks, chunk_ends = [], []
+        chunks_path = self._path("chunks.{generation}.jsonl")
+        for line, end in self._read_lines(chunks_path, self._chunks_offset):
+            try:
+                row_chunks.append(tuple(json.loads(line)))
+            except json.JSONDecodeError:
+                break
+            chunk_ends.append(end)
+
+        # Rows and chunks are written one after the other, drop whatever an interrupted write left unpaired
+        n_matrix_rows = self._matrix.refresh()
+        n_new_rows = max(min(len(row_chunks), n_matrix_rows - self._n_rows), 0)
+        if n_matrix_rows > self._n_rows + n_new_rows:
+            self._matrix.truncate(self._n_rows + n_new_rows)
+        if n_new_rows > 0:
+            self._chunks_offset = chunk_ends[n_new_rows - 1]
+        if chunks_path.exists() and chunks_path.stat().st_size > self._chunks_offset:
+            with open(chunks_path, "r+b") as f:
+                f.truncate(self._chunks_offset)
+        self._append_rows(row_chunks[:n_new_rows])
+
+    def _is_live(self, doc_id: str, now: float) -> bool:
+        document = self._documents.get(self._doc_urls.get(doc_id))
+        if document is None or document.doc_id != doc_id:
+            return False
+        return self.ttl_seconds is None or now - document.added_at <= self.ttl_seconds
+
+    def _append_rows(self, row_chunks: list[tuple[str, int, int]]) -> None:
+        """Records the chunks of rows appended to the matrix."""
+        now = time.time()
+        if len(self._live) < self._n_rows + len(row_chunks):
+            live = np.zeros(
+                max(2 * len(self._live), self._n_rows + len(row_chunks), 1_024),
+                dtype=bool,
+            )
+            live[: self._n_rows] = self._live[: self._n_rows]
+            self._live = live
+        for row, chunk in enumerate(row_chunks, start=self._n_rows):
+            doc_id, start, end = chunk
+            self._row_chunks.append((doc_id, start, end))
+            self._chunk_keys.add((doc_id, start, end))
+            self._rows_by_doc.setdefault(doc_id, []).append(row)
+            self._live[row] = self._is_live(doc_id, now=now)
+        self._n_rows += len(row_chunks)
+
+    def _init_files(self, dim: int) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / "texts").mkdir(exist_ok=True)
+        self._dim = dim
+        self._write_meta()
+        self._matrix = MemoryMappedMatrix(
+            self._path("embeddings.{generation}.f16"), dim=dim
+        )
+
+    def _write_meta(self) -> None:
+        meta_path = self.directory / "meta.json"
+        tmp_path = meta_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "namespace": self.namespace,
+                    "dim": self._dim,
+                    "generation": self._generation,
+                },
+                f,
+            )
+        os.replace(tmp_path, meta_path)
+
+    def doc_id(self, url: str, text: str) -> str:
+        return hashlib.sha1(f"{url}\x00{text}".encode("utf-8")).hexdigest()
+
+    def add(
+        self, url: str, text: str, chunks: list[Chunk], embeddings: np.ndarray
+    ) -> int:
+        """
+        Adds the document and the embeddings of its chunks not in the corpus yet. A document with another text
+        supersedes the previous document of the URL, whose chunks are no longer searched.
+
+        Returns:
+            int: The number of chunks added.
+        """
+        with self._lock, self._lock_files():
+            self._sync()
+            doc_id = self.doc_id(url, text)
+            if self._matrix is None:
+                self._init_files(dim=embeddings.shape[1])
+
+            document = self._documents.get(url)
+            if document is None or document.doc_id != doc_id:
+                text_path = self.directory / "texts" / f"{doc_id}.md"
+                text_path.write_text(text, encoding="utf-8")
+                previous_document = document
+                document = CorpusDocument(doc_id=doc_id, url=url, added_at=time.time())
+                with open(
+                    self._path("documents.{generation}.jsonl"), "a", encoding="utf-8"
+                ) as f:
+                    f.write(f"{json.dumps(asdict(document))}\n")
+                    self._documents_offset = f.tell()
+                self._documents[url] = document
+                self._doc_urls[doc_id] = url
+                if previous_document is not None:
+                    self._live[self._rows_by_doc.get(previous_document.doc_id, [])] = (
+                        False
+                    )
+
+            new_indices = [
+                idx
+                for idx, chunk in enumerate(chunks)
+                if (doc_id, chunk.start, chunk.end) not in self._chunk_keys
+            ]
+            if len(new_indices) == 0:
+                return 0
+            new_chunks = [
+                (doc_id, chunks[idx].start, chunks[idx].end) for idx in new_indices
+            ]
+            self._matrix.append(np.asarray(embeddings)[new_indices])
+            with open(
+                self._path("chunks.{generation}.jsonl"), "a", encoding="utf-8"
+            ) as f:
+                f.writelines(f"{json.dumps(chunk)}\n" for chunk in new_chunks)
+                self._chunks_offset = f.tell()
+            self._append_rows(new_chunks)
+            return len(new_chunks)
+
+    def get_document(self, url: str) -> Optional[str]:
+        """Returns the text of the live document of the URL, or None if there is none."""
+        with self._lock:
+            self._reload_if_compacted()
+        document = self._documents.get(url)
+        if document is None or not self._is_live(document.doc_id, now=time.time()):
+            return None
+        return self._read_text(document.doc_id)
+
+    def _read_text(self, doc_id: str) -> Optional[str]:
+        text = self._texts.get(doc_id)
+        if text is None:
+            try:
+                text = (self.directory / "texts" / f"{doc_id}.md").read_text(
+                    encoding="utf-8"
+                )
+            except OSError:
+                return None
+            self._texts.put(doc_id, text)
+        return text
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: int = 5,
+        min_score: Optional[float] = None,
+    ) -> list[list[tuple[Passage, float]]]:
+        """
+        Searches the live chunks closest to each query, by brute force over the memory-mapped embeddings.
+
+        Args:
+            queries (np.ndarray): The normalized query embeddings, of shape (n_queries, dim).
+            top_k (int): The maximum number of passages returned per query.
+            min_score (Optional[float]): Passages scoring under this cosine similarity are not returned.
+
+        Returns:
+            list[list[tuple[Passage, float]]]: For each query, its top passages and their scores, best first.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        with self._lock:
+            self._reload_if_compacted()
+            if self._n_rows == 0:
+                return [[] for _ in range(len(queries))]
+            vectors = self._matrix.view()
+            live = self._live[: self._n_rows]
+            best_rows = np.empty((len(queries), 0), dtype=np.int64)
+            best_scores = np.empty((len(queries), 0), dtype=np.float32)
+            for start in range(0, self._n_rows, _SEARCH_BLOCK_SIZE):
+                end = min(start + _SEARCH_BLOCK_SIZE, self._n_rows)
+                rows = start + np.flatnonzero(live[start:end])
+                if len(rows) == 0:
+                    continue
+                scores = queries @ vectors[rows].astype(np.float32).T
+                best_rows = np.concatenate(
+                    [best_rows, np.broadcast_to(rows, scores.shape)], axis=1
+                )
+                best_scores = np.concatenate([best_scores, scores], axis=1)
+                if best_scores.shape[1] > top_k:
+                    top = np.argpartition(-best_scores, top_k - 1, axis=1)[:, :top_k]
+                    best_rows = np.take_along_axis(best_rows, top, axis=1)
+                    best_scores = np.take_along_axis(best_scores, top, axis=1)
+
+            results = []
+            for query_rows, query_scores in zip(best_rows, best_scores):
+                order = np.argsort(-query_scores, kind="stable")
+                passages = []
+                for idx in order:
+                    if min_score is not None and query_scores[idx] < min_score:
+                        break
+                    passage = self._get_passage(int(query_rows[idx]))
+                    if passage is not None:
+                        passages.append((passage, float(query_scores[idx])))
+                results.append(passages)
+            return results
+
+    def _get_passage(self, row: int) -> Optional[Passage]:
+        doc_id, start, end = self._row_chunks[row]
+        text = self._read_text(doc_id)
+        if text is None:
+            return None
+        return Passage(
+            source=self._doc_urls[doc_id], text=text[start:end], start=start, end=end
+        )
+
+    def compact(self) -> None:
+        """Rewrites the corpus without its dead rows, and deletes the texts of the documents no longer live."""
+        with self._lock, self._lock_files():
+            # Compacts the rows appended by the other processes too
+            self._sync()
+            if self._matrix is None:
+                return
+            now = time.time()
+            live_documents = [
+                document
+                for document in self._documents.values()
+                if self._is_live(document.doc_id, now=now)
+            ]
+            live_rows = np.flatnonzero(self._live[: self._n_rows])
+            n_rows = self._n_rows
+
+            old_generation = self._generation
+            self._generation += 1
+            with open(
+                self._path("documents.{generation}.jsonl"), "w", encoding="utf-8"
+            ) as f:
+                f.writelines(
+                    f"{json.dumps(asdict(document))}\n" for document in live_documents
+                )
+            with open(
+                self._path("chunks.{generation}.jsonl"), "w", encoding="utf-8"
+            ) as f:
+                f.writelines(
+                    f"{json.dumps(self._row_chunks[row])}\n" for row in live_rows
+                )
+            matrix = MemoryMappedMatrix(
+                self._path("embeddings.{generation}.f16"), dim=self._dim
+            )
+            matrix.truncate(0)
+            vectors = self._matrix.view()
+            for start in range(0, len(live_rows), _SEARCH_BLOCK_SIZE):
+                matrix.append(vectors[live_rows[start : start + _SEARCH_BLOCK_SIZE]])
+            # The new generation is only used once fully written
+            self._write_meta()
+
+            for name in ("documents.{}.jsonl", "chunks.{}.jsonl", "embeddings.{}.f16"):
+                (self.directory / name.format(old_generation)).unlink(missing_ok=True)
+            live_doc_ids = {document.doc_id for document in live_documents}
+            for text_path in (self.directory / "texts").glob("*.md"):
+                if text_path.stem not in live_doc_ids:
+                    text_path.unlink(missing_ok=True)
+            self._texts.clear()
+            self._load()
+            LOGGER.info(
+                "Compacted the corpus %s from %d to %d chunks",
+                self.directory,
+                n_rows,
+                self._n_rows,
+            )
@@ -195,4 +195,22 @@ class QueryRewriteSchema(BaseModel):
     )
 
 
+class SourceQueryRewriteSchema(BaseModel):
+    source_query: str = Field(
+        description="The original search query being rewritten, copied verbatim"
+    )
+    think: str = Field(
+        description="**Concisely** explain why you choose those search queries"
+    )
+    queries: list[QuerySchema] = Field(
+        description="Array of search keywords queries, orthogonal to each other."
+    )
+
+
+class BatchQueryRewriteSchema(BaseModel):
+    rewrites: list[SourceQueryRewriteSchema] = Field(
+        description="Exactly one rewrite per original search query, in the same order as the original search queries."
+    )
+
+
 # ----------------------------------------------------------------------------
@@ -1,6 +1,17 @@
-import torch
-import torch.nn.functional as F
-from transformers import AutoModel, AutoTokenizer
+import os
+import threading
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+from common.embedding_cache import EmbeddingCache
+from common.types import EmbeddingBackendType
+from utils.logger import get_logger
+
+if TYPE_CHECKING:
+    from common.embedding_backends import EmbeddingBackend
+
+LOGGER = get_logger(__name__, step="OTHER")
 
 
 class SemanticSimilarityScorer:
@@ -8,51 +19,177 @@ class SemanticSimilarityScorer:
         self,
         batch_size: int = 32,
         max_length: int = 512,
+        model_name: str = "intfloat/multilingual-e5-small",
+        cache_size: int = 0,
+        cache_dir: Optional[str | os.PathLike] = None,
+        backend: EmbeddingBackendType = EmbeddingBackendType.TORCH,
+        onnx_model_dir: str | os.PathLike = ".cache/onnx",
+        quantize: bool = True,
+        num_threads: Optional[int] = None,
+        parity_tolerance: Optional[float] = 0.02,
+        max_tokens_per_batch: Optional[int] = None,
     ):
         self.max_length = max_length
         self.batch_size = batch_size
-        self.tokenizer = AutoTokenizer.from_pretrained("intfloat/multilingual-e5-small")
-        self.model = AutoModel.from_pretrained("intfloat/multilingual-e5-small")
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.model_name = model_name
+        self.cache_size = cache_size
+        self.cache_dir = cache_dir
+        self.backend_options = dict(
+            backend=backend,
+            model_name=model_name,
+            max_length=max_length,
+            onnx_model_dir=onnx_model_dir,
+            quantize=quantize,
+            num_threads=num_threads,
+            parity_tolerance=parity_tolerance,
+        )
 
-    def compute_similarities(self, query: str, docs: list[str]) -> list[float]:
-        passages = [f"passage: {doc}" for doc in docs]
-        query = f"query: {query}"
+        # The model is loaded on first use, or in the background with `preload`
+        self._backend: Optional["EmbeddingBackend"] = None
+        self._embedding_cache: Optional[EmbeddingCache] = None
+        self._load_lock = threading.Lock()
+        self._preload_thread: Optional[threading.Thread] = None
+
+    @property
+    def backend(self) -> "EmbeddingBackend":
+        self.load()
+        return self._backend
+
+    @property
+    def embedding_cache(self) -> Optional[EmbeddingCache]:
+        self.load()
+        return self._embedding_cache
+
+    def load(self) -> None:
+        """Loads the model and the embedding cache, blocks until they are ready if they are loading in the background."""
+        if self._backend is not None:
+            return
+        with self._load_lock:
+            if self._backend is not None:
+                return
+            # torch and transformers are heavy to import, only pay for them when the model is needed
+            from common.embedding_backends import get_embedding_backend
+
+            backend = get_embedding_backend(**self.backend_options)
+            if self.cache_size > 0 or self.cache_dir is not None:
+                # Embeddings from different backends are close but not identical, they are cached separately
+                self._embedding_cache = EmbeddingCache(
+                    namespace=f"{self.model_name}:max_length={self.max_length}:backend={backend.name}",
+                    max_memory_entries=self.cache_size,
+                    cache_dir=self.cache_dir,
+                )
+            self._backend = backend
+
+    def preload(self) -> None:
+        """Starts loading the model in a background thread, so that it overlaps with other work."""
+        if self._backend is not None or self._preload_thread is not None:
+            return
+
+        def run():
+            try:
+                self.load()
+            except Exception as e:
+                # The error is raised again on the first use of the model
+                LOGGER.warning("Could not preload the model %s: %s", self.model_name, e)
 
+        self._preload_thread = threading.Thread(
+            target=run, name="SemanticSimilarityScorer-preload", daemon=True
+        )
+        self._preload_thread.start()
+
+    def compute_similarities(self, query: str, docs: list[str]) -> list[float]:
         # Encoe the query
-        query_embed = self.encode([query])[0]  # shape (hidden_dim,)
+        query_embed = self.encode_query(query)  # shape (hidden_dim,)
+        return (self.encode_passages(docs) @ query_embed).tolist()
+
+    def encode_query(self, query: str) -> np.ndarray:
+        """Returns the embedding of shape (hidden_dim,) of a query."""
+        return self.encode([f"query: {query}"])[0]
+
+    def encode_queries(self, queries: list[str]) -> np.ndarray:
+        """Returns the embeddings of shape (len(queries), hidden_dim) of the queries."""
+        return self.encode([f"query: {query}" for query in queries])
+
+    def encode_passages(self, docs: list[str]) -> np.ndarray:
+        """Returns the embeddings of shape (len(docs), hidden_dim) of the documents."""
+        return self.encode([f"passage: {doc}" for doc in docs])
 
-        scores = []
-        for i in range(0, len(passages), self.batch_size):
-            embeddings = self.encode(passages[i : i + self.batch_size])
-            scores += (query_embed @ embeddings.T).tolist()
-        return scores
+    def compute_pairwise_similarities(self, queries: list[str]) -> np.ndarray:
+        """Returns the (len(queries), len(queries)) matrix of cosine similarities between the queries."""
+        embeddings = self.encode([f"query: {query}" for query in queries])
+        return embeddings @ embeddings.T
 
-    @torch.no_grad()
     def encode(
         self, inputs: list[str], normalize_embeddings: bool = True
-    ) -> torch.Tensor:
-        # Tokenize input texts
-        input_dict = self.tokenizer(
-            inputs,
-            max_length=self.max_length,
-            padding=True,
-            truncation=True,
-            return_tensors="pt",
-        )
+    ) -> np.ndarray:
+        """
+        Encodes the inputs into embeddings of shape (len(inputs), hidden_dim).
+        Normalized embeddings are looked up in the embedding cache first, only the texts never seen before are encoded.
+        """
+        if len(inputs) == 0:
+            return np.empty((0, self.backend.hidden_size), dtype=np.float32)
+        if self.embedding_cache is None or not normalize_embeddings:
+            return self._encode(inputs, normalize_embeddings=normalize_embeddings)
 
-        # Get the embeddings
-        outputs = self.model(**input_dict)
-        embeddings = self.average_pool(
-            outputs.last_hidden_state, input_dict["attention_mask"]
+        embeddings = self.embedding_cache.get_many(inputs)
+        missing_inputs = list(
+            dict.fromkeys(
+                text for text, embedding in zip(inputs, embeddings) if embedding is None
+            )
         )
-        if normalize_embeddings:
-            embeddings = F.normalize(embeddings, p=2, dim=1)
+        if len(missing_inputs) > 0:
+            missing_embeddings = self._encode(missing_inputs)
+            self.embedding_cache.put_many(missing_inputs, missing_embeddings)
+            encoded = dict(zip(missing_inputs, missing_embeddings))
+            embeddings = [
+                encoded[text] if embedding is None else embedding
+                for text, embedding in zip(inputs, embeddings)
+            ]
+        return np.stack(embeddings)
+
+    def _encode(
+        self, inputs: list[str], normalize_embeddings: bool = True
+    ) -> np.ndarray:
+        embeddings = np.empty((len(inputs), self.backend.hidden_size), dtype=np.float32)
+        for batch_indices in self.get_batches(inputs):
+            embeddings[batch_indices] = self.backend.encode(
+                [inputs[i] for i in batch_indices],
+                normalize_embeddings=normalize_embeddings,
+            )
         return embeddings
 
-    def average_pool(
-        self, last_hidden_states: torch.Tensor, attention_mask: torch.Tensor
-    ) -> torch.Tensor:
-        last_hidden = last_hidden_states.masked_fill(
-            ~attention_mask[..., None].bool(), 0.0
-        )
-        return last_hidden.sum(dim=1) / attention_mask.sum(dim=1)[..., None]
+    def get_batches(self, inputs: list[str]) -> list[list[int]]:
+        """
+        Groups the indices of the inputs into batches to encode.
+
+        Without `max_tokens_per_batch`, the inputs are split in their original order into batches of `batch_size`.
+        Otherwise, the inputs are sorted by token length and a batch is closed as soon as its padded size
+        (number of inputs x longest input) would exceed `max_tokens_per_batch`, or it holds `batch_size` inputs,
+        so that inputs of similar lengths are padded together.
+        """
+        if self.max_tokens_per_batch is None:
+            return [
+                list(range(i, min(i + self.batch_size, len(inputs))))
+                for i in range(0, len(inputs), self.batch_size)
+            ]
+
+        lengths = [
+            len(input_ids)
+            for input_ids in self.backend.tokenizer(
+                inputs, max_length=self.max_length, truncation=True
+            )["input_ids"]
+        ]
+        batches, batch = [], []
+        # Inputs are sorted by increasing length, the last added input is the longest of its batch
+        for idx in sorted(range(len(inputs)), key=lambda i: lengths[i]):
+            if len(batch) > 0 and (
+                len(batch) >= self.batch_size
+                or (len(batch) + 1) * lengths[idx] > self.max_tokens_per_batch
+            ):
+                batches.append(batch)
+                batch = []
+            batch.append(idx)
+        if len(batch) > 0:
+            batches.append(batch)
+        return batches
@@ -2,11 +2,15 @@ from dataclasses import dataclass
 from enum import StrEnum
 from typing import Optional, Union
 
+from common.url_index import UrlIndex
+from utils.deadline import Deadline
+
 
 class AgentStopReason(StrEnum):
     TRIVIAL_ANSWER = "trivial_answer"
     MAX_BAD_ATTEMPTS = "max_bad_attempts"
     MAX_TOKENS_BUDGET = "max_tokens_budget"
+    MAX_TIME_BUDGET = "max_time_budget"
     FINAL_ANSWER_OK = "final_answer_ok"
 
 
@@ -19,6 +23,44 @@ class EvaluationMetric(StrEnum):
     STRICT = "strict"
 
 
+class QueryRewriteMode(StrEnum):
+    SEQUENTIAL = "sequential"
+    BATCHED = "batched"
+    CONCURRENT = "concurrent"
+
+
+class EmbeddingBackendType(StrEnum):
+    TORCH = "torch"
+    ONNX = "onnx"
+
+
+class ChunkingStrategy(StrEnum):
+    FIXED = "fixed"
+    STRUCTURAL = "structural"
+
+
+class VectorIndexType(StrEnum):
+    BRUTE_FORCE = "brute_force"
+    IVF = "ivf"
+
+
+class HtmlExtractorType(StrEnum):
+    MARKDOWNIFY = "markdownify"
+    MAIN_CONTENT = "main_content"
+
+
+class SearchProviderType(StrEnum):
+    DUCKDUCKGO = "duckduckgo"
+    GOOGLE = "google"
+    LOCAL_INDEX = "local_index"
+
+
+class SearchRouting(StrEnum):
+    WEIGHTED = "weighted"
+    FAILOVER = "failover"
+    PARALLEL = "parallel"
+
+
 class KnowledgeItemType(StrEnum):
     FROM_VISIT_STEP = "from_visit_step"
     FROM_SEARCH_STEP = "from_search_step"
@@ -47,9 +89,11 @@ class ResearchState:
         self.all_search_questions = []
         self.knowledge_items: list[KnowledgeItem] = []
         self.all_context = []
-        self.all_urls: list[SearchResult] = []
-        self.bad_urls = []
-        self.visited_urls = []
+        self.all_urls = UrlIndex()
+        self.bad_urls = UrlIndex()
+        self.visited_urls = UrlIndex()
+        # (question, passage index) of the passages recalled from the vector store
+        self.recalled_passages: set[tuple[str, int]] = set()
 
         self.bad_actions = []
         self.steps_trace = []
@@ -59,11 +103,85 @@ class ResearchState:
         self.allow_reflect = True
         self.allow_visit = True
 
-        self.visited_urls = []
-
         self.question_evals: dict[str, list[EvaluationMetric]] = {}
         self.final_answer_pip = []
         self.stop_reason: Optional[AgentStopReason] = None
+        self.deadline = Deadline()
+
+        # Sizes of the state lists when this state was forked, to find what a branch added
+        self._fork_sizes: Optional[dict[str, int]] = None
+
+    _MERGED_LISTS = (
+        "knowledge_items",
+        "steps_trace",
+        "bad_actions",
+        "all_questions",
+        "all_search_questions",
+        "all_context",
+        "gaps",
+    )
+
+    def fork(self, question: str, step: int) -> "ResearchState":
+        """
+        Returns a branch of the state to research `question` independently of the other branches.
+
+        The branch starts from a copy of the knowledge, the diary and the URLs gathered so far, its changes are
+        brought back with `merge`. Its gaps start empty, the sub-questions it raises are added to the gaps on merge.
+        """
+        branch = ResearchState(user_query=self.user_query)
+        branch.step = step
+        branch.bad_attempts = self.bad_attempts
+        branch.max_bad_attempts = self.max_bad_attempts
+        branch.current_question = question
+        branch.gaps = []
+        branch.all_questions = list(self.all_questions)
+        branch.all_search_questions = list(self.all_search_questions)
+        branch.knowledge_items = list(self.knowledge_items)
+        branch.all_context = list(self.all_context)
+        branch.all_urls = self.all_urls.copy()
+        branch.bad_urls = self.bad_urls.copy()
+        branch.visited_urls = self.visited_urls.copy()
+        branch.recalled_passages = set(self.recalled_passages)
+        branch.bad_actions = list(self.bad_actions)
+        branch.steps_trace = list(self.steps_trace)
+        branch.question_evals = {
+            question: list(metrics) for question, metrics in self.question_evals.items()
+        }
+        branch.final_answer_pip = list(self.final_answer_pip)
+        branch.deadline = self.deadline
+        branch._fork_sizes = {
+            name: len(getattr(self, name)) for name in self._MERGED_LISTS
+        }
+        # The gaps of the branch start empty, whatever it adds to them is new
+        branch._fork_sizes["gaps"] = 0
+        branch._fork_sizes["bad_attempts"] = self.bad_attempts
+        return branch
+
+    _ALLOW_FLAGS = ("allow_answer", "allow_search", "allow_reflect", "allow_visit")
+
+    def merge(self, branch: "ResearchState") -> None:
+        """
+        Brings back what a branch forked from this state added: knowledge, diary entries, questions and URLs.
+
+        The first stop reason of the merged branches is kept, and an action disabled by a branch is disabled in the
+        state.
+        """
+        if self.stop_reason is None:
+            self.stop_reason = branch.stop_reason
+        for name in self._ALLOW_FLAGS:
+            setattr(self, name, getattr(self, name) and getattr(branch, name))
+        for name in self._MERGED_LISTS:
+            getattr(self, name).extend(
+                getattr(branch, name)[branch._fork_sizes[name] :]
+            )
+        self.bad_attempts += branch.bad_attempts - branch._fork_sizes["bad_attempts"]
+        self.question_evals.update(branch.question_evals)
+        self.recalled_passages |= branch.recalled_passages
+
+        self.all_urls.merge(branch.all_urls)
+        self.visited_urls.merge(branch.visited_urls)
+        self.bad_urls.merge(branch.bad_urls)
+        self.all_urls.remove(self.bad_urls.urls())
 
 
 @dataclass
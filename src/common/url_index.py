@@ -0,0 +1,131 @@
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+
+import numpy as np
+
+from utils.url_utils import normalize_url
+
+if TYPE_CHECKING:
+    from common.types import SearchResult
+
+
+@dataclass
+class UrlRecord:
+    result: "SearchResult"
+    best_weight: float
+    source_queries: list[str] = field(default_factory=list)
+    embedding: Optional[np.ndarray] = None
+
+    @property
+    def descriptor(self) -> str:
+        output = self.result.url + ": " + self.result.title
+        if len(self.result.description):
+            output += f" - {self.result.description}"
+        return output
+
+
+class UrlIndex:
+    """
+    Ordered index of unique URLs, keyed by their normalized form.
+
+    URLs are deduplicated on insert and membership checks are O(1). Each URL keeps its metadata: the best weight it
+    was found with, the queries it was found for and the embedding of its descriptor, computed once for reranking.
+    """
+
+    def __init__(self):
+        self._records: dict[str, UrlRecord] = {}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator["SearchResult"]:
+        return (record.result for record in list(self._records.values()))
+
+    def __contains__(self, url: "str | SearchResult") -> bool:
+        if not isinstance(url, str):
+            url = url.url
+        return normalize_url(url) in self._records
+
+    def get(self, url: str) -> Optional[UrlRecord]:
+        return self._records.get(normalize_url(url))
+
+    def records(self) -> list[UrlRecord]:
+        return list(self._records.values())
+
+    def urls(self) -> list[str]:
+        return [record.result.url for record in self._records.values()]
+
+    def add(
+        self, result: "SearchResult | str", source_query: Optional[str] = None
+    ) -> bool:
+        """
+        Adds a search result, or a bare URL, to the index.
+        A known URL is not added again, its metadata is merged instead.
+
+        Returns:
+            bool: True if the URL was not in the index.
+        """
+        if isinstance(result, str):
+            from common.types import SearchResult
+
+            result = SearchResult(url=result, title="", description="", weight=0)
+
+        key = normalize_url(result.url)
+        record = self._records.get(key)
+        is_new = record is None
+        if is_new:
+            record = UrlRecord(result=result, best_weight=result.weight)
+            self._records[key] = record
+        else:
+            record.best_weight = max(record.best_weight, result.weight)
+            record.result.weight = record.best_weight
+            if len(record.result.description) == 0 and len(result.description) > 0:
+                record.result.title = result.title
+                record.result.description = result.description
+                record.embedding = None  # The descriptor changed
+
+        if source_query is not None and source_query not in record.source_queries:
+            record.source_queries.append(source_query)
+        return is_new
+
+    def extend(
+        self,
+        results: Iterable["SearchResult | str"],
+        source_query: Optional[str] = None,
+    ) -> None:
+        for result in results:
+            self.add(result, source_query=source_query)
+
+    def copy(self) -> "UrlIndex":
+        """Returns an independent copy of the index, the descriptor embeddings are shared."""
+        index = UrlIndex()
+        for key, record in self._records.items():
+            index._records[key] = self._copy_record(record)
+        return index
+
+    def merge(self, other: "UrlIndex") -> None:
+        """Adds the URLs of `other` in their order, the metadata of the already known URLs is merged."""
+        for key, record in other._records.items():
+            existing = self._records.get(key)
+            if existing is None:
+                self._records[key] = self._copy_record(record)
+                continue
+
+            existing.best_weight = max(existing.best_weight, record.best_weight)
+            for source_query in record.source_queries:
+                if source_query not in existing.source_queries:
+                    existing.source_queries.append(source_query)
+            if existing.embedding is None and existing.descriptor == record.descriptor:
+                existing.embedding = record.embedding
+
+    @staticmethod
+    def _copy_record(record: UrlRecord) -> UrlRecord:
+        return replace(
+            record,
+            result=replace(record.result),
+            source_queries=list(record.source_queries),
+        )
+
+    def remove(self, urls: Iterable[str]) -> None:
+        for url in urls:
+            self._records.pop(normalize_url(url), None)
@@ -0,0 +1,264 @@
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from common.types import VectorIndexType
+from utils.logger import get_logger
+
+LOGGER = get_logger(__name__, step="OTHER")
+
+# Number of stored vectors converted to float32 at once when searching
+_SEARCH_BLOCK_SIZE = 16_384
+
+
+@dataclass
+class Passage:
+    """A passage of a document, `text` being `document[start:end]`."""
+
+    source: str
+    text: str
+    start: int
+    end: int
+
+
+class VectorStore:
+    """
+    In-process vector index of the passages read during a research session.
+
+    The embeddings are appended in bulk to a contiguous matrix (float16 by default), grown by doubling its capacity.
+    They are searched by brute force, or with an IVF index: once the store holds `ivf_min_vectors` vectors, they are
+    clustered into `n_lists` lists by spherical k-means and a query only scans the `n_probe` lists whose centroids are
+    the closest to it. The clustering is trained again each time the store doubles in size.
+    The memory used by the embeddings and the passages is accounted, and no passage is added beyond `max_bytes`.
+    Embeddings are expected to be normalized, the scores are cosine similarities.
+    """
+
+    def __init__(
+        self,
+        dtype: np.dtype = np.float16,
+        index: VectorIndexType = VectorIndexType.BRUTE_FORCE,
+        n_lists: int = 64,
+        n_probe: int = 8,
+        ivf_min_vectors: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        initial_capacity: int = 1_024,
+    ):
+        self.dtype = np.dtype(dtype)
+        self.index = index
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.ivf_min_vectors = ivf_min_vectors or 16 * n_lists
+        self.max_bytes = max_bytes
+        self.initial_capacity = initial_capacity
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._vectors: Optional[np.ndarray] = None
+            self._centroids: Optional[np.ndarray] = None
+            # Indices of the vectors of each list of the IVF index, as appended blocks
+            self._inverted_lists: list[list[np.ndarray]] = []
+            self._trained_size = 0
+            self._size = 0
+            self._passages: list[Passage] = []
+            self._passage_keys: set[tuple[str, int, int]] = set()
+            self._passages_bytes = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def memory_bytes(self) -> int:
+        """Memory used by the embedding matrix (allocated capacity included), the IVF index and the passages."""
+        vectors_bytes = self._vectors.nbytes if self._vectors is not None else 0
+        centroids_bytes = self._centroids.nbytes if self._centroids is not None else 0
+        lists_bytes = sum(
+            block.nbytes for blocks in self._inverted_lists for block in blocks
+        )
+        return vectors_bytes + centroids_bytes + lists_bytes + self._passages_bytes
+
+    def get_passage(self, idx: int) -> Passage:
+        return self._passages[idx]
+
+    def add(self, embeddings: np.ndarray, passages: list[Passage]) -> int:
+        """
+        Appends the embeddings of the passages not in the store yet.
+
+        Returns:
+            int: The number of passages added.
+        """
+        with self._lock:
+            new_indices = []
+            for idx, passage in enumerate(passages):
+                key = (passage.source, passage.start, passage.end)
+                if key not in self._passage_keys:
+                    self._passage_keys.add(key)
+                    new_indices.append(idx)
+            if len(new_indices) == 0:
+                return 0
+
+            embeddings = np.asarray(embeddings)[new_indices]
+            new_passages = [passages[idx] for idx in new_indices]
+            n_added = self._fit_in_memory_budget(embeddings, new_passages)
+            if n_added < len(new_passages):
+                LOGGER.warning(
+                    "Vector store full (%d bytes), dropping %d passages",
+                    self.memory_bytes,
+                    len(new_passages) - n_added,
+                )
+            if n_added == 0:
+                return 0
+
+            self._reserve(self._size + n_added, dim=embeddings.shape[1])
+            self._vectors[self._size : self._size + n_added] = embeddings[:n_added]
+            self._passages.extend(new_passages[:n_added])
+            self._passages_bytes += sum(
+                len(passage.text) + len(passage.source)
+                for passage in new_passages[:n_added]
+            )
+            self._size += n_added
+            self._update_ivf(n_added)
+            return n_added
+
+    def _fit_in_memory_budget(
+        self, embeddings: np.ndarray, passages: list[Passage]
+    ) -> int:
+        """Returns the number of passages that can be added without exceeding `max_bytes`."""
+        if self.max_bytes is None:
+            return len(passages)
+        vector_bytes = (
+            embeddings.shape[1] * self.dtype.itemsize + np.dtype(np.int64).itemsize
+        )
+        used_bytes = self._size * vector_bytes + self._passages_bytes
+        n_fitting = 0
+        for passage in passages:
+            used_bytes += vector_bytes + len(passage.text) + len(passage.source)
+            if used_bytes > self.max_bytes:
+                break
+            n_fitting += 1
+        return n_fitting
+
+    def _reserve(self, size: int, dim: int) -> None:
+        capacity = len(self._vectors) if self._vectors is not None else 0
+        if size <= capacity:
+            return
+        new_capacity = max(self.initial_capacity, 2 * capacity, size)
+        if self.max_bytes is not None:
+            # Do not allocate more than the budget allows
+            max_capacity = self.max_bytes // (dim * self.dtype.itemsize)
+            new_capacity = max(size, min(new_capacity, max_capacity))
+        vectors = np.empty((new_capacity, dim), dtype=self.dtype)
+        if self._vectors is not None:
+            vectors[: self._size] = self._vectors[: self._size]
+        self._vectors = vectors
+
+    def _update_ivf(self, n_added: int) -> None:
+        if self.index != VectorIndexType.IVF or self._size < self.ivf_min_vectors:
+            return
+        if self._centroids is None or self._size >= 2 * self._trained_size:
+            self._train_ivf()
+        else:
+            self._add_to_lists(np.arange(self._size - n_added, self._size))
+
+    def _train_ivf(self, n_iterations: int = 10, seed: int = 0) -> None:
+        vectors = self._vectors[: self._size].astype(np.float32)
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), size=self.n_lists, replace=False)]
+        for _ in range(n_iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.eye(self.n_lists, dtype=np.float32)[assignments].T @ vectors
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty lists keep their previous centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+        self._centroids = centroids
+        self._inverted_lists = [[] for _ in range(self.n_lists)]
+        self._add_to_lists(np.arange(self._size))
+        self._trained_size = self._size
+        LOGGER.debug("Trained the IVF index on %d vectors", self._size)
+
+    def _add_to_lists(self, indices: np.ndarray) -> None:
+        list_ids = np.argmax(
+            self._vectors[indices].astype(np.float32) @ self._centroids.T, axis=1
+        )
+        order = np.argsort(list_ids, kind="stable")
+        list_ids, indices = list_ids[order], indices[order]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(list_ids)) + 1))
+        ends = np.append(starts[1:], len(indices))
+        for start, end in zip(starts, ends):
+            self._inverted_lists[list_ids[start]].append(indices[start:end])
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: int = 5,
+        min_score: Optional[float] = None,
+    ) -> list[list[tuple[int, float]]]:
+        """
+        Searches the passages closest to each query.
+
+        Args:
+            queries (np.ndarray): The normalized query embeddings, of shape (n_queries, dim).
+            top_k (int): The maximum number of passages returned per query.
+            min_score (Optional[float]): Passages scoring under this cosine similarity are not returned.
+
+        Returns:
+            list[list[tuple[int, float]]]: For each query, the (passage index, score) of its top passages, best first.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        with self._lock:
+            if self._size == 0:
+                return [[] for _ in range(len(queries))]
+            if self._centroids is None:
+                scores = self._score(np.arange(self._size), queries)
+                return [
+                    self._top_passages(
+                        np.arange(self._size), query_scores, top_k, min_score
+                    )
+                    for query_scores in scores.T
+                ]
+
+            results = []
+            for query in queries:
+                probed_lists = np.argsort(-(self._centroids @ query))[: self.n_probe]
+                candidates = np.sort(
+                    np.concatenate(
+                        [
+                            block
+                            for list_id in probed_lists
+                            for block in self._inverted_lists[list_id]
+                        ]
+                        or [np.empty(0, dtype=np.int64)]
+                    )
+                )
+                scores = self._score(candidates, query[None, :])[:, 0]
+                results.append(self._top_passages(candidates, scores, top_k, min_score))
+            return results
+
+    def _score(self, indices: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Returns the (len(indices), n_queries) scores of the stored vectors at `indices`, block by block."""
+        scores = np.empty((len(indices), len(queries)), dtype=np.float32)
+        for start in range(0, len(indices), _SEARCH_BLOCK_SIZE):
+            block = indices[start : start + _SEARCH_BLOCK_SIZE]
+            scores[start : start + len(block)] = (
+                self._vectors[block].astype(np.float32) @ queries.T
+            )
+        return scores
+
+    def _top_passages(
+        self,
+        indices: np.ndarray,
+        scores: np.ndarray,
+        top_k: int,
+        min_score: Optional[float],
+    ) -> list[tuple[int, float]]:
+        k = min(top_k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        if min_score is not None:
+            top = top[scores[top] >= min_score]
+        return [(int(indices[idx]), float(scores[idx])) for idx in top]
@@ -1,12 +1,16 @@
 import json
-from typing import Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Union
 
+import numpy as np
 from dotenv import load_dotenv
 from pydantic import Field, create_model
 
 from common.cherry_picker import CherryPicker
+from common.chunk_store import ChunkStore
 from common.config import Configuration
 from common.deduplicate_queries import DeduplicateQueries
+from common.research_corpus import ResearchCorpus
 from common.schemas import (
     AnswerAction,
     AnswerActionContent,
@@ -19,15 +23,25 @@ from common.types import (
     AgentStopReason,
     EvaluationMetric,
     KnowledgeItem,
+    KnowledgeItemType,
     ResearchState,
     SearchResult,
 )
+from common.url_index import UrlIndex
+from common.vector_store import VectorStore
 from evaluate.evaluate_answer import AnswerEvaluator
 from evaluate.evaluate_question import QuestionEvaluator
 from llms import get_model
+from llms.cached_llm import CachedLLM
 from llms.message import Message
 from prompts.main_agent_prompts import get_main_agent_prompt
+from search import CorpusSearchProvider, SearchRouter, get_search_provider
+from utils.deadline import Deadline
+from utils.http_cache import HttpCache
 from utils.logger import get_logger
+from utils.rate_limiter import get_rate_limiter
+from utils.url_prefetcher import UrlPrefetcher
+from utils.url_utils import HostConcurrencyLimiter, PageFetcher
 
 from .answer_step import AnswerStep
 from .base_step import BaseStep
@@ -46,21 +60,149 @@ class DeepResearch:
         self.config = config
 
         self.llm = get_model(
-            provider=config.model_provider, model_name=config.model_name
+            provider=config.model_provider,
+            model_name=config.model_name,
+            max_concurrent_calls=config.max_concurrent_llm_calls,
         )
+        if config.llm_cache.enabled:
+            self.llm = CachedLLM(
+                llm=self.llm,
+                cache_dir=config.llm_cache.cache_dir,
+                ttl_seconds=config.llm_cache.ttl_seconds,
+                max_memory_entries=config.llm_cache.max_memory_entries,
+                max_disk_bytes=config.llm_cache.max_disk_bytes,
+                replay=config.llm_cache.replay,
+            )
 
-        self.answer_evaluator = AnswerEvaluator(llm=self.llm)
+        self.answer_evaluator = AnswerEvaluator(
+            llm=self.llm, concurrent=config.answer_step.concurrent_evaluation
+        )
         self.question_evaluator = QuestionEvaluator(llm=self.llm)
-        self.question_deduplicator = DeduplicateQueries(llm=self.llm)
         self.semantic_similarity_scorer = SemanticSimilarityScorer(
             batch_size=config.semantic_similarity.batch_size,
             max_length=config.semantic_similarity.max_length,
+            model_name=config.semantic_similarity.model_name,
+            cache_size=config.semantic_similarity.cache_size,
+            cache_dir=config.semantic_similarity.cache_dir,
+            backend=config.semantic_similarity.backend,
+            onnx_model_dir=config.semantic_similarity.onnx_model_dir,
+            quantize=config.semantic_similarity.quantize,
+            num_threads=config.semantic_similarity.num_threads,
+            parity_tolerance=config.semantic_similarity.parity_tolerance,
+            max_tokens_per_batch=config.semantic_similarity.max_tokens_per_batch,
+        )
+        self.question_deduplicator = DeduplicateQueries(
+            llm=self.llm,
+            similarity_scorer=(
+                self.semantic_similarity_scorer
+                if config.query_deduplication.semantic_fast_path
+                else None
+            ),
+            duplicate_threshold=config.query_deduplication.duplicate_threshold,
+            distinct_threshold=config.query_deduplication.distinct_threshold,
+        )
+        self.chunk_store = (
+            ChunkStore(
+                max_documents=config.snippet_extraction.chunk_store_max_documents
+            )
+            if config.snippet_extraction.chunk_store_max_documents > 0
+            else None
+        )
+        self.vector_store = (
+            VectorStore(
+                index=config.vector_store.index,
+                n_lists=config.vector_store.n_lists,
+                n_probe=config.vector_store.n_probe,
+                max_bytes=config.vector_store.max_bytes,
+            )
+            if config.vector_store.enabled
+            else None
+        )
+        self.corpus = (
+            ResearchCorpus(
+                directory=config.corpus.directory,
+                namespace=f"{config.semantic_similarity.model_name}:max_length={config.semantic_similarity.max_length}",
+                ttl_seconds=config.corpus.ttl_seconds,
+                compaction_ratio=config.corpus.compaction_ratio,
+            )
+            if config.corpus.enabled
+            else None
         )
         self.cherry_picker = CherryPicker(
             similarity_scorer=self.semantic_similarity_scorer,
             chunk_size=config.snippet_extraction.chunk_size,
             n_snippets=config.snippet_extraction.num_snippets,
             snippets_length=config.snippet_extraction.snippet_length,
+            chunking=config.snippet_extraction.chunking,
+            max_chunk_size=config.snippet_extraction.max_chunk_size,
+            chunk_overlap=config.snippet_extraction.chunk_overlap,
+            lexical_prefilter_top_k=config.snippet_extraction.lexical_prefilter_top_k,
+            chunk_store=self.chunk_store,
+            vector_store=self.vector_store,
+            corpus=self.corpus,
+        )
+        self.host_limiter = HostConcurrencyLimiter(
+            max_requests_per_host=config.visit_step.max_requests_per_host
+        )
+        self.page_fetcher = PageFetcher(
+            http_cache=(
+                HttpCache(
+                    directory=config.http_cache.cache_dir,
+                    ttl_seconds=config.http_cache.ttl_seconds,
+                    negative_ttl_seconds=config.http_cache.negative_ttl_seconds,
+                    max_bytes=config.http_cache.max_disk_bytes,
+                )
+                if config.http_cache.enabled
+                else None
+            ),
+            max_bytes=config.visit_step.max_page_bytes,
+            extractor=config.visit_step.html_extractor,
+            local_dir=config.search_step.local_index_dir,
+        )
+        self.url_prefetcher = (
+            UrlPrefetcher(
+                max_workers=config.visit_step.prefetch_top_n,
+                max_cached_pages=config.visit_step.prefetch_max_cached_pages,
+                max_wasted_bytes=config.visit_step.prefetch_max_wasted_bytes,
+                host_limiter=self.host_limiter,
+                page_fetcher=self.page_fetcher,
+            )
+            if config.visit_step.prefetch_top_n > 0
+            else None
+        )
+        self.search_rate_limiters = {
+            search_engine: get_rate_limiter(
+                name=f"search:{search_engine}",
+                requests_per_second=rate_limit.requests_per_second,
+                burst=rate_limit.burst,
+            )
+            for search_engine, rate_limit in config.search_step.rate_limits.items()
+        }
+        self.search_router = SearchRouter(
+            providers=[
+                get_search_provider(
+                    provider,
+                    rate_limiter=self.search_rate_limiters.get(provider),
+                    local_index_dir=config.search_step.local_index_dir,
+                    extractor=config.visit_step.html_extractor,
+                )
+                for provider in config.search_step.providers
+            ],
+            routing=config.search_step.routing,
+            weights=config.search_step.provider_weights,
+            seed=config.search_step.seed,
+            local_providers=(
+                [
+                    CorpusSearchProvider(
+                        corpus=self.corpus,
+                        similarity_scorer=self.semantic_similarity_scorer,
+                        min_similarity=config.corpus.search_min_similarity,
+                        max_results=config.corpus.search_top_k,
+                    )
+                ]
+                if self.corpus is not None
+                else None
+            ),
         )
 
     def get_prompt(
@@ -70,16 +212,18 @@ class DeepResearch:
         bad_actions: list,
         urls_to_visit: list[SearchResult],
         enforce_answer: bool = False,
+        state: Optional[ResearchState] = None,
     ):
+        state = state or self.state
         available_actions = []
         if not enforce_answer:
-            if self.state.allow_search:
+            if state.allow_search:
                 available_actions.append("search")
-            if self.state.allow_answer:
+            if state.allow_answer:
                 available_actions.append("answer")
-            if self.state.allow_reflect:
+            if state.allow_reflect:
                 available_actions.append("reflect")
-            if self.state.allow_visit:
+            if state.allow_visit:
                 available_actions.append("visit")
 
         assert (len(available_actions) > 0 and not enforce_answer) or (
@@ -97,19 +241,25 @@ class DeepResearch:
             max_decomposition_questions=self.config.reflect_step.max_decomposition_questions,
         )
 
-    def parse_current_step(self, response: str) -> BaseStep:
+    def parse_current_step(
+        self, response: str, state: Optional[ResearchState] = None
+    ) -> BaseStep:
+        state = state or self.state
         response = json.loads(response)
         action_name = list(response["action"].keys())[0]
         action_content = response["action"][action_name]
         if action_name == "search":
             return SearchStep(
                 queries=action_content["queries"],
-                state=self.state,
+                state=state,
                 question_deduplicator=self.question_deduplicator,
                 llm=self.llm,
                 action_think=response["think"],
                 max_requests=self.config.search_step.max_questions_to_search,
                 max_search_results=self.config.search_step.top_k_search_results,
+                max_concurrent_searches=self.config.search_step.max_concurrent_searches,
+                query_rewrite_mode=self.config.search_step.query_rewrite_mode,
+                search_router=self.search_router,
             )
         if action_name == "answer":
             return AnswerStep(
@@ -119,7 +269,7 @@ class DeepResearch:
                     if "references" in action_content
                     else []
                 ),
-                state=self.state,
+                state=state,
                 answer_evaluator=self.answer_evaluator,
                 llm=self.llm,
                 max_bad_attempts=self.config.answer_step.max_bad_attempts,
@@ -127,42 +277,208 @@ class DeepResearch:
         if action_name == "reflect":
             return ReflectStep(
                 questions_to_answer=action_content["questions_to_answer"],
-                state=self.state,
+                state=state,
                 question_deduplicator=self.question_deduplicator,
                 max_questions_to_answer=self.config.reflect_step.max_decomposition_questions,
             )
         if action_name == "visit":
             return VisitStep(
                 urls=action_content["urls"],
-                state=self.state,
+                state=state,
                 cherry_picker=self.cherry_picker,
                 max_urls_per_step=self.config.visit_step.max_urls_to_visit,
+                max_concurrent_requests=self.config.visit_step.max_concurrent_requests,
+                host_limiter=self.host_limiter,
+                prefetcher=self.url_prefetcher,
+                page_fetcher=self.page_fetcher,
+                cherry_pick_user_query=self.config.visit_step.cherry_pick_user_query,
+                corpus=self.corpus,
             )
         if action_name == "code":
             raise NotImplementedError("Coming soon...")
 
         raise NotImplementedError(f"Unknown action name: {action_name}")
 
+    def recall_knowledge(self, state: ResearchState) -> None:
+        """
+        Adds to the knowledge the passages already read in the session that are relevant to the current question, so
+        that it may be answered without searching or visiting again. Only the query is encoded, the passages are
+        searched in the vector store. The passages of the pages already visited for this question are skipped.
+        """
+        if len(self.vector_store) == 0:
+            return
+        question = state.current_question
+        knowledge_question = f'What do experts say about "{question}"?'
+        known_urls = {
+            item.references
+            for item in state.knowledge_items
+            if item.question == knowledge_question
+        }
+
+        (results,) = self.vector_store.search(
+            self.semantic_similarity_scorer.encode_queries([question]),
+            top_k=self.config.vector_store.recall_top_k,
+            min_score=self.config.vector_store.recall_min_similarity,
+        )
+        passages_per_url: dict[str, list[str]] = {}
+        for idx, _ in results:
+            passage = self.vector_store.get_passage(idx)
+            if (
+                question,
+                idx,
+            ) in state.recalled_passages or passage.source in known_urls:
+                continue
+            state.recalled_passages.add((question, idx))
+            passages_per_url.setdefault(passage.source, []).append(passage.text)
+
+        for url, passages in passages_per_url.items():
+            state.knowledge_items.append(
+                KnowledgeItem(
+                    type=KnowledgeItemType.FROM_VISIT_STEP,
+                    question=knowledge_question,
+                    answer="\n\n".join(passages),
+                    references=url,
+                )
+            )
+        if len(passages_per_url) > 0:
+            LOGGER.info(
+                "Recalled passages of %d already read pages for: %s",
+                len(passages_per_url),
+                question,
+            )
+
+    def research_step(self, state: ResearchState) -> BaseStep:
+        """Picks and runs the next action to research the current question of `state`."""
+        # rerank URLs
+        top_rearanked_urls = self.rerank_urls(
+            urls=state.all_urls, question=state.current_question
+        )
+        if self.url_prefetcher is not None and state.allow_visit:
+            # Fetch the most likely visits while the LLM picks the next action
+            self.url_prefetcher.prefetch(
+                [
+                    result.url
+                    for result in top_rearanked_urls
+                    if result.url not in state.visited_urls
+                ][: self.config.visit_step.prefetch_top_n],
+                deadline=state.deadline,
+            )
+
+        if self.vector_store is not None:
+            self.recall_knowledge(state)
+
+        # Get the step prompt
+        current_sys_prompt = self.get_prompt(
+            action_history=state.steps_trace,
+            bad_actions=state.bad_actions,
+            knowledge_items=state.knowledge_items,
+            urls_to_visit=top_rearanked_urls,
+            state=state,
+        )
+
+        output_schema = self.get_output_schema(state=state)
+
+        # invoke LLM prediction on current question
+        current_step_response = self.llm.complete(
+            messages=[
+                Message(role="system", content=current_sys_prompt),
+                Message(
+                    role="user",
+                    content=self.get_user_msg(
+                        state.final_answer_pip
+                        if state.current_question == state.user_query
+                        else None,
+                        question=state.current_question,
+                    ),
+                ),
+            ],
+            response_format=output_schema,
+        )
+
+        current_step = self.parse_current_step(
+            response=current_step_response, state=state
+        )
+
+        # reset allows to true
+        state.allow_answer = True
+        state.allow_search = True
+        state.allow_reflect = True
+        state.allow_visit = True
+
+        current_step.handle()
+        return current_step
+
+    def pop_parallel_gaps(self) -> list[str]:
+        """
+        Pops up to `max_parallel_gaps` pending sub-questions to research concurrently.
+        Returns no question, and leaves the gaps untouched, when less than two sub-questions are pending.
+        """
+        questions = []
+        while (
+            len(questions) < self.config.max_parallel_gaps
+            and len(self.state.gaps) > 0
+            and self.state.gaps[-1] != self.state.user_query
+        ):
+            questions.append(self.state.gaps.pop())
+
+        if len(questions) < 2:
+            self.state.gaps.extend(reversed(questions))
+            return []
+        return questions
+
+    def explore_gaps(self, questions: list[str]) -> list[BaseStep]:
+        """
+        Researches the sub-questions concurrently, each one on its own branch of the state with its own action.
+        Each branch gets its own step number, and the branches are merged back into the state in the order of
+        `questions`, whatever order they complete in.
+        """
+        LOGGER.info("Exploring %d gaps concurrently: %s", len(questions), questions)
+        branches = []
+        for idx, question in enumerate(questions):
+            branch = self.state.fork(question=question, step=self.state.step + idx)
+            branch.question_evals[question] = []
+            branches.append(branch)
+
+        with ThreadPoolExecutor(max_workers=len(branches)) as executor:
+            steps = list(executor.map(self.research_step, branches))
+
+        # As after a sequential step, only the actions the branches disabled stay disabled
+        for name in ResearchState._ALLOW_FLAGS:
+            setattr(self.state, name, True)
+        for branch in branches:
+            self.state.merge(branch)
+        self.state.current_question = questions[-1]
+        self.state.step += len(branches) - 1
+        return steps
+
     def evaluate_question(self, question: str) -> list[EvaluationMetric]:
         return self.question_evaluator.evaluate(
             question=question,
         )
 
-    def rerank_urls(self, urls: list[SearchResult]) -> list[SearchResult]:
-        if len(urls) == 0:
+    def rerank_urls(
+        self, urls: UrlIndex, question: Optional[str] = None
+    ) -> list[SearchResult]:
+        records = urls.records()
+        if len(records) == 0:
             return []
-        # Construct the urls descriptor strings
-        url_descriptors = []
-        for result in urls:
-            output = result.url + ": " + result.title
-            if len(result.description):
-                output += f" - {result.description}"
-            url_descriptors.append(output)
+
+        # Embed the url descriptors not embedded yet, the embeddings are kept in the index for the next steps
+        records_to_embed = [record for record in records if record.embedding is None]
+        if len(records_to_embed) > 0:
+            embeddings = self.semantic_similarity_scorer.encode_passages(
+                [record.descriptor for record in records_to_embed]
+            )
+            for record, embedding in zip(records_to_embed, embeddings):
+                record.embedding = embedding
 
         # Score the url descriptors w.r.t to the current question
-        scores = self.semantic_similarity_scorer.compute_similarities(
-            query=self.state.current_question, docs=url_descriptors
+        query_embedding = self.semantic_similarity_scorer.encode_query(
+            question or self.state.current_question
         )
+        scores = (
+            np.stack([record.embedding for record in records]) @ query_embedding
+        ).tolist()
 
         # Sort the urls w.r.t to their scores
         sorted_indices = [
@@ -170,15 +486,17 @@ class DeepResearch:
         ]
         reranked_urls = []
         for idx in sorted_indices[: self.config.top_k_urls_rerank]:
-            result = urls[idx]
+            result = records[idx].result
             score = scores[idx]
             result.weight = score
             reranked_urls.append(result)
 
         return reranked_urls
 
-    def get_user_msg(self, final_answer_pip: list[str] = None) -> str:
-        user_msg = f"<question> {self.state.current_question} </question>"
+    def get_user_msg(
+        self, final_answer_pip: list[str] = None, question: Optional[str] = None
+    ) -> str:
+        user_msg = f"<question> {question or self.state.current_question} </question>"
 
         if final_answer_pip and len(final_answer_pip) > 0:
             reviews = "\n".join(
@@ -198,18 +516,19 @@ class DeepResearch:
 
         return user_msg
 
-    def get_output_schema(self):
+    def get_output_schema(self, state: Optional[ResearchState] = None):
+        state = state or self.state
         available_action_schemas = []
-        if self.state.allow_answer:
+        if state.allow_answer:
             available_action_schemas.append(AnswerAction)
 
-        if self.state.allow_search:
+        if state.allow_search:
             available_action_schemas.append(SearchAction)
 
-        if self.state.allow_visit:
+        if state.allow_visit:
             available_action_schemas.append(VisitAction)
 
-        if self.state.allow_reflect:
+        if state.allow_reflect:
             available_action_schemas.append(ReflectAction)
 
         return create_model(
@@ -280,11 +599,70 @@ class DeepResearch:
 
     def __call__(self, user_query: str):
         self.state = ResearchState(user_query=user_query)
+        self.state.deadline = Deadline(
+            seconds=self.config.max_wall_clock_seconds,
+            reserve_share=self.config.final_answer_time_share,
+        )
+        self.llm.set_deadline(self.state.deadline)
+
+        if self.url_prefetcher is not None:
+            self.url_prefetcher.clear()
+        if self.chunk_store is not None:
+            self.chunk_store.clear()
+        if self.vector_store is not None:
+            self.vector_store.clear()
+        self.search_router.reset()
+
+        # Load the embedding model while the first LLM calls run
+        self.semantic_similarity_scorer.preload()
 
         # Leave out a proportion of the allowed budget for writing a final answer
         real_budget = self.config.max_token_budget * 0.85
 
         while self.llm.used_tokens < real_budget:
+            # Leave out a proportion of the allowed time for writing a final answer
+            if self.state.deadline.is_work_time_over():
+                self.state.stop_reason = AgentStopReason.MAX_TIME_BUDGET
+                break
+
+            # Research several pending sub-questions at once
+            gap_questions = self.pop_parallel_gaps()
+            if len(gap_questions) > 0:
+                steps = self.explore_gaps(questions=gap_questions)
+                final_step = None
+                if self.state.stop_reason in [
+                    AgentStopReason.TRIVIAL_ANSWER,
+                    AgentStopReason.FINAL_ANSWER_OK,
+                ]:
+                    final_step = next(
+                        step
+                        for step in steps
+                        if step.state.stop_reason == self.state.stop_reason
+                    )
+                for current_step in steps:
+                    if current_step is not final_step:
+                        yield current_step, False
+
+                if self.state.stop_reason:
+                    LOGGER.info("Stop Reason: %s", self.state.stop_reason)
+                    if final_step is not None:
+                        LOGGER.info("Here is your answer:\n %s", final_step.answer)
+                        yield final_step, True
+                        return
+
+                    if self.state.stop_reason == AgentStopReason.MAX_BAD_ATTEMPTS:
+                        LOGGER.info(
+                            "Maximum bad attempts reached, trying to get a final answer nevertheless."
+                        )
+                        break
+
+                if self.llm.used_tokens >= real_budget:
+                    self.state.stop_reason = AgentStopReason.MAX_TOKENS_BUDGET
+                    break
+
+                self.state.step += 1
+                continue
+
             self.state.current_question = (
                 self.state.user_query
                 if len(self.state.gaps) == 0
@@ -315,44 +693,7 @@ class DeepResearch:
                 self.state.allow_answer = False
                 self.state.allow_reflect = False
 
-            # rerank URLs
-            top_rearanked_urls = self.rerank_urls(urls=self.state.all_urls)
-
-            # Get the step prompt
-            current_sys_prompt = self.get_prompt(
-                action_history=self.state.steps_trace,
-                bad_actions=self.state.bad_actions,
-                knowledge_items=self.state.knowledge_items,
-                urls_to_visit=top_rearanked_urls,
-            )
-
-            output_schema = self.get_output_schema()
-
-            # invoke LLM prediction on current question
-            current_step_response = self.llm.complete(
-                messages=[
-                    Message(role="system", content=current_sys_prompt),
-                    Message(
-                        role="user",
-                        content=self.get_user_msg(
-                            self.state.final_answer_pip
-                            if self.state.current_question == user_query
-                            else None
-                        ),
-                    ),
-                ],
-                response_format=output_schema,
-            )
-
-            current_step = self.parse_current_step(response=current_step_response)
-
-            # reset allows to true
-            self.state.allow_answer = True
-            self.state.allow_search = True
-            self.state.allow_reflect = True
-            self.state.allow_visit = True
-
-            current_step.handle()
+            current_step = self.research_step(self.state)
 
             if self.state.stop_reason:
                 LOGGER.info("Stop Reason: %s", self.state.stop_reason)
@@ -381,6 +722,7 @@ class DeepResearch:
 
         if self.state.stop_reason in [
             AgentStopReason.MAX_TOKENS_BUDGET,
+            AgentStopReason.MAX_TIME_BUDGET,
             AgentStopReason.MAX_BAD_ATTEMPTS,
         ]:
             LOGGER.info("STOPPED because: %s", self.state.stop_reason)
@@ -1,18 +1,22 @@
 import json
-import random
 import re
-import time
-
-import tenacity
-import yt_dlp
-from duckduckgo_search import DDGS
-from googlesearch import search as pygoogle_search
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
 from common.deduplicate_queries import DeduplicateQueries
-from common.exceptions import CouldNotSearchQuery
-from common.schemas import QueryRewriteSchema
-from common.types import SearchResult
-from prompts.query_rewrite_prompts import get_query_rewrite_prompts
+from common.schemas import BatchQueryRewriteSchema, QueryRewriteSchema
+from common.types import QueryRewriteMode, SearchResult
+from llms.base_llm import CompletionRequest
+from prompts.query_rewrite_prompts import (
+    get_batch_query_rewrite_prompts,
+    get_query_rewrite_prompts,
+)
+from search import (
+    BaseSearchProvider,
+    DuckDuckGoSearchProvider,
+    GoogleSearchProvider,
+    SearchRouter,
+)
 from utils.logger import get_logger
 from utils.sample_k import sample_k
 
@@ -37,7 +41,8 @@ You decided to think out of the box or cut from a completely different angle.
 class SearchStep(BaseStep):
     """
     Handles a search action.
-    Re-writes, deduplicates and searches the queries on the web using google and duckduckgo, and records the trace in the agent's diary.
+    Re-writes, deduplicates and searches the queries with the search providers picked by the search router (google and
+    duckduckgo by default), and records the trace in the agent's diary.
     """
 
     def __init__(
@@ -49,6 +54,9 @@ class SearchStep(BaseStep):
         action_think: str,
         max_requests: int = 5,
         max_search_results: int = 5,
+        max_concurrent_searches: int = 1,
+        query_rewrite_mode: QueryRewriteMode = QueryRewriteMode.SEQUENTIAL,
+        search_router: Optional[SearchRouter] = None,
     ) -> None:
         super().__init__(state)
         self.queries = queries
@@ -56,6 +64,11 @@ class SearchStep(BaseStep):
         self.action_think = action_think
         self.llm = llm
         self.max_search_results = max_search_results
+        self.max_concurrent_searches = max_concurrent_searches
+        self.query_rewrite_mode = query_rewrite_mode
+        self.search_router = search_router or SearchRouter(
+            providers=[DuckDuckGoSearchProvider(), GoogleSearchProvider()]
+        )
         self.question_deduplicator: DeduplicateQueries = question_deduplicator
 
     def __repr__(self):
@@ -79,7 +92,36 @@ class SearchStep(BaseStep):
     def rewrite_queries(
         self, queries: list[str], initial_search_results: str
     ) -> list[str]:
-        rewritten_queries = []
+        rewritten_queries = self.rewrite_queries_by_source(
+            queries=queries, initial_search_results=initial_search_results
+        )
+        return [query for group in rewritten_queries.values() for query in group]
+
+    def rewrite_queries_by_source(
+        self, queries: list[str], initial_search_results: str
+    ) -> dict[str, list[dict]]:
+        """
+        Rewrites and expands each query into keyword queries, according to the query rewrite mode:
+        - sequential: one LLM call per query, one after the other.
+        - batched: a single structured LLM call for all the queries, sharing the system prompt and the action think.
+          Queries missing from the batched output are rewritten individually.
+        - concurrent: one LLM call per query, all in flight at once.
+
+        Returns:
+            dict[str, list[dict]]: The rewritten keyword queries grouped by their source query, in the order of `queries`.
+        """
+        if len(queries) == 0:
+            return {}
+        if self.query_rewrite_mode == QueryRewriteMode.BATCHED and len(queries) > 1:
+            return self.batch_rewrite_queries(
+                queries=queries, initial_search_results=initial_search_results
+            )
+        if self.query_rewrite_mode == QueryRewriteMode.CONCURRENT:
+            return self.concurrent_rewrite_queries(
+                queries=queries, initial_search_results=initial_search_results
+            )
+
+        rewritten_queries = {}
         for query in queries:
             LOGGER.info("Rewriting the query: %s", query)
             rewrite_prompt_messages = get_query_rewrite_prompts(
@@ -93,70 +135,123 @@ class SearchStep(BaseStep):
 
             LOGGER.info("Into %s", response)
 
-            rewritten_queries.extend(json.loads(response)["queries"])
+            rewritten_queries[query] = json.loads(response)["queries"]
         return rewritten_queries
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(4),
-        stop=tenacity.stop_after_attempt(3),
-        retry=tenacity.retry_if_exception_type(CouldNotSearchQuery),
-        reraise=True,
-    )
-    def google_search(self, search_query) -> list[SearchResult]:
-        LOGGER.info("(Google) Searching for query: %s", search_query)
-        try:
-            results = pygoogle_search(
-                search_query,
-                num_results=self.max_search_results,
-                safe=None,
-                unique=True,
-                advanced=True,
-            )
-            return [
-                self.process_search_result(
-                    url=result.url,
-                    title=result.title.strip(),
-                    description=result.description.strip(),
-                    weight=1,
+    def concurrent_rewrite_queries(
+        self, queries: list[str], initial_search_results: str
+    ) -> dict[str, list[dict]]:
+        LOGGER.info("Rewriting the queries concurrently: %s", queries)
+        responses = self.llm.complete_many(
+            [
+                CompletionRequest(
+                    messages=get_query_rewrite_prompts(
+                        query=query,
+                        think=self.action_think,
+                        initial_search_results=initial_search_results,
+                    ),
+                    response_format=QueryRewriteSchema,
                 )
-                for result in results
+                for query in queries
             ]
-        except Exception:
-            raise CouldNotSearchQuery(search_query)
-
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(4),
-        stop=tenacity.stop_after_attempt(3),
-        retry=tenacity.retry_if_exception_type(CouldNotSearchQuery),
-        reraise=True,
-    )
-    def duckduck_go_search(self, search_query) -> list[SearchResult]:
-        try:
-            results = DDGS().text(search_query, max_results=self.max_search_results)
-            time.sleep(2)  # avoid throttling
-            return [
-                self.process_search_result(
-                    url=result["href"],
-                    title=result["title"].strip(),
-                    description=result["body"].strip(),
-                    weight=1,
+        )
+        LOGGER.info("Into %s", responses)
+        return {
+            query: json.loads(response)["queries"]
+            for query, response in zip(queries, responses)
+        }
+
+    def batch_rewrite_queries(
+        self, queries: list[str], initial_search_results: str
+    ) -> dict[str, list[dict]]:
+        LOGGER.info("Rewriting the queries in a single batch: %s", queries)
+        response = self.llm.complete(
+            messages=get_batch_query_rewrite_prompts(
+                queries=queries,
+                think=self.action_think,
+                initial_search_results=initial_search_results,
+            ),
+            response_format=BatchQueryRewriteSchema,
+        )
+        LOGGER.info("Into %s", response)
+
+        rewrites = json.loads(response)["rewrites"]
+        rewritten_queries = {}
+        for rewrite in rewrites:
+            if rewrite["source_query"].strip() in queries:
+                rewritten_queries[rewrite["source_query"].strip()] = rewrite["queries"]
+        if len(rewritten_queries) == 0 and len(rewrites) == len(queries):
+            # Source queries were not copied verbatim, rely on the rewrites order
+            rewritten_queries = {
+                query: rewrite["queries"] for query, rewrite in zip(queries, rewrites)
+            }
+
+        missing_queries = [query for query in queries if query not in rewritten_queries]
+        if len(missing_queries) > 0:
+            LOGGER.info("Queries missing from the batch rewrite: %s", missing_queries)
+            rewritten_queries.update(
+                self.concurrent_rewrite_queries(
+                    queries=missing_queries,
+                    initial_search_results=initial_search_results,
                 )
-                for result in results
-            ]
-        except Exception:
-            raise CouldNotSearchQuery(search_query)
+            )
+        return {query: rewritten_queries[query] for query in queries}
+
+    def search_query(
+        self, query: str, providers: list[BaseSearchProvider]
+    ) -> Optional[list[SearchResult]]:
+        if self.state.deadline.is_work_time_over():
+            LOGGER.info("Out of time, skipping search query: %s", query)
+            return None
+        search_results = self.search_router.search(
+            query,
+            providers=providers,
+            max_results=self.max_search_results,
+            deadline=self.state.deadline,
+        )
+        if search_results is None:
+            return None
+        return [
+            self.process_search_result(
+                url=result.url,
+                title=result.title,
+                description=result.description,
+                weight=result.weight,
+            )
+            for result in search_results
+        ]
 
     def execute_search_queries(self, search_queries):
         successfully_searched_queries = []
         new_knowledge_items = []
-        for query in search_queries:
-            try:
-                if random.random() < 0.5:
-                    search_results = self.duckduck_go_search(search_query=query)
-                else:
-                    search_results = self.google_search(search_query=query)
-            except CouldNotSearchQuery:
+
+        # Route the queries upfront so that concurrent searches draw the same random sequence
+        routed_providers = self.search_router.route(search_queries)
+        if self.max_concurrent_searches > 1 and len(search_queries) > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(self.max_concurrent_searches, len(search_queries))
+            ) as executor:
+                all_search_results = list(
+                    executor.map(self.search_query, search_queries, routed_providers)
+                )
+        else:
+            all_search_results = [
+                self.search_query(query=query, providers=providers)
+                for query, providers in zip(search_queries, routed_providers)
+            ]
+
+        # The local results come first, they can be read without any request
+        all_local_results = self.search_router.search_local(
+            search_queries,
+            max_results=self.max_search_results,
+            deadline=self.state.deadline,
+        )
+        for query, local_results, search_results in zip(
+            search_queries, all_local_results, all_search_results
+        ):
+            if search_results is None and len(local_results) == 0:
                 continue
+            search_results = local_results + (search_results or [])
 
             # knowledge_item = KnowledgeItem(
             #    question=f'What do internet say about "{query}"?',
@@ -166,7 +261,7 @@ class SearchStep(BaseStep):
             # )
             # new_knowledge_items.append(knowledge_item)
 
-            self.state.all_urls.extend(search_results)
+            self.state.all_urls.extend(search_results, source_query=query)
 
             successfully_searched_queries.append(query)
 
@@ -184,6 +279,9 @@ class SearchStep(BaseStep):
     ) -> tuple[str, str]:
         if "youtube.com/watch" in url or "youtu.be/" in url:
             try:
+                # yt_dlp is slow to import, only load it when a youtube url shows up
+                import yt_dlp
+
                 with yt_dlp.YoutubeDL({"quiet": True}) as ydl:
                     info = ydl.extract_info(url, download=False)
                     return info.get("title", title), info.get(
@@ -251,7 +349,7 @@ class SearchStep(BaseStep):
         if len(searched_rewritten_queries) == 0 or len(rewritten_keyword_queries) == 0:
             self.state.steps_trace.append(
                 _NO_RESULT_DIARY_MESSAGE.format(
-                    step=self.state.stpe,
+                    step=self.state.step,
                     current_question=self.state.current_question,
                     formatted_keyword_queries=", ".join(
                         [query["q"] for query in rewritten_keyword_queries]
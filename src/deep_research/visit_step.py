@@ -1,8 +1,13 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
+
 from common.cherry_picker import CherryPicker
 from common.exceptions import CouldNotReadUrl
+from common.research_corpus import ResearchCorpus
 from common.types import KnowledgeItem, KnowledgeItemType
 from utils.logger import get_logger
-from utils.url_utils import get_url_content_as_markdown
+from utils.url_prefetcher import UrlPrefetcher
+from utils.url_utils import HostConcurrencyLimiter, PageFetcher, is_local_url
 
 from .base_step import BaseStep
 
@@ -31,12 +36,28 @@ class VisitStep(BaseStep):
     """
 
     def __init__(
-        self, state, urls, cherry_picker: CherryPicker, max_urls_per_step: int = 4
+        self,
+        state,
+        urls,
+        cherry_picker: CherryPicker,
+        max_urls_per_step: int = 4,
+        max_concurrent_requests: int = 1,
+        host_limiter: Optional[HostConcurrencyLimiter] = None,
+        prefetcher: Optional[UrlPrefetcher] = None,
+        page_fetcher: Optional[PageFetcher] = None,
+        cherry_pick_user_query: bool = False,
+        corpus: Optional[ResearchCorpus] = None,
     ):
         super().__init__(state=state)
         self.urls = urls
         self.max_urls_per_step = max_urls_per_step
         self.cherry_picker = cherry_picker
+        self.max_concurrent_requests = max_concurrent_requests
+        self.host_limiter = host_limiter or HostConcurrencyLimiter()
+        self.prefetcher = prefetcher
+        self.page_fetcher = page_fetcher or PageFetcher()
+        self.cherry_pick_user_query = cherry_pick_user_query
+        self.corpus = corpus
 
     def __repr__(self):
         return f"VisitStep(step={self.state.step}, current_question={self.state.current_question}, urls={self.urls}, max_urls_per_step={self.max_urls_per_step})"
@@ -47,27 +68,88 @@ class VisitStep(BaseStep):
         f_urls = "\n- ".join(self.urls)
         return f"""Visiting urls:\n- {f_urls}"""
 
+    def fetch_url(self, url: str) -> Optional[str]:
+        """Returns the content of the url, or None if it was not fetched because the research is out of time."""
+        if self.state.deadline.is_work_time_over():
+            LOGGER.info("Out of time, skipping URL: %s", url)
+            return None
+        if self.prefetcher is not None:
+            prefetched_content = self.prefetcher.pop(url)
+            if prefetched_content is not None:
+                LOGGER.info("Using the prefetched content of URL: %s", url)
+                try:
+                    return prefetched_content.result(
+                        timeout=self.state.deadline.timeout(default=20)
+                    )
+                except TimeoutError:
+                    LOGGER.info(
+                        "The prefetch of URL %s is taking too long, fetching it directly",
+                        url,
+                    )
+        if self.corpus is not None:
+            stored_content = self.corpus.get_document(url)
+            if stored_content is not None:
+                LOGGER.info("Using the content of URL stored in the corpus: %s", url)
+                return stored_content
+        with self.host_limiter.limit(url):
+            return self.page_fetcher.fetch(
+                url=url,
+                timeout=self.state.deadline.timeout(default=20),
+                deadline=self.state.deadline,
+            )
+
+    def get_questions(self) -> list[str]:
+        """Returns the questions to cherry pick snippets for: the current question, and the user query if enabled."""
+        questions = [self.state.current_question]
+        if self.cherry_pick_user_query and self.state.user_query not in questions:
+            questions.append(self.state.user_query)
+        return questions
+
+    def cherry_pick(self, content: str, url: Optional[str] = None) -> dict[str, str]:
+        """Returns the snippets of the content relevant to each question, the content is encoded once for all of them."""
+        LOGGER.debug(
+            "Cherry picking snippets from content with length %d (chars)",
+            len(content),
+        )
+        questions = self.get_questions()
+        return dict(
+            zip(
+                questions,
+                self.cherry_picker.cherry_pick_many(
+                    questions=questions, text=content, source=url
+                ),
+            )
+        )
+
+    def add_knowledge_items(
+        self, url: str, cherry_picked_contents: dict[str, str]
+    ) -> None:
+        for question, cherry_picked_content in cherry_picked_contents.items():
+            # The snippets of the current question are always kept, as a trace of the visit
+            if question != self.state.current_question and not cherry_picked_content:
+                continue
+            self.state.knowledge_items.append(
+                KnowledgeItem(
+                    type=KnowledgeItemType.FROM_VISIT_STEP,
+                    question=f'What do experts say about "{question}"?',
+                    answer=cherry_picked_content,
+                    references=url,
+                )
+            )
+
     def visit_urls(self, urls: list[str]) -> tuple[list[str], list[str]]:
+        if self.max_concurrent_requests > 1 and len(urls) > 1:
+            return self.visit_urls_concurrently(urls=urls)
+
         visited_urls, bad_urls = [], []
         for url in urls:
             LOGGER.info("Visiting URL: %s", url)
             try:
-                content = get_url_content_as_markdown(url=url)
-                LOGGER.debug(
-                    "Cherry picking snippets from content with length %d (chars)",
-                    len(content),
-                )
-                cherry_picked_content = self.cherry_picker.cherry_pick(
-                    question=self.state.current_question,
-                    text=content,
-                )
-                self.state.knowledge_items.append(
-                    KnowledgeItem(
-                        type=KnowledgeItemType.FROM_VISIT_STEP,
-                        question=f'What do experts say about "{self.state.current_question}"?',
-                        answer=cherry_picked_content,
-                        references=url,
-                    )
+                content = self.fetch_url(url=url)
+                if content is None:
+                    continue
+                self.add_knowledge_items(
+                    url=url, cherry_picked_contents=self.cherry_pick(content, url=url)
                 )
                 visited_urls.append(url)
             except CouldNotReadUrl:
@@ -77,11 +159,50 @@ class VisitStep(BaseStep):
         LOGGER.info("Bad urls: %s", bad_urls)
         return visited_urls, bad_urls
 
+    def visit_urls_concurrently(self, urls: list[str]) -> tuple[list[str], list[str]]:
+        """
+        Fetches the urls on a bounded thread pool, over the shared keep-alive connection pool and within the per host
+        concurrency limits. Each page is cherry picked as soon as its fetch completes, while the other fetches are
+        still running. Knowledge items are then recorded in the order of `urls`, as in a sequential visit.
+        """
+        cherry_picked_contents = {}
+        bad_urls = set()
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_concurrent_requests, len(urls))
+        ) as executor:
+            futures = {}
+            for url in urls:
+                LOGGER.info("Visiting URL: %s", url)
+                futures[executor.submit(self.fetch_url, url)] = url
+
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    content = future.result()
+                    if content is not None:
+                        cherry_picked_contents[url] = self.cherry_pick(content, url=url)
+                except CouldNotReadUrl:
+                    bad_urls.add(url)
+
+        visited_urls = []
+        for url in urls:
+            if url in cherry_picked_contents:
+                self.add_knowledge_items(
+                    url=url, cherry_picked_contents=cherry_picked_contents[url]
+                )
+                visited_urls.append(url)
+        bad_urls = [url for url in urls if url in bad_urls]
+
+        LOGGER.info("Visited urls: %s", visited_urls)
+        LOGGER.info("Bad urls: %s", bad_urls)
+        return visited_urls, bad_urls
+
     def filter_urls(self, urls: list[str]) -> list[str]:
         return [
             url
             for url in urls
-            if url.startswith("http") and url not in self.state.visited_urls
+            if (url.startswith("http") or is_local_url(url))
+            and url not in self.state.visited_urls
         ][: self.max_urls_per_step]
 
     def handle(self):
@@ -92,17 +213,14 @@ class VisitStep(BaseStep):
         if len(self.urls) > 0:
             visited_urls, bad_urls = self.visit_urls(urls=self.urls)
             self.state.visited_urls.extend(visited_urls)  # Keep track of visited urls
-            self.state.all_urls = [
-                url
-                for url in self.state.all_urls
-                if url not in bad_urls  # filter out bad urls
-            ]
+            self.state.bad_urls.extend(bad_urls)
+            self.state.all_urls.remove(bad_urls)  # filter out bad urls
 
             if len(visited_urls) > 0:
                 self.state.steps_trace.append(
                     _VISIT_URL_SUCCESS_DIARY.format(
                         step=self.state.step,
-                        formatted_visited_urls=f"- {'\n- '.join(self.state.visited_urls)}",
+                        formatted_visited_urls=f"- {'\n- '.join(self.state.visited_urls.urls())}",
                     )
                 )
             else:  # no visited_url
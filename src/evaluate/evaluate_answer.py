@@ -1,3 +1,4 @@
+import asyncio
 import json
 from typing import Type
 
@@ -29,12 +30,67 @@ LOGGER = get_logger(__name__, step="OTHER")
 class AnswerEvaluator:
     """Evaluates the agent's answer w.r.t to the defined evaluation metrics using an LLM as a judge approach"""
 
-    def __init__(self, llm: BaseLLM):
+    def __init__(self, llm: BaseLLM, concurrent: bool = False):
         self.llm = llm
+        self.concurrent = concurrent
 
     def _run_eval(self, messages: list[Message], schema: Type[BaseModel] = None) -> str:
         return self.llm.complete(messages, response_format=schema)
 
+    async def _arun_eval(
+        self, messages: list[Message], schema: Type[BaseModel] = None
+    ) -> str:
+        return await self.llm.acomplete(messages, response_format=schema)
+
+    def get_eval_prompts(
+        self,
+        evaluation_type: EvaluationMetric,
+        question: str,
+        answer: str,
+        knowledge_items: list[KnowledgeItem],
+    ) -> tuple[list[Message], Type[BaseModel]]:
+        """
+        Builds the LLM judge prompts and the output schema of an evaluation metric.
+
+        Raises:
+            ValueError: If an unknown evaluation metric is provided.
+        """
+        if evaluation_type == EvaluationMetric.ATTRIBUTION:
+            schema = AttributionEvaluationSchema
+            prompts = get_attribution_eval_prompts(
+                question=question,
+                answer=answer,
+                knowledge_items=knowledge_items,
+            )
+        elif evaluation_type == EvaluationMetric.DEFINITIVE:
+            prompts = get_definitive_eval_prompts(question=question, answer=answer)
+            schema = DefaultEvaluationSchema
+        elif evaluation_type == EvaluationMetric.FRESHNESS:
+            prompts = get_freshness_eval_prompts(question=question, answer=answer)
+            schema = DefaultEvaluationSchema
+        elif evaluation_type == EvaluationMetric.PLURALITY:
+            prompts = get_plurality_eval_prompts(question=question, answer=answer)
+            schema = PluralityEvaluationSchema
+        elif evaluation_type == EvaluationMetric.COMPLETENESS:
+            prompts = get_completeness_eval_prompts(question=question, answer=answer)
+            schema = CompletenessEvaluationSchema
+        elif evaluation_type == EvaluationMetric.STRICT:
+            prompts = get_strict_eval_prompts(
+                question=question, answer=answer, knowledge_items=knowledge_items
+            )
+            schema = StrictEvaluationSchema
+        else:
+            raise ValueError(f"Unknown evaluation type {evaluation_type}")
+        return prompts, schema
+
+    def get_empty_knowledge_evaluation(self, question: str) -> dict:
+        LOGGER.info("Knowledge items are empty for question %s", question)
+        return {
+            "pass": False,
+            "think": "The knowledge is completely empty and the answer can not be derived from it. Need to search or visit URLs.",
+            "type": "attribution",
+        }
+
     def evaluate(
         self,
         question: str,
@@ -50,6 +106,8 @@ class AnswerEvaluator:
         - Invoke the LLM judge to get the evaluation
         - Returns early if any evaluation fails
 
+        In concurrent mode, all the LLM judges are invoked at once (see `aevaluate`).
+
         Special handling is applied for attribution:
         - If no knowledge items are available, a failure result is returned immediately.
 
@@ -67,45 +125,30 @@ class AnswerEvaluator:
         Raises:
             ValueError: If an unknown evaluation metric is provided.
         """
-        results = {}
-        for evaluation_type in evaluation_metrics:
-            if evaluation_type == EvaluationMetric.ATTRIBUTION:
-                if len(knowledge_items) == 0:
-                    LOGGER.info("Knowledge items are empty for question %s", question)
-                    return {
-                        "pass": False,
-                        "think": "The knowledge is completely empty and the answer can not be derived from it. Need to search or visit URLs.",
-                        "type": "attribution",
-                    }
-                else:
-                    schema = AttributionEvaluationSchema
-                    prompts = get_attribution_eval_prompts(
-                        question=question,
-                        answer=answer,
-                        knowledge_items=knowledge_items,
-                    )
-            elif evaluation_type == EvaluationMetric.DEFINITIVE:
-                prompts = get_definitive_eval_prompts(question=question, answer=answer)
-                schema = DefaultEvaluationSchema
-            elif evaluation_type == EvaluationMetric.FRESHNESS:
-                prompts = get_freshness_eval_prompts(question=question, answer=answer)
-                schema = DefaultEvaluationSchema
-            elif evaluation_type == EvaluationMetric.PLURALITY:
-                prompts = get_plurality_eval_prompts(question=question, answer=answer)
-                schema = PluralityEvaluationSchema
-            elif evaluation_type == EvaluationMetric.COMPLETENESS:
-                prompts = get_completeness_eval_prompts(
-                    question=question, answer=answer
+        if self.concurrent:
+            return self.llm.run_coroutine(
+                self.aevaluate(
+                    question=question,
+                    answer=answer,
+                    knowledge_items=knowledge_items,
+                    evaluation_metrics=evaluation_metrics,
                 )
-                schema = CompletenessEvaluationSchema
-            elif evaluation_type == EvaluationMetric.STRICT:
-                prompts = get_strict_eval_prompts(
-                    question=question, answer=answer, knowledge_items=knowledge_items
-                )
-                schema = StrictEvaluationSchema
-            else:
-                raise ValueError(f"Unknown evaluation type {evaluation_type}")
+            )
 
+        results = {}
+        for evaluation_type in evaluation_metrics:
+            if (
+                evaluation_type == EvaluationMetric.ATTRIBUTION
+                and len(knowledge_items) == 0
+            ):
+                return self.get_empty_knowledge_evaluation(question=question)
+
+            prompts, schema = self.get_eval_prompts(
+                evaluation_type=evaluation_type,
+                question=question,
+                answer=answer,
+                knowledge_items=knowledge_items,
+            )
             evaluation_str = self._run_eval(messages=prompts, schema=schema)
             evaluation = json.loads(evaluation_str)
             evaluation["type"] = evaluation_type
@@ -122,3 +165,67 @@ class AnswerEvaluator:
 
         LOGGER.info("All evals passed for question %s: %s", question, results)
         return {"pass": True, "think": "You passed all the tests"}
+
+    async def aevaluate(
+        self,
+        question: str,
+        answer: str,
+        knowledge_items: list[KnowledgeItem],
+        evaluation_metrics: list[EvaluationMetric],
+    ) -> dict:
+        """
+        Concurrent variant of `evaluate`, returning the same result.
+
+        All the evaluation prompts are sent at once. The evaluations are then awaited in the order of
+        `evaluation_metrics`, so the first failure returned is the one the sequential order would return, as soon as
+        every evaluation before it has passed. The remaining in-flight evaluations are then cancelled.
+        """
+        evaluations = []
+        empty_knowledge_failure = False
+        for evaluation_type in evaluation_metrics:
+            if (
+                evaluation_type == EvaluationMetric.ATTRIBUTION
+                and len(knowledge_items) == 0
+            ):
+                # Nothing after this metric would be evaluated sequentially
+                empty_knowledge_failure = True
+                break
+            prompts, schema = self.get_eval_prompts(
+                evaluation_type=evaluation_type,
+                question=question,
+                answer=answer,
+                knowledge_items=knowledge_items,
+            )
+            evaluations.append(
+                (
+                    evaluation_type,
+                    asyncio.create_task(
+                        self._arun_eval(messages=prompts, schema=schema)
+                    ),
+                )
+            )
+
+        results = {}
+        try:
+            for evaluation_type, task in evaluations:
+                evaluation = json.loads(await task)
+                evaluation["type"] = evaluation_type
+
+                if not evaluation["pass"]:
+                    LOGGER.info(
+                        "Eval %s failed for question %s: %s",
+                        evaluation_type,
+                        question,
+                        evaluation,
+                    )
+                    return evaluation
+                results["evaluation_type"] = evaluation
+        finally:
+            for _, task in evaluations:
+                task.cancel()
+
+        if empty_knowledge_failure:
+            return self.get_empty_knowledge_evaluation(question=question)
+
+        LOGGER.info("All evals passed for question %s: %s", question, results)
+        return {"pass": True, "think": "You passed all the tests"}
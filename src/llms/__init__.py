@@ -12,14 +12,24 @@ class Provider(str, Enum):
     MISTRAL = "mistral"
 
 
-def get_model(provider: Provider, model_name: str) -> BaseLLM:
+def get_model(
+    provider: Provider, model_name: str, max_concurrent_calls: int = 4
+) -> BaseLLM:
     if provider == Provider.MISTRAL:
         if "MISTRAL_API_KEY" not in os.environ:
             raise ValueError("Could not find env variable 'MISTRAL_API_KEY'")
-        return MistralLLM(api_key=os.getenv("MISTRAL_API_KEY"), model_name=model_name)
+        return MistralLLM(
+            api_key=os.getenv("MISTRAL_API_KEY"),
+            model_name=model_name,
+            max_concurrent_calls=max_concurrent_calls,
+        )
     if provider == Provider.OPENAI:
         if "OPENAI_API_KEY" not in os.environ:
             raise ValueError("Could not find env variable 'OPENAI_API_KEY'")
-        return OpenAILLM(api_key=os.getenv("OPENAI_API_KEY"), model_name=model_name)
+        return OpenAILLM(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            model_name=model_name,
+            max_concurrent_calls=max_concurrent_calls,
+        )
     else:
         raise ValueError(f"Unsupported provider '{provider}'")
@@ -1,13 +1,54 @@
+import asyncio
+import threading
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Coroutine, Optional
 
 from pydantic import BaseModel
 
+from utils.deadline import Deadline
+
 from .message import Message
 
 
+@dataclass
+class CompletionRequest:
+    """The arguments of a single completion call."""
+
+    messages: list[Message]
+    temperature: float = 0.0
+    max_tokens: int = None
+    response_format: type[BaseModel] = None
+
+
 class BaseLLM(ABC):
-    def __init__(self, model_name: str):
+    def __init__(self, model_name: str, max_concurrent_calls: int = 4):
         self.model_name = model_name
+        self.max_concurrent_calls = max_concurrent_calls
+        self._used_tokens = 0
+        self._used_tokens_lock = threading.Lock()
+        self._event_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event_loop_lock = threading.Lock()
+        self.deadline: Optional[Deadline] = None
+
+    @property
+    def used_tokens(self) -> int:
+        return self._used_tokens
+
+    def add_used_tokens(self, n_tokens: int) -> None:
+        with self._used_tokens_lock:
+            self._used_tokens += n_tokens
+
+    def set_deadline(self, deadline: Optional[Deadline]) -> None:
+        """Bounds the duration of the next calls by the time left before `deadline`."""
+        self.deadline = deadline
+
+    def request_timeout(self) -> Optional[float]:
+        """Returns the timeout in seconds of a call, None to keep the default timeout of the client."""
+        if self.deadline is None:
+            return None
+        # The final answer is written within the reserved time, calls may use it
+        return self.deadline.timeout(include_reserve=True)
 
     @abstractmethod
     def complete(
@@ -18,3 +59,80 @@ class BaseLLM(ABC):
         response_format: type[BaseModel] = None,
     ) -> str:
         raise NotImplementedError
+
+    async def acomplete(
+        self,
+        messages: list[Message],
+        temperature: float = 0.0,
+        max_tokens: int = None,
+        response_format: type[BaseModel] = None,
+    ) -> str:
+        """
+        Async counterpart of `complete`.
+        Runs `complete` in a worker thread by default, providers override it with their native async client.
+        """
+        return await asyncio.to_thread(
+            self.complete,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            response_format=response_format,
+        )
+
+    async def acomplete_many(
+        self,
+        requests: list[CompletionRequest],
+        max_concurrent_calls: Optional[int] = None,
+    ) -> list[str]:
+        """
+        Runs the completion requests concurrently, with at most `max_concurrent_calls` calls in flight.
+
+        Returns:
+            list[str]: The completion of each request, in the order of `requests`.
+        """
+        semaphore = asyncio.Semaphore(max_concurrent_calls or self.max_concurrent_calls)
+
+        async def run(request: CompletionRequest) -> str:
+            async with semaphore:
+                return await self.acomplete(
+                    messages=request.messages,
+                    temperature=request.temperature,
+                    max_tokens=request.max_tokens,
+                    response_format=request.response_format,
+                )
+
+        return list(await asyncio.gather(*(run(request) for request in requests)))
+
+    def complete_many(
+        self,
+        requests: list[CompletionRequest],
+        max_concurrent_calls: Optional[int] = None,
+    ) -> list[str]:
+        """Blocking counterpart of `acomplete_many`, to fan out independent calls from synchronous code."""
+        return self.run_coroutine(
+            self.acomplete_many(
+                requests=requests, max_concurrent_calls=max_concurrent_calls
+            )
+        )
+
+    def run_coroutine(self, coroutine: Coroutine) -> Any:
+        """
+        Runs the coroutine on the event loop of this LLM and blocks until it completes.
+
+        The loop runs forever in a background thread, so the async clients, which are bound to the loop they were first
+        used on, always run on the same loop whatever the calling thread.
+        """
+        return asyncio.run_coroutine_threadsafe(
+            coroutine, self._get_event_loop()
+        ).result()
+
+    def _get_event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._event_loop_lock:
+            if self._event_loop is None:
+                self._event_loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._event_loop.run_forever,
+                    name=f"{self.__class__.__name__}-event-loop",
+                    daemon=True,
+                ).start()
+            return self._event_loop
@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import asdict
+from typing import Optional
+
+from pydantic import BaseModel
+
+from common.exceptions import LLMCacheMiss
+from utils.date_utils import mask_datetimes
+from utils.deadline import Deadline
+from utils.disk_cache import DiskCache
+from utils.logger import get_logger
+from utils.lru_cache import LRUCache
+
+from .base_llm import BaseLLM
+from .message import Message
+
+LOGGER = get_logger(__name__, step="OTHER")
+
+
+class CachedLLM(BaseLLM):
+    """
+    Wraps an LLM with a response cache.
+
+    Completions are keyed by a canonical hash of the model name, the messages, the sampling parameters and the JSON
+    schema of the response format, with the current datetime the prompts are rendered with masked out so that a rerun or
+    a replay of a research hits the cache whenever it runs. They are stored in memory and, when `cache_dir` is set, in
+    a local file store with TTL and size based eviction, shared across sessions.
+    A cache hit does not call the wrapped LLM, hence does not count in `used_tokens`.
+    In replay mode, completions are only served from the cache and a miss raises `LLMCacheMiss`.
+    """
+
+    def __init__(
+        self,
+        llm: BaseLLM,
+        cache_dir: Optional[str | os.PathLike] = None,
+        ttl_seconds: Optional[float] = None,
+        max_memory_entries: int = 1_000,
+        max_disk_bytes: Optional[int] = None,
+        replay: bool = False,
+    ):
+        super().__init__(
+            model_name=llm.model_name, max_concurrent_calls=llm.max_concurrent_calls
+        )
+        self.llm = llm
+        self.ttl_seconds = ttl_seconds
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+        self._memory = LRUCache(max_size=max_memory_entries)
+        self._disk = (
+            DiskCache(
+                directory=cache_dir, ttl_seconds=ttl_seconds, max_bytes=max_disk_bytes
+            )
+            if cache_dir is not None
+            else None
+        )
+
+    @property
+    def used_tokens(self) -> int:
+        return self.llm.used_tokens
+
+    def _get_event_loop(self) -> asyncio.AbstractEventLoop:
+        # Share the event loop of the wrapped LLM, its async clients are bound to it
+        return self.llm._get_event_loop()
+
+    def set_deadline(self, deadline: Optional[Deadline]) -> None:
+        super().set_deadline(deadline)
+        self.llm.set_deadline(deadline)
+
+    @property
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def cache_key(
+        self,
+        messages: list[Message],
+        temperature: float = 0.0,
+        max_tokens: int = None,
+        response_format: type[BaseModel] = None,
+    ) -> str:
+        payload = {
+            "model_name": self.model_name,
+            "messages": [
+                {**asdict(message), "content": mask_datetimes(message.content)}
+                for message in messages
+            ],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "response_format": (
+                response_format.model_json_schema() if response_format else None
+            ),
+        }
+        canonical_payload = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical_payload.encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str) -> Optional[str]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            created_at, response = entry
+            if self.ttl_seconds is None or time.time() - created_at <= self.ttl_seconds:
+                return response
+            self._memory.pop(key)
+
+        if self._disk is not None:
+            response = self._disk.get(key)
+            if response is not None:
+                self._memory.put(key, (time.time(), response))
+                return response
+        return None
+
+    def _store(self, key: str, response: str) -> None:
+        self._memory.put(key, (time.time(), response))
+        if self._disk is not None:
+            self._disk.set(key, response)
+
+    def _record(self, hit: bool) -> None:
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        LOGGER.debug(
+            "LLM cache %s (hits=%d, misses=%d)",
+            "hit" if hit else "miss",
+            self.hits,
+            self.misses,
+        )
+
+    def _get_cached_response(self, key: str) -> Optional[str]:
+        response = self._lookup(key)
+        self._record(hit=response is not None)
+        if response is None and self.replay:
+            raise LLMCacheMiss(f"No cached completion for key {key} in replay mode")
+        return response
+
+    def complete(
+        self,
+        messages: list[Message],
+        temperature: float = 0.0,
+        max_tokens: int = None,
+        response_format: type[BaseModel] = None,
+    ) -> str:
+        key = self.cache_key(messages, temperature, max_tokens, response_format)
+        response = self._get_cached_response(key)
+        if response is None:
+            response = self.llm.complete(
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                response_format=response_format,
+            )
+            self._store(key, response)
+        return response
+
+    async def acomplete(
+        self,
+        messages: list[Message],
+        temperature: float = 0.0,
+        max_tokens: int = None,
+        response_format: type[BaseModel] = None,
+    ) -> str:
+        key = self.cache_key(messages, temperature, max_tokens, response_format)
+        response = self._get_cached_response(key)
+        if response is None:
+            response = await self.llm.acomplete(
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                response_format=response_format,
+            )
+            self._store(key, response)
+        return response
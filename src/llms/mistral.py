@@ -1,5 +1,6 @@
 import json
 from dataclasses import asdict
+from typing import Optional
 
 import mistralai
 import tenacity
@@ -16,18 +17,20 @@ class MistralLLM(BaseLLM):
         api_key: str,
         model_name: str = "mistral-large-latest",
         seed: int = 1234,
+        max_concurrent_calls: int = 4,
     ):
-        super().__init__(model_name=model_name)
+        super().__init__(
+            model_name=model_name, max_concurrent_calls=max_concurrent_calls
+        )
         self._client = Mistral(api_key=api_key)
-        self._used_tokens = 0
         self.seed = seed
 
     def convert_messages(self, messages: list[Message]) -> list[dict]:
         return [asdict(message) for message in messages]
 
-    @property
-    def used_tokens(self):
-        return self._used_tokens
+    def request_timeout_ms(self) -> Optional[int]:
+        timeout = self.request_timeout()
+        return int(timeout * 1000) if timeout is not None else None
 
     @tenacity.retry(
         wait=tenacity.wait_fixed(5),
@@ -51,6 +54,7 @@ class MistralLLM(BaseLLM):
                 random_seed=self.seed,
                 temperature=temperature,
                 max_tokens=max_tokens,
+                timeout_ms=self.request_timeout_ms(),
                 response_format=response_format,
             )
         else:
@@ -60,7 +64,46 @@ class MistralLLM(BaseLLM):
                 random_seed=self.seed,
                 temperature=temperature,
                 max_tokens=max_tokens,
+                timeout_ms=self.request_timeout_ms(),
             )
 
-        self._used_tokens += chat_response.usage.total_tokens
+        self.add_used_tokens(chat_response.usage.total_tokens)
+        return chat_response.choices[0].message.content
+
+    @tenacity.retry(
+        wait=tenacity.wait_fixed(5),
+        stop=tenacity.stop_after_attempt(2),
+        retry=tenacity.retry_if_exception_type(
+            (json.decoder.JSONDecodeError, mistralai.models.sdkerror.SDKError)
+        ),
+        reraise=True,
+    )
+    async def acomplete(
+        self,
+        messages: list[Message],
+        temperature: float = 0.0,
+        max_tokens: int = None,
+        response_format: type[BaseModel] = None,
+    ) -> str:
+        if response_format:
+            chat_response = await self._client.chat.parse_async(
+                model=self.model_name,
+                messages=self.convert_messages(messages),
+                random_seed=self.seed,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout_ms=self.request_timeout_ms(),
+                response_format=response_format,
+            )
+        else:
+            chat_response = await self._client.chat.complete_async(
+                model=self.model_name,
+                messages=self.convert_messages(messages),
+                random_seed=self.seed,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout_ms=self.request_timeout_ms(),
+            )
+
+        self.add_used_tokens(chat_response.usage.total_tokens)
         return chat_response.choices[0].message.content
@@ -2,7 +2,7 @@ import json
 from dataclasses import asdict
 
 import tenacity
-from openai import OpenAI
+from openai import NOT_GIVEN, AsyncOpenAI, OpenAI
 from pydantic import BaseModel
 
 from .base_llm import BaseLLM
@@ -14,10 +14,13 @@ class OpenAILLM(BaseLLM):
         self,
         api_key: str,
         model_name: str = "gpt-4.1",
+        max_concurrent_calls: int = 4,
     ):
-        super().__init__(model_name=model_name)
+        super().__init__(
+            model_name=model_name, max_concurrent_calls=max_concurrent_calls
+        )
         self._client = OpenAI(api_key=api_key)
-        self._used_tokens = 0
+        self._async_client = AsyncOpenAI(api_key=api_key)
 
     def convert_messages(self, messages: list[Message]) -> list[dict]:
         return [self.transform_message(message) for message in messages]
@@ -27,10 +30,6 @@ class OpenAILLM(BaseLLM):
         msg["role"] = "developer" if msg["role"] == "system" else msg["role"]
         return msg
 
-    @property
-    def used_tokens(self):
-        return self._used_tokens
-
     @tenacity.retry(
         wait=tenacity.wait_fixed(1),
         stop=tenacity.stop_after_attempt(2),
@@ -50,6 +49,7 @@ class OpenAILLM(BaseLLM):
                 input=self.convert_messages(messages),
                 temperature=temperature,
                 max_output_tokens=max_tokens,
+                timeout=self.request_timeout() or NOT_GIVEN,
                 text_format=response_format,
             )
         else:
@@ -58,7 +58,42 @@ class OpenAILLM(BaseLLM):
                 input=self.convert_messages(messages),
                 temperature=temperature,
                 max_output_tokens=max_tokens,
+                timeout=self.request_timeout() or NOT_GIVEN,
+            )
+
+        self.add_used_tokens(chat_response.usage.total_tokens)
+        return chat_response.output_text
+
+    @tenacity.retry(
+        wait=tenacity.wait_fixed(1),
+        stop=tenacity.stop_after_attempt(2),
+        retry=tenacity.retry_if_exception_type(json.decoder.JSONDecodeError),
+        reraise=True,
+    )
+    async def acomplete(
+        self,
+        messages: list[Message],
+        temperature: float = 0.0,
+        max_tokens: int = None,
+        response_format: type[BaseModel] = None,
+    ) -> str:
+        if response_format:
+            chat_response = await self._async_client.responses.parse(
+                model=self.model_name,
+                input=self.convert_messages(messages),
+                temperature=temperature,
+                max_output_tokens=max_tokens,
+                timeout=self.request_timeout() or NOT_GIVEN,
+                text_format=response_format,
+            )
+        else:
+            chat_response = await self._async_client.responses.create(
+                model=self.model_name,
+                input=self.convert_messages(messages),
+                temperature=temperature,
+                max_output_tokens=max_tokens,
+                timeout=self.request_timeout() or NOT_GIVEN,
             )
 
-        self._used_tokens += chat_response.usage.total_tokens
-        return chat_response.choices[0].message.content
+        self.add_used_tokens(chat_response.usage.total_tokens)
+        return chat_response.output_text
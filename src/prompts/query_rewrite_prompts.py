@@ -25,3 +25,20 @@ def get_query_rewrite_prompts(
         Message(role="system", content=system_content),
         Message(role="user", content=user_content),
     ]
+
+
+def get_batch_query_rewrite_prompts(
+    queries: list[str], think: str, initial_search_results: list[str]
+) -> list[Message]:
+    system_template = env.get_template("query_rewrite_sys_prompt_template.j2")
+    user_template = env.get_template("query_rewrite_batch_user_prompt_template.j2")
+
+    system_content = system_template.render(current_datetime=get_current_datetime())
+    user_content = user_template.render(
+        queries=queries, think=think, search_results=initial_search_results
+    )
+
+    return [
+        Message(role="system", content=system_content),
+        Message(role="user", content=user_content),
+    ]
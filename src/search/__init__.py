@@ -0,0 +1,39 @@
+from typing import Optional
+
+from common.types import SearchProviderType
+from utils.rate_limiter import TokenBucketRateLimiter
+
+from .base_search import BaseSearchProvider
+from .corpus import CorpusSearchProvider
+from .duckduckgo import DuckDuckGoSearchProvider
+from .google import GoogleSearchProvider
+from .local_index import LocalIndexSearchProvider
+from .router import SearchRouter
+
+__all__ = [
+    "BaseSearchProvider",
+    "CorpusSearchProvider",
+    "DuckDuckGoSearchProvider",
+    "GoogleSearchProvider",
+    "LocalIndexSearchProvider",
+    "SearchRouter",
+    "get_search_provider",
+]
+
+
+def get_search_provider(
+    provider: SearchProviderType,
+    rate_limiter: Optional[TokenBucketRateLimiter] = None,
+    local_index_dir: Optional[str] = None,
+    extractor: str = "markdownify",
+) -> BaseSearchProvider:
+    if provider == SearchProviderType.DUCKDUCKGO:
+        return DuckDuckGoSearchProvider(rate_limiter=rate_limiter)
+    if provider == SearchProviderType.GOOGLE:
+        return GoogleSearchProvider(rate_limiter=rate_limiter)
+    if provider == SearchProviderType.LOCAL_INDEX:
+        if local_index_dir is None:
+            raise ValueError("The local_index search provider needs a local_index_dir")
+        return LocalIndexSearchProvider(directory=local_index_dir, extractor=extractor)
+    else:
+        raise ValueError(f"Unsupported search provider '{provider}'")
@@ -0,0 +1,54 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from common.types import SearchResult
+from utils.deadline import Deadline
+from utils.rate_limiter import TokenBucketRateLimiter
+
+
+class BaseSearchProvider(ABC):
+    """A source of search results for a query, e.g. a web search engine or a local index."""
+
+    name: str
+    # Timeout in seconds of a search request, capped by the deadline of the research
+    timeout: Optional[float] = None
+
+    def __init__(self, rate_limiter: Optional[TokenBucketRateLimiter] = None):
+        self.rate_limiter = rate_limiter
+
+    def wait_for_rate_limit(self) -> None:
+        # avoid throttling
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+    def get_timeout(self, deadline: Optional[Deadline] = None) -> Optional[float]:
+        if deadline is None:
+            return self.timeout
+        return deadline.timeout(default=self.timeout)
+
+    @abstractmethod
+    def search(
+        self, query: str, max_results: int = 5, deadline: Optional[Deadline] = None
+    ) -> list[SearchResult]:
+        """
+        Returns the search results of the query, best first.
+
+        Raises:
+            CouldNotSearchQuery: If the query could not be searched.
+        """
+        raise NotImplementedError
+
+    def search_many(
+        self,
+        queries: list[str],
+        max_results: int = 5,
+        deadline: Optional[Deadline] = None,
+    ) -> list[list[SearchResult]]:
+        """
+        Returns the search results of each query, searched one after the other by default. Providers override it when
+        they can search several queries at once.
+        """
+        return [
+            self.search(query, max_results=max_results, deadline=deadline)
+            for query in queries
+        ]
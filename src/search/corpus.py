@@ -0,0 +1,76 @@
+from typing import Optional
+
+from common.research_corpus import ResearchCorpus
+from common.semantic_similarity import SemanticSimilarityScorer
+from common.types import SearchResult
+from utils.deadline import Deadline
+from utils.logger import get_logger
+
+from .base_search import BaseSearchProvider
+
+LOGGER = get_logger(__name__, step="SEARCH")
+
+
+class CorpusSearchProvider(BaseSearchProvider):
+    """
+    Searches the local corpus of the documents read in previous sessions. The documents are ranked by their best
+    chunk, which is used as the description of the result. `max_results`, if set, overrides the number of results
+    asked by the caller.
+    """
+
+    name = "corpus"
+
+    def __init__(
+        self,
+        corpus: ResearchCorpus,
+        similarity_scorer: SemanticSimilarityScorer,
+        min_similarity: Optional[float] = None,
+        max_results: Optional[int] = None,
+    ):
+        super().__init__()
+        self.corpus = corpus
+        self.similarity_scorer = similarity_scorer
+        self.min_similarity = min_similarity
+        self.max_results = max_results
+
+    def search(
+        self, query: str, max_results: int = 5, deadline: Optional[Deadline] = None
+    ) -> list[SearchResult]:
+        return self.search_many([query], max_results=max_results, deadline=deadline)[0]
+
+    def search_many(
+        self,
+        queries: list[str],
+        max_results: int = 5,
+        deadline: Optional[Deadline] = None,
+    ) -> list[list[SearchResult]]:
+        """Searches all the queries with a single encoding of the queries."""
+        max_results = self.max_results or max_results
+        if len(self.corpus) == 0 or len(queries) == 0:
+            return [[] for _ in queries]
+
+        query_embeddings = self.similarity_scorer.encode_queries(queries)
+        # Several chunks of a document can match, search more chunks than the documents to return
+        all_passages = self.corpus.search(
+            query_embeddings, top_k=4 * max_results, min_score=self.min_similarity
+        )
+        all_search_results = []
+        for query, passages in zip(queries, all_passages):
+            search_results = {}
+            for passage, _ in passages:
+                if passage.source in search_results:
+                    continue
+                title = passage.text.strip().split("\n")[0].lstrip("#").strip()
+                search_results[passage.source] = SearchResult(
+                    url=passage.source,
+                    title=title[:100],
+                    description=passage.text.strip(),
+                    weight=1,
+                )
+                if len(search_results) == max_results:
+                    break
+            LOGGER.info(
+                "(Corpus) Found %d documents for query: %s", len(search_results), query
+            )
+            all_search_results.append(list(search_results.values()))
+        return all_search_results
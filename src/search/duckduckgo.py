@@ -0,0 +1,47 @@
+from typing import Optional
+
+import tenacity
+
+from common.exceptions import CouldNotSearchQuery
+from common.types import SearchResult
+from utils.deadline import Deadline
+from utils.logger import get_logger
+from utils.retry import stop_at_deadline, wait_within_deadline
+
+from .base_search import BaseSearchProvider
+
+LOGGER = get_logger(__name__, step="SEARCH")
+
+
+class DuckDuckGoSearchProvider(BaseSearchProvider):
+    name = "duckduckgo"
+    timeout = 10
+
+    @tenacity.retry(
+        wait=wait_within_deadline(tenacity.wait_fixed(4)),
+        stop=tenacity.stop_after_attempt(3) | stop_at_deadline(),
+        retry=tenacity.retry_if_exception_type(CouldNotSearchQuery),
+        reraise=True,
+    )
+    def search(
+        self, query: str, max_results: int = 5, deadline: Optional[Deadline] = None
+    ) -> list[SearchResult]:
+        LOGGER.info("(DuckDuckGo) Searching for query: %s", query)
+        from duckduckgo_search import DDGS
+
+        self.wait_for_rate_limit()
+        try:
+            results = DDGS(timeout=self.get_timeout(deadline)).text(
+                query, max_results=max_results
+            )
+            return [
+                SearchResult(
+                    url=result["href"],
+                    title=result["title"].strip(),
+                    description=result["body"].strip(),
+                    weight=1,
+                )
+                for result in results
+            ]
+        except Exception:
+            raise CouldNotSearchQuery(query)
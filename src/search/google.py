@@ -0,0 +1,52 @@
+from typing import Optional
+
+import tenacity
+
+from common.exceptions import CouldNotSearchQuery
+from common.types import SearchResult
+from utils.deadline import Deadline
+from utils.logger import get_logger
+from utils.retry import stop_at_deadline, wait_within_deadline
+
+from .base_search import BaseSearchProvider
+
+LOGGER = get_logger(__name__, step="SEARCH")
+
+
+class GoogleSearchProvider(BaseSearchProvider):
+    name = "google"
+    timeout = 5
+
+    @tenacity.retry(
+        wait=wait_within_deadline(tenacity.wait_fixed(4)),
+        stop=tenacity.stop_after_attempt(3) | stop_at_deadline(),
+        retry=tenacity.retry_if_exception_type(CouldNotSearchQuery),
+        reraise=True,
+    )
+    def search(
+        self, query: str, max_results: int = 5, deadline: Optional[Deadline] = None
+    ) -> list[SearchResult]:
+        LOGGER.info("(Google) Searching for query: %s", query)
+        from googlesearch import search as pygoogle_search
+
+        self.wait_for_rate_limit()
+        try:
+            results = pygoogle_search(
+                query,
+                num_results=max_results,
+                safe=None,
+                unique=True,
+                advanced=True,
+                timeout=self.get_timeout(deadline),
+            )
+            return [
+                SearchResult(
+                    url=result.url,
+                    title=result.title.strip(),
+                    description=result.description.strip(),
+                    weight=1,
+                )
+                for result in results
+            ]
+        except Exception:
+            raise CouldNotSearchQuery(query)
@@ -0,0 +1,120 @@
+import html
+import os
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from common.exceptions import CouldNotSearchQuery
+from common.lexical import BM25, InvertedIndex
+from common.types import SearchResult
+from utils.deadline import Deadline
+from utils.logger import get_logger
+from utils.url_utils import html_to_markdown
+
+from .base_search import BaseSearchProvider
+
+LOGGER = get_logger(__name__, step="SEARCH")
+
+_HTML_SUFFIXES = {".html", ".htm"}
+_TEXT_SUFFIXES = {".md", ".markdown", ".txt"}
+_HTML_TITLE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+_MARKDOWN_HEADING = re.compile(r"^#{1,6}[ \t]+(.+)$", re.MULTILINE)
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n")
+_MAX_DESCRIPTION_LENGTH = 300
+
+
+@dataclass
+class LocalDocument:
+    url: str
+    title: str
+    text: str
+
+
+class LocalIndexSearchProvider(BaseSearchProvider):
+    """
+    Searches a local collection of HTML, markdown and text files, without any network access.
+
+    The files of `directory` are converted to markdown and indexed with BM25 in an inverted index when the provider is
+    created, in path order so that the same collection always gives the same results. The results point to the
+    file:// URLs of the files, which the visit step reads from the disk. The description of a result is the paragraph
+    of the document matching the query best.
+    """
+
+    name = "local_index"
+
+    def __init__(self, directory: str | os.PathLike, extractor: str = "markdownify"):
+        super().__init__()
+        self.directory = Path(directory)
+        self.extractor = extractor
+        self.documents: list[LocalDocument] = []
+        self.index = InvertedIndex()
+        if not self.directory.is_dir():
+            raise ValueError(f"The local index directory does not exist: {directory}")
+        self.build()
+
+    def build(self) -> None:
+        start = time.perf_counter()
+        for path in sorted(self.directory.rglob("*")):
+            suffix = path.suffix.lower()
+            if not path.is_file() or suffix not in _HTML_SUFFIXES | _TEXT_SUFFIXES:
+                continue
+            try:
+                document = self.read_document(path)
+            except (OSError, ValueError) as e:
+                LOGGER.warning("Could not index %s: %s", path, e)
+                continue
+            self.documents.append(document)
+            self.index.add(f"{document.title}\n{document.text}")
+        LOGGER.info(
+            "Indexed %d local documents from %s in %.2fs",
+            len(self.documents),
+            self.directory,
+            time.perf_counter() - start,
+        )
+
+    def read_document(self, path: Path) -> LocalDocument:
+        content = path.read_text(encoding="utf-8", errors="replace")
+        title = None
+        if path.suffix.lower() in _HTML_SUFFIXES:
+            title_match = _HTML_TITLE.search(content)
+            if title_match is not None:
+                title = html.unescape(" ".join(title_match.group(1).split()))
+            text = html_to_markdown(content, extractor=self.extractor)
+        else:
+            text = content
+        if not title:
+            heading_match = _MARKDOWN_HEADING.search(text)
+            title = heading_match.group(1).strip() if heading_match else path.stem
+        return LocalDocument(url=path.resolve().as_uri(), title=title, text=text)
+
+    def get_description(self, query: str, text: str) -> str:
+        paragraphs = [
+            paragraph.strip()
+            for paragraph in _PARAGRAPH_BREAK.split(text)
+            if paragraph.strip()
+        ]
+        if len(paragraphs) == 0:
+            return ""
+        scores = BM25(paragraphs).score(query)
+        best_paragraph = paragraphs[int(scores.argmax())]
+        return " ".join(best_paragraph.split())[:_MAX_DESCRIPTION_LENGTH]
+
+    def search(
+        self, query: str, max_results: int = 5, deadline: Optional[Deadline] = None
+    ) -> list[SearchResult]:
+        LOGGER.info("(Local index) Searching for query: %s", query)
+        try:
+            matches = self.index.search(query, top_k=max_results)
+        except Exception:
+            raise CouldNotSearchQuery(query)
+        return [
+            SearchResult(
+                url=self.documents[doc_idx].url,
+                title=self.documents[doc_idx].title,
+                description=self.get_description(query, self.documents[doc_idx].text),
+                weight=1,
+            )
+            for doc_idx, _ in matches
+        ]
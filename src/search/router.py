@@ -0,0 +1,153 @@
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from common.exceptions import CouldNotSearchQuery
+from common.types import SearchResult, SearchRouting
+from utils.deadline import Deadline
+from utils.logger import get_logger
+from utils.url_utils import normalize_url
+
+from .base_search import BaseSearchProvider
+
+LOGGER = get_logger(__name__, step="SEARCH")
+
+
+class SearchRouter:
+    """
+    Routes the search queries to the search providers, according to the routing:
+    - weighted: each query is searched with a single provider, drawn at random according to the provider weights.
+    - failover: the providers are tried in order, until one of them returns results.
+    - parallel: all the providers are searched at once, and their results merged by reciprocal rank fusion.
+
+    The local providers, if any, are searched for every query in addition to the routed providers, their results
+    coming first. The random draws come from a generator seeded with `seed` and reset by `reset`, so that a research
+    session routes its queries the same way from one run to the other. Without seed, the draws are not reproducible.
+    """
+
+    def __init__(
+        self,
+        providers: list[BaseSearchProvider],
+        routing: SearchRouting = SearchRouting.WEIGHTED,
+        weights: Optional[dict[str, float]] = None,
+        seed: Optional[int] = None,
+        local_providers: Optional[list[BaseSearchProvider]] = None,
+        rank_fusion_k: int = 60,
+    ):
+        if len(providers) == 0:
+            raise ValueError("At least one search provider is required")
+        self.providers = providers
+        self.routing = routing
+        self.weights = [
+            (weights or {}).get(provider.name, 1.0) for provider in providers
+        ]
+        self.seed = seed
+        self.local_providers = local_providers or []
+        self.rank_fusion_k = rank_fusion_k
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Resets the random generator of the weighted routing to its seed."""
+        with self._lock:
+            self._rng = random.Random(self.seed)
+
+    def route(self, queries: list[str]) -> list[list[BaseSearchProvider]]:
+        """
+        Returns the providers to search for each query. They are picked upfront, so that concurrent searches draw the
+        same random sequence.
+        """
+        if self.routing != SearchRouting.WEIGHTED:
+            return [self.providers for _ in queries]
+        with self._lock:
+            return [
+                self._rng.choices(self.providers, weights=self.weights) for _ in queries
+            ]
+
+    def search(
+        self,
+        query: str,
+        providers: list[BaseSearchProvider],
+        max_results: int = 5,
+        deadline: Optional[Deadline] = None,
+    ) -> Optional[list[SearchResult]]:
+        """Searches the query with its routed providers, returns None if none of them could search it."""
+        if self.routing == SearchRouting.PARALLEL and len(providers) > 1:
+            return self.search_parallel(query, providers, max_results, deadline)
+
+        search_results = None
+        for provider in providers:
+            try:
+                search_results = provider.search(
+                    query, max_results=max_results, deadline=deadline
+                )
+            except CouldNotSearchQuery:
+                LOGGER.info("(%s) Could not search query: %s", provider.name, query)
+                continue
+            if len(search_results) > 0:
+                break
+        return search_results
+
+    def search_parallel(
+        self,
+        query: str,
+        providers: list[BaseSearchProvider],
+        max_results: int = 5,
+        deadline: Optional[Deadline] = None,
+    ) -> Optional[list[SearchResult]]:
+        def search_provider(provider: BaseSearchProvider):
+            try:
+                return provider.search(
+                    query, max_results=max_results, deadline=deadline
+                )
+            except CouldNotSearchQuery:
+                LOGGER.info("(%s) Could not search query: %s", provider.name, query)
+                return None
+
+        with ThreadPoolExecutor(max_workers=len(providers)) as executor:
+            all_search_results = list(executor.map(search_provider, providers))
+        if all(search_results is None for search_results in all_search_results):
+            return None
+        return self.merge(
+            [search_results or [] for search_results in all_search_results],
+            max_results=max_results,
+        )
+
+    def merge(
+        self, all_search_results: list[list[SearchResult]], max_results: int
+    ) -> list[SearchResult]:
+        """
+        Merges the results of several providers by reciprocal rank fusion, the results of a URL returned by several
+        providers being merged into its first one. Ties are broken by the order of the providers.
+        """
+        scores: dict[str, float] = {}
+        merged_results: dict[str, SearchResult] = {}
+        for search_results in all_search_results:
+            for rank, search_result in enumerate(search_results):
+                key = normalize_url(search_result.url)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (
+                    self.rank_fusion_k + rank + 1
+                )
+                merged_results.setdefault(key, search_result)
+        ranked_keys = sorted(merged_results, key=lambda key: -scores[key])
+        return [merged_results[key] for key in ranked_keys[:max_results]]
+
+    def search_local(
+        self,
+        queries: list[str],
+        max_results: int = 5,
+        deadline: Optional[Deadline] = None,
+    ) -> list[list[SearchResult]]:
+        """Searches all the queries with the local providers, whose results are concatenated in their order."""
+        all_search_results = [[] for _ in queries]
+        for provider in self.local_providers:
+            try:
+                provider_results = provider.search_many(
+                    queries, max_results=max_results, deadline=deadline
+                )
+            except CouldNotSearchQuery:
+                continue
+            for search_results, results in zip(all_search_results, provider_results):
+                search_results.extend(results)
+        return all_search_results
@@ -91,6 +91,8 @@ def stop_reason(reason: AgentStopReason) -> str:
         return " : Maximum Bad attempts exceeded"
     if reason == AgentStopReason.MAX_TOKENS_BUDGET:
         return " : Token budget exhausted"
+    if reason == AgentStopReason.MAX_TIME_BUDGET:
+        return " : Time budget exhausted"
     return ""
 
 
@@ -1,5 +1,18 @@
+import calendar
+import re
 from datetime import datetime
 
+DATETIME_FORMAT = "%d %B %Y %H:%M"
+# Datetimes formatted by `get_current_datetime`, e.g. "07 March 2025 14:05"
+_DATETIME_PATTERN = re.compile(
+    rf"\b\d{{2}} (?:{'|'.join(calendar.month_name[1:])}) \d{{4}} \d{{2}}:\d{{2}}\b"
+)
+
 
 def get_current_datetime() -> str:
-    return datetime.now().strftime("%d %B %Y %H:%M")
+    return datetime.now().strftime(DATETIME_FORMAT)
+
+
+def mask_datetimes(text: str, mask: str = "<datetime>") -> str:
+    """Replaces the datetimes formatted as by `get_current_datetime` in the text, e.g. to compare prompts over time."""
+    return _DATETIME_PATTERN.sub(mask, text)
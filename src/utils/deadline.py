@@ -0,0 +1,61 @@
+import math
+import time
+from typing import Optional
+
+
+class Deadline:
+    """
+    Wall clock budget of a research session.
+
+    A share of the budget is reserved for writing the final answer: the research work (searching, visiting, reasoning)
+    stops once only the reserve is left, and the per-call timeouts given to the work never reach into it.
+    Without `seconds`, the deadline never expires and the default timeouts are used unchanged.
+    """
+
+    def __init__(
+        self,
+        seconds: Optional[float] = None,
+        reserve_share: float = 0.15,
+        min_timeout: float = 1.0,
+    ):
+        self.seconds = seconds
+        self.reserve_seconds = seconds * reserve_share if seconds is not None else 0.0
+        self.min_timeout = min_timeout
+        self.started_at = time.monotonic()
+
+    @property
+    def is_set(self) -> bool:
+        return self.seconds is not None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining(self) -> float:
+        """Returns the time left before the deadline, reserve included."""
+        if self.seconds is None:
+            return math.inf
+        return self.seconds - self.elapsed()
+
+    def work_remaining(self) -> float:
+        """Returns the time left for the research work, i.e. before the reserve of the final answer."""
+        return self.remaining() - self.reserve_seconds
+
+    def is_work_time_over(self) -> bool:
+        return self.work_remaining() <= 0
+
+    def timeout(
+        self, default: Optional[float] = None, include_reserve: bool = False
+    ) -> Optional[float]:
+        """
+        Returns the timeout of a single call: the default timeout capped by the time left, and never below
+        `min_timeout` so that a call started late still gets a chance to complete.
+
+        Args:
+            default (Optional[float]): The timeout of the call without deadline, None for no timeout.
+            include_reserve (bool): Whether the call may use the time reserved for the final answer.
+        """
+        if self.seconds is None:
+            return default
+        remaining = self.remaining() if include_reserve else self.work_remaining()
+        remaining = max(remaining, self.min_timeout)
+        return remaining if default is None else min(default, remaining)
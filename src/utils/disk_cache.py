@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+
+class DiskCache:
+    """
+    Local file store of JSON serializable values, one file per key.
+
+    Entries older than `ttl_seconds` are expired on read. When the store grows beyond `max_bytes`, the least recently
+    used entries are evicted first (reads refresh the modification time of an entry).
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        ttl_seconds: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self.directory = Path(directory)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._total_bytes = sum(path.stat().st_size for path in self._entry_paths())
+
+    def _entry_paths(self) -> list[Path]:
+        return list(self.directory.glob("*/*.json"))
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if self.ttl_seconds is not None and (
+            time.time() - entry["created_at"] > self.ttl_seconds
+        ):
+            self.delete(key)
+            return None
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return entry["value"]
+
+    def set(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        content = json.dumps({"created_at": time.time(), "value": value})
+
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        with self._lock:
+            previous_size = path.stat().st_size if path.exists() else 0
+            os.replace(tmp_path, path)
+            self._total_bytes += path.stat().st_size - previous_size
+        self._evict()
+
+    def delete(self, key: str) -> None:
+        path = self._path(key)
+        with self._lock:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+                self._total_bytes -= size
+            except FileNotFoundError:
+                pass
+
+    def _evict(self) -> None:
+        if self.max_bytes is None or self._total_bytes <= self.max_bytes:
+            return
+
+        with self._lock:
+            entries = []
+            for path in self._entry_paths():
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            self._total_bytes = sum(size for _, size, _ in entries)
+
+            for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+                if self._total_bytes <= self.max_bytes:
+                    break
+                try:
+                    path.unlink()
+                    self._total_bytes -= size
+                except FileNotFoundError:
+                    pass
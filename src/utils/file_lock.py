@@ -0,0 +1,28 @@
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: str | os.PathLike):
+    """
+    Holds an exclusive lock on the file at `path`, created if needed, across the processes and the threads locking it.
+
+    Used around the writes of the stores shared by several processes, e.g. several research sessions using the same
+    cache directory. Without `fcntl` (Windows), the lock is a no-op and the stores must not be shared.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
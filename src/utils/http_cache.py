@@ -0,0 +1,99 @@
+import hashlib
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from utils.disk_cache import DiskCache
+from utils.url_utils import normalize_url
+
+
+@dataclass
+class CachedPage:
+    url: str
+    fetched_at: float
+    markdown: Optional[str] = None
+    raw: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    error: Optional[str] = None
+    extractor: Optional[str] = None
+
+    @property
+    def is_error(self) -> bool:
+        return self.error is not None
+
+    @property
+    def validators(self) -> dict[str, str]:
+        """Returns the headers of a conditional request revalidating the page."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    On-disk cache of fetched pages, shared across sessions, holding both the raw response and the converted markdown.
+
+    A page younger than `ttl_seconds` is served without any request, an older one is revalidated with a conditional
+    request (ETag / Last-Modified). Failed fetches are kept as negative entries for `negative_ttl_seconds`, so that a
+    URL that just failed is not fetched again. The least recently used pages are evicted beyond `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        ttl_seconds: float = 86_400,
+        negative_ttl_seconds: float = 900,
+        max_bytes: Optional[int] = None,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        # Stale pages are kept to be revalidated, only the size bound evicts them
+        self._disk = DiskCache(directory=directory, max_bytes=max_bytes)
+
+    def key(self, url: str) -> str:
+        return hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        entry = self._disk.get(self.key(url))
+        return CachedPage(**entry) if entry is not None else None
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        ttl_seconds = self.negative_ttl_seconds if page.is_error else self.ttl_seconds
+        return time.time() - page.fetched_at <= ttl_seconds
+
+    def put(self, page: CachedPage) -> None:
+        self._disk.set(self.key(page.url), asdict(page))
+
+    def put_page(
+        self,
+        url: str,
+        markdown: str,
+        raw: Optional[str],
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        extractor: Optional[str] = None,
+    ) -> None:
+        self.put(
+            CachedPage(
+                url=url,
+                fetched_at=time.time(),
+                markdown=markdown,
+                raw=raw,
+                etag=etag,
+                last_modified=last_modified,
+                extractor=extractor,
+            )
+        )
+
+    def refresh(self, page: CachedPage) -> None:
+        """Marks a page revalidated by the server as fresh again."""
+        page.fetched_at = time.time()
+        self.put(page)
+
+    def put_error(self, url: str, error: str) -> None:
+        self.put(CachedPage(url=url, fetched_at=time.time(), error=error))
@@ -0,0 +1,83 @@
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+
+class MemoryMappedMatrix:
+    """
+    Append-only 2D matrix stored as raw rows in a single file and read back through `numpy.memmap`.
+
+    Rows are only ever appended, so a reader never has to load the whole file in memory.
+    A trailing partial row (e.g. after an interrupted write) is ignored and overwritten by the next append.
+    Rows are appended at the actual end of the file, which other processes may have extended: the callers sharing the
+    file across processes hold a `file_lock` around their appends.
+    """
+
+    def __init__(self, path: str | os.PathLike, dim: int, dtype: np.dtype = np.float16):
+        self.path = Path(path)
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self._row_bytes = self.dim * self.dtype.itemsize
+        self._lock = threading.Lock()
+        self._view = None
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.touch(exist_ok=True)
+        self._n_rows = self.path.stat().st_size // self._row_bytes
+
+    def refresh(self) -> int:
+        """Updates the number of rows from the size of the file, e.g. after appends of other processes, and returns it."""
+        with self._lock:
+            n_rows = self.path.stat().st_size // self._row_bytes
+            if n_rows != self._n_rows:
+                self._n_rows = n_rows
+                self._view = None
+            return n_rows
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+    @property
+    def nbytes(self) -> int:
+        return self._n_rows * self._row_bytes
+
+    def append(self, rows: np.ndarray) -> int:
+        """Appends `rows` at the end of the matrix and returns the index of the first appended row."""
+        rows = np.ascontiguousarray(rows, dtype=self.dtype).reshape(-1, self.dim)
+        with self._lock:
+            with open(self.path, "r+b") as f:
+                start = os.fstat(f.fileno()).st_size // self._row_bytes
+                f.seek(start * self._row_bytes)
+                f.write(rows.tobytes())
+            self._n_rows = start + len(rows)
+            self._view = None
+        return start
+
+    def truncate(self, n_rows: int) -> None:
+        """Drops every row after the first `n_rows`."""
+        with self._lock:
+            with open(self.path, "r+b") as f:
+                n_rows = min(n_rows, os.fstat(f.fileno()).st_size // self._row_bytes)
+                f.truncate(n_rows * self._row_bytes)
+            self._n_rows = n_rows
+            self._view = None
+
+    def view(self) -> np.ndarray:
+        """Returns a read-only (n_rows, dim) view of the matrix, backed by the file."""
+        with self._lock:
+            if self._view is None:
+                if self._n_rows == 0:
+                    self._view = np.empty((0, self.dim), dtype=self.dtype)
+                else:
+                    self._view = np.memmap(
+                        self.path,
+                        dtype=self.dtype,
+                        mode="r",
+                        shape=(self._n_rows, self.dim),
+                    )
+            return self._view
+
+    def __getitem__(self, index) -> np.ndarray:
+        return self.view()[index]
@@ -0,0 +1,66 @@
+import threading
+import time
+
+_RATE_LIMITERS: dict[str, "TokenBucketRateLimiter"] = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+
+class TokenBucketRateLimiter:
+    """
+    Thread-safe token bucket rate limiter.
+
+    The bucket holds up to `burst` tokens and is refilled at `requests_per_second`. Each request takes a token,
+    so calls only wait when the bucket is empty, i.e. when the rate limit would otherwise be exceeded.
+    """
+
+    def __init__(self, requests_per_second: float, burst: int = 1):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def configure(self, requests_per_second: float, burst: int = 1) -> None:
+        with self._lock:
+            self._refill()
+            self.requests_per_second = requests_per_second
+            self.burst = burst
+            self._tokens = min(self._tokens, burst)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst,
+            self._tokens + (now - self._last_refill) * self.requests_per_second,
+        )
+        self._last_refill = now
+
+    def acquire(self) -> None:
+        """Blocks until a token is available and takes it."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.requests_per_second
+            time.sleep(wait_time)
+
+
+def get_rate_limiter(
+    name: str, requests_per_second: float, burst: int = 1
+) -> TokenBucketRateLimiter:
+    """
+    Returns the process wide rate limiter registered under `name`, creating it on first use.
+    The same limiter is shared by every step and research session of the process.
+    """
+    with _RATE_LIMITERS_LOCK:
+        rate_limiter = _RATE_LIMITERS.get(name)
+        if rate_limiter is None:
+            rate_limiter = TokenBucketRateLimiter(
+                requests_per_second=requests_per_second, burst=burst
+            )
+            _RATE_LIMITERS[name] = rate_limiter
+        else:
+            rate_limiter.configure(requests_per_second=requests_per_second, burst=burst)
+        return rate_limiter
@@ -0,0 +1,42 @@
+import inspect
+from typing import Optional
+
+import tenacity
+
+from utils.deadline import Deadline
+
+
+def get_deadline(retry_state: tenacity.RetryCallState) -> Optional[Deadline]:
+    """Returns the `deadline` argument of the retried call, None if it has none."""
+    deadline = retry_state.kwargs.get("deadline")
+    if deadline is None and len(retry_state.args) > 0:
+        try:
+            arguments = inspect.signature(retry_state.fn).bind_partial(
+                *retry_state.args, **retry_state.kwargs
+            )
+        except TypeError:
+            return None
+        deadline = arguments.arguments.get("deadline")
+    return deadline
+
+
+class stop_at_deadline(tenacity.stop.stop_base):
+    """Stops retrying once the research work time of the `deadline` argument of the retried call is over."""
+
+    def __call__(self, retry_state: tenacity.RetryCallState) -> bool:
+        deadline = get_deadline(retry_state)
+        return deadline is not None and deadline.is_work_time_over()
+
+
+class wait_within_deadline(tenacity.wait.wait_base):
+    """Waits as `wait` does, capped by the timeout left by the `deadline` argument of the retried call."""
+
+    def __init__(self, wait: tenacity.wait.wait_base):
+        self.wait = wait
+
+    def __call__(self, retry_state: tenacity.RetryCallState) -> float:
+        seconds = self.wait(retry_state)
+        deadline = get_deadline(retry_state)
+        if deadline is None:
+            return seconds
+        return deadline.timeout(default=seconds)
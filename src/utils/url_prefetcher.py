@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from utils.deadline import Deadline
+from utils.logger import get_logger
+from utils.url_utils import HostConcurrencyLimiter, PageFetcher, normalize_url
+
+LOGGER = get_logger(__name__, step="VISIT")
+
+
+class UrlPrefetcher:
+    """
+    Speculatively fetches and converts pages in the background, before a visit action asks for them.
+
+    Prefetched pages are kept in a bounded cache until a visit consumes them. The pages fetched but never consumed
+    are counted as wasted bytes, once `max_wasted_bytes` is reached no new prefetch is started.
+    The cap is approximate: the size of a page is only known once it is downloaded, so the pages already in flight or
+    cached when it is reached are still completed, and can exceed it by up to `max_cached_pages` pages.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_cached_pages: int = 16,
+        max_wasted_bytes: int = 20_000_000,
+        host_limiter: Optional[HostConcurrencyLimiter] = None,
+        page_fetcher: Optional[PageFetcher] = None,
+    ):
+        self.max_cached_pages = max_cached_pages
+        self.max_wasted_bytes = max_wasted_bytes
+        self.host_limiter = host_limiter or HostConcurrencyLimiter()
+        self.page_fetcher = page_fetcher or PageFetcher()
+        self.wasted_bytes = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="UrlPrefetcher"
+        )
+        self._pages: OrderedDict[str, Future] = OrderedDict()
+        # Reentrant, the waste of a page discarded once complete is added by the thread discarding it
+        self._lock = threading.RLock()
+
+    def _fetch(self, url: str, deadline: Optional[Deadline]) -> str:
+        with self.host_limiter.limit(url):
+            if deadline is None:
+                return self.page_fetcher.fetch(url=url)
+            return self.page_fetcher.fetch(
+                url=url, timeout=deadline.timeout(default=20), deadline=deadline
+            )
+
+    def prefetch(self, urls: list[str], deadline: Optional[Deadline] = None) -> None:
+        """
+        Starts fetching the urls not prefetched yet, while the wasted bytes are under budget.
+        With a `deadline`, the downloads and their retries are bounded by it, as the visits are.
+        """
+        with self._lock:
+            for url in urls:
+                if self.wasted_bytes >= self.max_wasted_bytes:
+                    LOGGER.debug("Prefetch budget exhausted, skipping %s", url)
+                    return
+                key = normalize_url(url)
+                if key in self._pages:
+                    continue
+                while len(self._pages) >= self.max_cached_pages:
+                    self._discard(self._pages.popitem(last=False)[1])
+                LOGGER.debug("Prefetching %s", url)
+                self._pages[key] = self._executor.submit(self._fetch, url, deadline)
+
+    def pop(self, url: str) -> Optional[Future]:
+        """
+        Takes the prefetch of the url out of the cache.
+
+        Returns:
+            Optional[Future]: The future of the page content, possibly still running, None if it was not prefetched.
+        """
+        with self._lock:
+            return self._pages.pop(normalize_url(url), None)
+
+    def clear(self) -> None:
+        """Drops every prefetched page and resets the wasted bytes budget."""
+        with self._lock:
+            while len(self._pages) > 0:
+                self._discard(self._pages.popitem(last=False)[1])
+            LOGGER.debug("%d prefetched bytes were never visited", self.wasted_bytes)
+            self.wasted_bytes = 0
+
+    def _discard(self, future: Future) -> None:
+        # Pages not started are not downloaded at all, the others are accounted as waste once complete
+        if not future.cancel():
+            future.add_done_callback(self._add_waste)
+
+    def _add_waste(self, future: Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        with self._lock:
+            self.wasted_bytes += len(future.result().encode("utf-8"))
@@ -1,10 +1,103 @@
+import io
+import mimetypes
 import re
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlsplit, urlunsplit
+from urllib.request import url2pathname
 
 import requests
 import tenacity
-from markdownify import markdownify
+from bs4 import BeautifulSoup, Tag
+from markdownify import MarkdownConverter, markdownify
+from requests.adapters import HTTPAdapter
 
-from common.exceptions import CouldNotReadUrl
+from common.exceptions import CouldNotReadUrl, UnsupportedContent
+from utils.deadline import Deadline
+from utils.logger import get_logger
+from utils.retry import stop_at_deadline, wait_within_deadline
+
+if TYPE_CHECKING:
+    from utils.http_cache import CachedPage, HttpCache
+
+LOGGER = get_logger(__name__, step="VISIT")
+
+_HTTP_SESSION: Optional[requests.Session] = None
+_HTTP_SESSION_LOCK = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """Returns the process wide HTTP session, whose keep-alive connections are pooled and reused across visits."""
+    global _HTTP_SESSION
+    with _HTTP_SESSION_LOCK:
+        if _HTTP_SESSION is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=32, pool_maxsize=16)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _HTTP_SESSION = session
+        return _HTTP_SESSION
+
+
+class HostConcurrencyLimiter:
+    """Bounds the number of concurrent requests sent to the same host."""
+
+    def __init__(self, max_requests_per_host: int = 2):
+        self.max_requests_per_host = max_requests_per_host
+        self._semaphores: dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def _get_semaphore(self, url: str) -> threading.Semaphore:
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.Semaphore(self.max_requests_per_host)
+            return self._semaphores[host]
+
+    @contextmanager
+    def limit(self, url: str):
+        semaphore = self._get_semaphore(url)
+        with semaphore:
+            yield
+
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalizes a URL to identify the URLs pointing to the same page: lowercases the scheme and host, drops the default
+    port, the fragment, the trailing slash of the path and the utm_* tracking parameters.
+    A URL that cannot be parsed (e.g. with an unclosed IPv6 bracket) is returned as is, and the network location of a
+    URL with a malformed port (e.g. `http://host:abc/`) is kept as written.
+    """
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url.strip()
+    scheme = parts.scheme.lower()
+    try:
+        port = parts.port
+    except ValueError:
+        netloc = parts.netloc
+    else:
+        netloc = (parts.hostname or "").lower()
+        if port and port != _DEFAULT_PORTS.get(scheme):
+            netloc = f"{netloc}:{port}"
+        if parts.username:
+            netloc = f"{parts.username}@{netloc}"
+    path = parts.path.rstrip("/")
+    query = urlencode(
+        [
+            (key, value)
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not key.lower().startswith("utm_")
+        ]
+    )
+    return urlunsplit((scheme, netloc, path, query, ""))
 
 
 def is_arxiv_pdf_or_html_url(url: str) -> bool:
@@ -20,25 +113,135 @@ def convert_to_arxiv_abs_url(url: str) -> str:
     return url
 
 
+_HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+_PDF_CONTENT_TYPES = ("application/pdf", "application/x-pdf")
+_TEXT_CONTENT_TYPES = (
+    "text/",
+    "application/json",
+    "application/xml",
+    "application/x-yaml",
+)
+_GENERIC_CONTENT_TYPES = ("application/octet-stream", "binary/octet-stream")
+_READ_CHUNK_SIZE = 64 * 1024
+
+# Subtrees that never hold the main content of a page
+_BOILERPLATE_TAGS = [
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "iframe",
+    "svg",
+    "canvas",
+    "form",
+    "button",
+    "nav",
+    "header",
+    "footer",
+    "aside",
+]
+# Whole id / class names of boilerplate, e.g. "nav", "site-footer" or "cookie_banner" but not "main-menu-pinned-disabled"
+_BOILERPLATE_ATTRIBUTES = re.compile(
+    r"((site|page|main|global|top|bottom|primary|secondary)[_-]?)?"
+    r"(nav|navbar|navigation|menu|breadcrumbs?|footer|sidebar|cookies?|consent|banner|popup|modal|newsletter|"
+    r"subscribe|share|sharing|social|related|comments?|ads?|advert|advertisement|advertising)"
+    r"([_-]?(bar|box|buttons?|links?|list|posts|articles|section|container|wrapper|widget|area|banner|notice))?",
+    re.IGNORECASE,
+)
+_BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search"}
+# Elements holding the content of the page, never boilerplate whatever their id and class names
+_CONTENT_TAGS = {"html", "body", "main", "article"}
+_MAX_LINK_DENSITY = 0.5
+
+
+@dataclass
+class DownloadedPage:
+    url: str
+    status_code: int
+    content_type: str
+    content: bytes = b""
+    encoding: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    truncated: bool = False
+
+    @property
+    def media_type(self) -> str:
+        return sniff_content_type(self.content_type, self.content)
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+def sniff_content_type(content_type: Optional[str], content: bytes = b"") -> str:
+    """
+    Returns the media type of a page from its Content-Type header, or from its first bytes when the header is missing
+    or too generic to route the page.
+    """
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type and media_type not in _GENERIC_CONTENT_TYPES:
+        return media_type
+
+    head = content[:1024].lstrip().lower()
+    if head.startswith(b"%pdf-"):
+        return "application/pdf"
+    if head.startswith((b"<!doctype html", b"<html", b"<?xml")) or b"<body" in head:
+        return "text/html"
+    if head and b"\x00" not in head:
+        return "text/plain"
+    return media_type or "application/octet-stream"
+
+
+def is_supported_content_type(media_type: str) -> bool:
+    return media_type.startswith(
+        _HTML_CONTENT_TYPES + _PDF_CONTENT_TYPES + _TEXT_CONTENT_TYPES
+    )
+
+
 @tenacity.retry(
-    wait=tenacity.wait_fixed(5),
-    stop=tenacity.stop_after_attempt(3),
-    retry=tenacity.retry_if_exception_type(CouldNotReadUrl),
+    wait=wait_within_deadline(tenacity.wait_fixed(5)),
+    stop=tenacity.stop_after_attempt(3) | stop_at_deadline(),
+    retry=(
+        tenacity.retry_if_exception_type(CouldNotReadUrl)
+        & tenacity.retry_if_not_exception_type(UnsupportedContent)
+    ),
     reraise=True,
 )
-def get_url_content_as_markdown(url: str) -> str:
+def download_page(
+    url: str,
+    session: Optional[requests.Session] = None,
+    timeout: float = 20,
+    headers: Optional[dict[str, str]] = None,
+    max_bytes: Optional[int] = None,
+    deadline: Optional[Deadline] = None,
+) -> DownloadedPage:
+    """
+    Downloads a page, falling back on the abs page of arxiv articles whose html or pdf version cannot be read.
+
+    The body is streamed and reading stops after `max_bytes`, the content of a page of an unsupported type (images,
+    archives, videos...) is not read at all. The download is retried until the work time of `deadline` is over, the
+    timeout of each attempt being capped by the time left.
+
+    Returns:
+        DownloadedPage: The page of a 200 response, or an empty page for a 304 response to a conditional request.
+    """
     tried_arxiv_fallback = False
     original_url = url
+    session = session or get_http_session()
+    if deadline is not None:
+        timeout = deadline.timeout(default=timeout)
 
     for _ in range(2):
         try:
-            response = requests.get(
-                url, timeout=20, headers={"User-Agent": "Mozilla/5.0"}
-            )
-
-            if response.status_code == 200:
-                content = markdownify(html=response.text)
-                return content
+            with session.get(
+                url,
+                timeout=timeout,
+                headers={"User-Agent": "Mozilla/5.0", **(headers or {})},
+                stream=True,
+            ) as response:
+                if response.status_code in (200, 304):
+                    return read_page(response, max_bytes=max_bytes)
 
         except requests.exceptions.RequestException:
             # If the visit url failed and it is an arxiv html or pdf url fallback on the abs of the article
@@ -49,3 +252,334 @@ def get_url_content_as_markdown(url: str) -> str:
             break
 
     raise CouldNotReadUrl(f"Couldn't read the URL: {original_url}")
+
+
+def read_page(
+    response: requests.Response, max_bytes: Optional[int] = None
+) -> DownloadedPage:
+    """Reads the body of a streamed response, up to `max_bytes`."""
+    page = DownloadedPage(
+        url=response.url,
+        status_code=response.status_code,
+        content_type=(response.headers.get("Content-Type") or "").lower(),
+        encoding=response.encoding,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+    if response.status_code == 304:
+        return page
+
+    # Generic binary types are routed once their first bytes are read
+    media_type = sniff_content_type(page.content_type)
+    if media_type not in _GENERIC_CONTENT_TYPES and not is_supported_content_type(
+        media_type
+    ):
+        raise UnsupportedContent(
+            f"Unsupported content type '{media_type}' for the URL: {page.url}"
+        )
+    content_length = response.headers.get("Content-Length", "")
+    if (
+        max_bytes is not None
+        and media_type.startswith(_PDF_CONTENT_TYPES)
+        and content_length.isdigit()
+        and int(content_length) > max_bytes
+    ):
+        # A truncated PDF cannot be parsed, do not download it at all
+        raise UnsupportedContent(
+            f"The PDF of {content_length} bytes exceeds the {max_bytes} bytes limit: {page.url}"
+        )
+
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(chunk_size=_READ_CHUNK_SIZE):
+        chunks.append(chunk)
+        size += len(chunk)
+        if max_bytes is not None and size > max_bytes:
+            page.truncated = True
+            break
+    page.content = b"".join(chunks)[:max_bytes]
+    if page.truncated:
+        LOGGER.debug("Stopped reading %s after %d bytes", page.url, max_bytes)
+    return page
+
+
+def is_local_url(url: str) -> bool:
+    return urlsplit(url).scheme == "file"
+
+
+def read_local_file(
+    url: str,
+    local_dir: Optional[str | Path] = None,
+    max_bytes: Optional[int] = None,
+) -> DownloadedPage:
+    """
+    Reads the file of a file:// URL as a downloaded page, its type being guessed from its extension.
+
+    Only the files under `local_dir` can be read, once symbolic links and `..` are resolved: the URLs come from the
+    search results and the model, which must not be able to read any file of the machine. Without `local_dir`, no
+    file can be read.
+    """
+    path = Path(url2pathname(urlsplit(url).path)).resolve()
+    if local_dir is None or not path.is_relative_to(Path(local_dir).resolve()):
+        raise CouldNotReadUrl(f"The file of the URL is not in the local index: {url}")
+    try:
+        with open(path, "rb") as f:
+            content = f.read(max_bytes + 1 if max_bytes is not None else -1)
+    except OSError as e:
+        raise CouldNotReadUrl(f"Couldn't read the file of the URL: {url} ({e})") from e
+    content_type, _ = mimetypes.guess_type(path.name)
+    truncated = max_bytes is not None and len(content) > max_bytes
+    return DownloadedPage(
+        url=url,
+        status_code=200,
+        content_type=content_type or "",
+        content=content[:max_bytes] if truncated else content,
+        truncated=truncated,
+    )
+
+
+def extract_pdf_text(content: bytes) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError as e:
+        raise UnsupportedContent(
+            "Reading PDF pages requires pypdf, install it with `pip install 'deep-research[pdf]'`"
+        ) from e
+
+    try:
+        reader = PdfReader(io.BytesIO(content))
+        return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+    except Exception as e:
+        raise CouldNotReadUrl(f"Couldn't extract the text of the PDF: {e}") from e
+
+
+def convert_page_to_markdown(
+    page: DownloadedPage, extractor: str = "markdownify"
+) -> str:
+    """
+    Converts a downloaded page to markdown according to its type: HTML is converted with the `extractor`, the text of
+    PDF is extracted and plain text is kept as is.
+    """
+    media_type = page.media_type
+    if media_type.startswith(_HTML_CONTENT_TYPES):
+        return html_to_markdown(page.text, extractor=extractor)
+    if media_type.startswith(_PDF_CONTENT_TYPES):
+        if page.truncated:
+            raise UnsupportedContent(f"The PDF is too large to be read: {page.url}")
+        return extract_pdf_text(page.content)
+    if media_type.startswith(_TEXT_CONTENT_TYPES):
+        return page.text
+    raise UnsupportedContent(
+        f"Unsupported content type '{media_type}' for the URL: {page.url}"
+    )
+
+
+def get_html_parser() -> str:
+    """Returns the fastest HTML parser available to BeautifulSoup."""
+    try:
+        import lxml  # noqa: F401
+
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+
+
+def is_boilerplate(element: Tag) -> bool:
+    if element.name in _CONTENT_TAGS:
+        return False
+    if element.name in _BOILERPLATE_TAGS:
+        return True
+    if (
+        element.get("role") in _BOILERPLATE_ROLES
+        or element.get("aria-hidden") == "true"
+    ):
+        return True
+    names = [*(element.get("id") or "").split(), *(element.get("class") or [])]
+    return any(_BOILERPLATE_ATTRIBUTES.fullmatch(name) for name in names)
+
+
+def is_in_boilerplate(element: Tag) -> bool:
+    return any(is_boilerplate(parent) for parent in element.parents)
+
+
+def find_content_root(soup: BeautifulSoup) -> Tag:
+    """
+    Returns the element holding the main content of the page: the `<main>` element, or the single `<article>` when
+    there is one, outside of the boilerplate. Defaults to the body.
+    """
+    mains = soup.find_all("main") + soup.find_all(attrs={"role": "main"})
+    articles = soup.find_all("article")
+    mains, articles = (
+        [element for element in elements if not is_in_boilerplate(element)]
+        for elements in (mains, articles)
+    )
+    if len(mains) > 0:
+        return mains[0]
+    if len(articles) == 1:
+        return articles[0]
+    return soup.body or soup
+
+
+def get_link_density(element: Tag) -> float:
+    text_length = len(element.get_text(strip=True))
+    if text_length == 0:
+        return 0.0
+    link_text_length = sum(
+        len(link.get_text(strip=True)) for link in element.find_all("a")
+    )
+    return link_text_length / text_length
+
+
+def extract_main_content(html: str) -> str:
+    """
+    Extracts the main content of a page as markdown, without the navigation, headers, footers, scripts, cookie banners
+    and the other boilerplate around it.
+
+    The content is taken from the `<main>` element or the single `<article>` when there is one, then its boilerplate
+    subtrees are dropped by tag, ARIA role and whole id / class names, and the remaining lists and blocks made mostly of
+    links are dropped. The headers within the content, e.g. the title of an article, are kept.
+    """
+    soup = BeautifulSoup(html, get_html_parser())
+    root = find_content_root(soup)
+    for element in root.find_all(is_boilerplate):
+        if element.decomposed:
+            continue
+        if element.name == "header" and element.find_parent(["main", "article"]):
+            continue
+        element.decompose()
+
+    for element in root.find_all(["ul", "ol", "div", "section", "table"]):
+        if not element.decomposed and get_link_density(element) > _MAX_LINK_DENSITY:
+            element.decompose()
+
+    markdown = MarkdownConverter().convert_soup(root)
+    return re.sub(r"\n{3,}", "\n\n", markdown).strip()
+
+
+HTML_EXTRACTORS = {
+    "markdownify": lambda html: markdownify(html=html),
+    "main_content": extract_main_content,
+}
+
+
+def html_to_markdown(html: str, extractor: str = "markdownify") -> str:
+    if extractor not in HTML_EXTRACTORS:
+        raise ValueError(f"Unsupported HTML extractor '{extractor}'")
+    return HTML_EXTRACTORS[extractor](html)
+
+
+def get_url_content_as_markdown(
+    url: str,
+    session: Optional[requests.Session] = None,
+    timeout: float = 20,
+    max_bytes: Optional[int] = None,
+    extractor: str = "markdownify",
+    local_dir: Optional[str | Path] = None,
+    deadline: Optional[Deadline] = None,
+) -> str:
+    if is_local_url(url):
+        page = read_local_file(url, local_dir=local_dir, max_bytes=max_bytes)
+    else:
+        page = download_page(
+            url=url,
+            session=session,
+            timeout=timeout,
+            max_bytes=max_bytes,
+            deadline=deadline,
+        )
+    return convert_page_to_markdown(page, extractor=extractor)
+
+
+class PageFetcher:
+    """
+    Fetches web pages as markdown, through the HTTP cache if any. Local file:// URLs are read without caching, and only
+    when they are under `local_dir`.
+    """
+
+    def __init__(
+        self,
+        http_cache: Optional["HttpCache"] = None,
+        session: Optional[requests.Session] = None,
+        max_bytes: Optional[int] = None,
+        extractor: str = "markdownify",
+        local_dir: Optional[str | Path] = None,
+    ):
+        self.http_cache = http_cache
+        self.session = session
+        self.max_bytes = max_bytes
+        self.extractor = extractor
+        self.local_dir = local_dir
+
+    def fetch(
+        self, url: str, timeout: float = 20, deadline: Optional[Deadline] = None
+    ) -> str:
+        if self.http_cache is None or is_local_url(url):
+            return get_url_content_as_markdown(
+                url=url,
+                session=self.session,
+                timeout=timeout,
+                max_bytes=self.max_bytes,
+                extractor=self.extractor,
+                local_dir=self.local_dir,
+                deadline=deadline,
+            )
+
+        cached_page = self.http_cache.get(url)
+        if cached_page is not None and self.http_cache.is_fresh(cached_page):
+            if cached_page.is_error:
+                raise CouldNotReadUrl(
+                    f"Couldn't read the URL recently: {url} ({cached_page.error})"
+                )
+            LOGGER.debug("HTTP cache hit: %s", url)
+            return self.get_cached_markdown(cached_page)
+
+        if cached_page is not None and cached_page.is_error:
+            cached_page = None  # Expired negative entry, fetch the page again
+
+        try:
+            page = download_page(
+                url=url,
+                session=self.session,
+                timeout=timeout,
+                headers=cached_page.validators if cached_page is not None else None,
+                max_bytes=self.max_bytes,
+                deadline=deadline,
+            )
+            if page.status_code == 304 and cached_page is not None:
+                LOGGER.debug("HTTP cache revalidated: %s", url)
+                self.http_cache.refresh(cached_page)
+                return self.get_cached_markdown(cached_page)
+            markdown = convert_page_to_markdown(page, extractor=self.extractor)
+        except CouldNotReadUrl as e:
+            if cached_page is not None:
+                LOGGER.warning(
+                    "Couldn't revalidate %s, using the stale cached page", url
+                )
+                return self.get_cached_markdown(cached_page)
+            self.http_cache.put_error(url, error=str(e))
+            raise
+
+        self.http_cache.put_page(
+            url=url,
+            markdown=markdown,
+            # The raw content of binary pages is not kept, only their extracted text
+            raw=page.text
+            if not page.media_type.startswith(_PDF_CONTENT_TYPES)
+            else None,
+            etag=page.etag,
+            last_modified=page.last_modified,
+            extractor=self.extractor
+            if page.media_type.startswith(_HTML_CONTENT_TYPES)
+            else None,
+        )
+        return markdown
+
+    def get_cached_markdown(self, cached_page: "CachedPage") -> str:
+        # Pages cached with another extractor are converted again from their raw HTML
+        if (
+            cached_page.extractor is not None
+            and cached_page.extractor != self.extractor
+            and cached_page.raw is not None
+        ):
+            return html_to_markdown(cached_page.raw, extractor=self.extractor)
+        return cached_page.markdown
@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import pytest
+
+from common.exceptions import LLMCacheMiss
+from llms.base_llm import BaseLLM
+from llms.cached_llm import CachedLLM
+from llms.message import Message
+from prompts import query_rewrite_prompts
+from utils import date_utils
+
+
+class _CountingLLM(BaseLLM):
+    def __init__(self):
+        super().__init__(model_name="counting")
+        self.calls = 0
+
+    def complete(
+        self, messages, temperature=0.0, max_tokens=None, response_format=None
+    ):
+        self.calls += 1
+        return f"response {self.calls}"
+
+
+def render_prompts_at(monkeypatch, now: datetime) -> list[Message]:
+    class _FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now
+
+    monkeypatch.setattr(date_utils, "datetime", _FrozenDatetime)
+    monkeypatch.setattr(
+        query_rewrite_prompts, "get_current_datetime", date_utils.get_current_datetime
+    )
+    return query_rewrite_prompts.get_query_rewrite_prompts(
+        query="capital of Australia", think="", initial_search_results=[]
+    )
+
+
+def test_mask_datetimes():
+    assert (
+        date_utils.mask_datetimes("Today is 07 March 2025 14:05, not 2025-03-07.")
+        == "Today is <datetime>, not 2025-03-07."
+    )
+
+
+def test_prompts_rendered_at_different_times_share_their_cache_key(monkeypatch):
+    first_messages = render_prompts_at(monkeypatch, datetime(2025, 3, 7, 14, 5))
+    second_messages = render_prompts_at(monkeypatch, datetime(2026, 1, 2, 9, 30))
+    cached_llm = CachedLLM(_CountingLLM())
+
+    assert first_messages != second_messages
+    assert cached_llm.cache_key(first_messages) == cached_llm.cache_key(second_messages)
+    assert cached_llm.cache_key(first_messages) != cached_llm.cache_key(
+        [*first_messages, Message(role="user", content="another question")]
+    )
+
+
+def test_rerun_is_replayed_from_the_disk_cache(monkeypatch, tmp_path):
+    llm = _CountingLLM()
+    first_messages = render_prompts_at(monkeypatch, datetime(2025, 3, 7, 14, 5))
+    assert CachedLLM(llm, cache_dir=tmp_path).complete(first_messages) == "response 1"
+
+    second_messages = render_prompts_at(monkeypatch, datetime(2025, 3, 8, 8, 0))
+    replaying_llm = CachedLLM(llm, cache_dir=tmp_path, replay=True)
+
+    assert replaying_llm.complete(second_messages) == "response 1"
+    assert llm.calls == 1
+    with pytest.raises(LLMCacheMiss):
+        replaying_llm.complete([Message(role="user", content="new question")])
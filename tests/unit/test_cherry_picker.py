@@ -0,0 +1,82 @@
+import numpy as np
+
+from common.cherry_picker import CherryPicker, select_top_windows
+from common.types import ChunkingStrategy
+
+
+def naive_top_windows(
+    scores: list[float], window_size: int, n_windows: int, min_score: float
+) -> list[int]:
+    window_scores = {
+        start: sum(scores[start : start + window_size]) / window_size
+        for start in range(len(scores) - window_size + 1)
+        if all(np.isfinite(scores[start : start + window_size]))
+    }
+    starts = []
+    while len(starts) < n_windows:
+        # On ties, the first window is selected, as argmax does
+        candidates = [
+            start
+            for start, score in window_scores.items()
+            if score > min_score
+            and all(abs(start - selected) >= window_size for selected in starts)
+        ]
+        if len(candidates) == 0:
+            break
+        starts.append(max(candidates, key=lambda start: (window_scores[start], -start)))
+    return starts
+
+
+class _ConstantScorer:
+    """Every chunk is equally similar to every question."""
+
+    def encode_passages(self, docs):
+        return np.ones((len(docs), 2)) / np.sqrt(2)
+
+    def encode_queries(self, queries):
+        return np.ones((len(queries), 2)) / np.sqrt(2)
+
+
+def test_structural_snippets_do_not_exceed_the_snippet_length():
+    # Paragraphs of ~190 characters, close to the maximum structural chunk size of 2 x chunk_size
+    paragraphs = [
+        f"Paragraph {idx} " + " ".join(["word"] * 35) + "." for idx in range(40)
+    ]
+    text = "\n\n".join(paragraphs)
+    cherry_picker = CherryPicker(
+        similarity_scorer=_ConstantScorer(),
+        chunk_size=100,
+        n_snippets=1,
+        snippets_length=400,
+        chunking=ChunkingStrategy.STRUCTURAL,
+    )
+    # A snippet is a window of 4 chunks, ~760 characters
+    assert len(cherry_picker.chunk_text(text)[0]) > 150
+
+    snippet = cherry_picker.cherry_pick(question="question", text=text)
+
+    assert 0 < len(snippet) <= 400
+    # The snippet ends at a chunk boundary: two whole paragraphs
+    assert snippet == "\n\n".join(paragraphs[:2])
+
+
+def test_select_top_windows_matches_a_naive_selection():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        n_scores = int(rng.integers(1, 40))
+        window_size = int(rng.integers(1, n_scores + 1))
+        # Few distinct values, so that windows often tie and scores equal the threshold
+        scores = rng.choice([0.0, 0.1, 0.2, 0.3, 0.5], size=n_scores).tolist()
+        for idx in rng.choice(n_scores, size=int(rng.integers(0, 3))):
+            scores[idx] = -np.inf
+        n_windows = int(rng.integers(1, 6))
+        min_score = float(rng.choice([0.0, 0.1, 0.2, 0.3]))
+
+        assert select_top_windows(
+            scores, window_size=window_size, n_windows=n_windows, min_score=min_score
+        ) == naive_top_windows(scores, window_size, n_windows, min_score)
+
+
+def test_windows_scoring_the_threshold_are_not_selected():
+    assert select_top_windows([0.2, 0.2, 0.4], 1, n_windows=3, min_score=0.2) == [2]
+    assert select_top_windows([0.3, 0.1], 2, n_windows=1, min_score=0.2) == []
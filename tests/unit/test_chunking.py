@@ -0,0 +1,106 @@
+import pytest
+
+from common.chunking import chunk_fixed, chunk_structural
+
+ARTICLE = """# Canberra
+
+Canberra is the capital city of Australia. It is the largest inland city of the country.
+
+The site was selected in 1908 as a compromise between Sydney and Melbourne.
+
+## Design
+
+Walter Burley Griffin and Marion Mahony Griffin won the international design competition in 1912. Their plan
+placed the city around a central lake.
+
+History
+-------
+
+Parliament moved from Melbourne to Canberra in 1927."""
+
+
+def assert_offsets(text: str, chunks) -> None:
+    for chunk in chunks:
+        assert chunk.text == text[chunk.start : chunk.end]
+        assert len(chunk) == chunk.end - chunk.start
+
+
+def test_chunk_fixed():
+    chunks = chunk_fixed("abcdefghij", chunk_size=4)
+
+    assert [chunk.text for chunk in chunks] == ["abcd", "efgh", "ij"]
+    assert [(chunk.start, chunk.end) for chunk in chunks] == [(0, 4), (4, 8), (8, 10)]
+    assert chunk_fixed("", chunk_size=4) == []
+
+
+def test_headings_start_a_chunk():
+    chunks = chunk_structural(ARTICLE, target_size=1_000, max_size=1_000)
+
+    assert_offsets(ARTICLE, chunks)
+    assert [chunk.text.splitlines()[0] for chunk in chunks] == [
+        "# Canberra",
+        "## Design",
+        "History",
+    ]
+    assert chunks[-1].text.endswith(
+        "Parliament moved from Melbourne to Canberra in 1927."
+    )
+
+
+def test_paragraphs_are_merged_up_to_the_target_size():
+    chunks = chunk_structural(ARTICLE, target_size=40, max_size=200)
+
+    assert_offsets(ARTICLE, chunks)
+    # A heading stays with the paragraph it introduces
+    assert chunks[0].text.startswith("# Canberra\n\nCanberra is the capital city")
+    assert chunks[0].text.endswith("the largest inland city of the country.")
+    assert chunks[1].text == (
+        "The site was selected in 1908 as a compromise between Sydney and Melbourne."
+    )
+    assert all(len(chunk) <= 200 for chunk in chunks)
+
+
+@pytest.mark.parametrize("max_size", [20, 50, 80])
+def test_chunks_never_exceed_the_max_size(max_size: int):
+    chunks = chunk_structural(ARTICLE, target_size=max_size // 2, max_size=max_size)
+
+    assert_offsets(ARTICLE, chunks)
+    assert all(0 < len(chunk) <= max_size for chunk in chunks)
+    # Long paragraphs are split into sentences, then into words, never inside a word when a space is available
+    words = set(ARTICLE.split())
+    assert all(chunk.text.split()[0] in words for chunk in chunks)
+    assert all(chunk.text.split()[-1] in words for chunk in chunks)
+
+
+def test_text_without_spaces_is_split_anywhere():
+    text = "x" * 25
+
+    chunks = chunk_structural(text, target_size=10, max_size=10)
+
+    assert [(chunk.start, chunk.end) for chunk in chunks] == [
+        (0, 10),
+        (10, 20),
+        (20, 25),
+    ]
+
+
+def test_overlap_starts_on_a_word_boundary():
+    chunks = chunk_structural(ARTICLE, target_size=60, max_size=100, overlap=15)
+    chunks_without_overlap = chunk_structural(ARTICLE, target_size=60, max_size=100)
+
+    assert_offsets(ARTICLE, chunks)
+    assert [chunk.end for chunk in chunks] == [
+        chunk.end for chunk in chunks_without_overlap
+    ]
+    for previous_chunk, chunk in zip(chunks, chunks[1:]):
+        assert previous_chunk.start <= chunk.start < previous_chunk.end
+        assert (
+            previous_chunk.end - chunk.start <= 15
+            or chunk.start == previous_chunk.start
+        )
+        assert chunk.start == 0 or ARTICLE[chunk.start - 1].isspace()
+
+
+def test_empty_text():
+    assert chunk_structural("", target_size=10, max_size=20) == []
+    assert chunk_structural(" \n\n ", target_size=10, max_size=20) == []
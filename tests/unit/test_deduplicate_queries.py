@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from common.deduplicate_queries import DeduplicateQueries, get_search_operators
+
+E5_MODEL_NAME = "intfloat/multilingual-e5-small"
+
+
+class _ConstantScorer:
+    """Scores every pair of distinct queries the same, as e5 does for queries differing only by an operator."""
+
+    def __init__(self, similarity: float):
+        self.similarity = similarity
+
+    def compute_pairwise_similarities(self, queries):
+        similarities = np.full((len(queries), len(queries)), self.similarity)
+        np.fill_diagonal(similarities, 1.0)
+        return similarities
+
+
+def test_search_operators():
+    assert get_search_operators("canberra history") == frozenset()
+    assert get_search_operators('Canberra "history" -tourism FileType:PDF') == {
+        '"history"',
+        "-tourism",
+        "filetype:pdf",
+    }
+    assert get_search_operators("what is c++ site:cppreference.com") == {
+        "site:cppreference.com"
+    }
+
+
+def test_queries_with_different_operators_are_never_dropped():
+    deduplicator = DeduplicateQueries(llm=None, similarity_scorer=_ConstantScorer(0.99))
+
+    queries = deduplicator.dedup(
+        new_queries=[
+            "canberra history site:wikipedia.org",
+            "canberra history filetype:pdf",
+            "Canberra history",
+            "canberra history filetype:pdf",
+            "canberra  history site:wikipedia.org",
+        ],
+        queries=["canberra history"],
+    )
+
+    assert queries == [
+        "canberra history",
+        "canberra history site:wikipedia.org",
+        "canberra history filetype:pdf",
+    ]
+
+
+def test_identical_queries_keep_the_order_of_their_first_occurrence():
+    deduplicator = DeduplicateQueries(llm=None, similarity_scorer=_ConstantScorer(0.0))
+
+    queries = deduplicator.dedup(new_queries=["B y", "a  X"], queries=["A x"])
+
+    assert queries == ["A x", "B y"]
+
+
+def test_close_queries_with_the_same_operators_are_dropped():
+    deduplicator = DeduplicateQueries(llm=None, similarity_scorer=_ConstantScorer(0.98))
+
+    queries = deduplicator.dedup(
+        new_queries=["history of canberra site:gov.au"],
+        queries=["canberra history site:gov.au"],
+    )
+
+    assert queries == ["canberra history site:gov.au"]
+
+
+def test_e5_scores_are_separated_by_the_thresholds():
+    """Checks the default thresholds on the scores of the default e5 model, when it is available locally."""
+    huggingface_hub = pytest.importorskip("huggingface_hub")
+    if not isinstance(
+        huggingface_hub.try_to_load_from_cache(E5_MODEL_NAME, "config.json"), str
+    ):
+        pytest.skip(f"{E5_MODEL_NAME} is not in the local Hugging Face cache")
+    from common.semantic_similarity import SemanticSimilarityScorer
+
+    deduplicator = DeduplicateQueries(llm=None)
+    scorer = SemanticSimilarityScorer(model_name=E5_MODEL_NAME)
+    duplicates = [
+        ("who designed canberra", "who was the architect of canberra"),
+        ("canberra population 2024", "population of canberra in 2024"),
+    ]
+    distinct = [
+        ("who designed canberra", "canberra population 2024"),
+        ("canberra history", "sydney opera house architect"),
+        ("python list comprehension", "canberra climate"),
+    ]
+    for first_query, second_query in duplicates:
+        similarity = scorer.compute_pairwise_similarities([first_query, second_query])[
+            0, 1
+        ]
+        assert similarity >= deduplicator.distinct_threshold, (
+            first_query,
+            second_query,
+        )
+    for first_query, second_query in distinct:
+        similarity = scorer.compute_pairwise_similarities([first_query, second_query])[
+            0, 1
+        ]
+        assert similarity < deduplicator.distinct_threshold, (first_query, second_query)
@@ -0,0 +1,136 @@
+import hashlib
+import multiprocessing
+
+import numpy as np
+
+from common.embedding_cache import EmbeddingCache
+from common.semantic_similarity import SemanticSimilarityScorer
+from utils.mmap_matrix import MemoryMappedMatrix
+
+DIM = 8
+
+
+def embedding_of(text: str) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha1(text.encode()).digest()[:4], "little")
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal(DIM).astype(np.float16).astype(np.float32)
+
+
+def put_texts(cache_dir: str, texts: list[str]) -> None:
+    cache = EmbeddingCache(namespace="test", cache_dir=cache_dir)
+    for text in texts:
+        cache.put_many([text], np.stack([embedding_of(text)]))
+
+
+class _HashBackend:
+    """Stands for an embedding model, the embedding of a text is derived from its hash."""
+
+    name = "hash"
+    hidden_size = DIM
+
+    def encode(self, inputs, normalize_embeddings=True):
+        embeddings = np.stack([embedding_of(text) for text in inputs])
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def assert_cached(cache: EmbeddingCache, texts: list[str]) -> None:
+    for text, embedding in zip(texts, cache.get_many(texts)):
+        assert embedding is not None, text
+        np.testing.assert_array_equal(embedding, embedding_of(text))
+
+
+def test_embeddings_survive_across_sessions(tmp_path):
+    texts = [f"text {i}" for i in range(10)]
+    put_texts(tmp_path, texts)
+
+    cache = EmbeddingCache(namespace="test", cache_dir=tmp_path)
+
+    assert_cached(cache, texts)
+    assert cache.get_many(["unknown"]) == [None]
+    assert EmbeddingCache(namespace="other", cache_dir=tmp_path).get_many(
+        texts[:1]
+    ) == [None]
+
+
+def test_caches_sharing_a_directory_do_not_overwrite_each_other(tmp_path):
+    first_cache = EmbeddingCache(namespace="test", cache_dir=tmp_path)
+    second_cache = EmbeddingCache(namespace="test", cache_dir=tmp_path)
+    first_texts = [f"first {i}" for i in range(5)]
+    second_texts = [f"second {i}" for i in range(5)]
+
+    for first_text, second_text in zip(first_texts, second_texts):
+        first_cache.put_many([first_text], np.stack([embedding_of(first_text)]))
+        second_cache.put_many([second_text], np.stack([embedding_of(second_text)]))
+
+    assert_cached(
+        EmbeddingCache(namespace="test", cache_dir=tmp_path), first_texts + second_texts
+    )
+    # Each cache sees the rows of the other one on its next write
+    first_cache.put_many(["last"], np.stack([embedding_of("last")]))
+    assert_cached(
+        EmbeddingCache(namespace="test", cache_dir=tmp_path, max_memory_entries=0),
+        first_texts + second_texts + ["last"],
+    )
+
+
+def test_processes_sharing_a_directory_do_not_overwrite_each_other(tmp_path):
+    all_texts = [[f"process {p} text {i}" for i in range(30)] for p in range(4)]
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=put_texts, args=(str(tmp_path), texts))
+        for texts in all_texts
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    assert_cached(
+        EmbeddingCache(namespace="test", cache_dir=tmp_path),
+        [text for texts in all_texts for text in texts],
+    )
+
+
+def test_unpaired_rows_are_dropped_on_load(tmp_path):
+    texts = [f"text {i}" for i in range(3)]
+    put_texts(tmp_path, texts)
+    (namespace_dir,) = tmp_path.iterdir()
+    # An interrupted write left a row without its key, then a partial key
+    MemoryMappedMatrix(namespace_dir / "embeddings.f16", dim=DIM).append(
+        np.ones((1, DIM))
+    )
+    with open(namespace_dir / "keys.txt", "a") as f:
+        f.write("0123")
+
+    cache = EmbeddingCache(namespace="test", cache_dir=tmp_path)
+    cache.put_many(["new"], np.stack([embedding_of("new")]))
+
+    assert_cached(EmbeddingCache(namespace="test", cache_dir=tmp_path), texts + ["new"])
+    assert (namespace_dir / "keys.txt").stat().st_size == 4 * 41
+
+
+def test_matrix_appends_at_the_end_of_the_file(tmp_path):
+    first_matrix = MemoryMappedMatrix(tmp_path / "matrix.f16", dim=2)
+    second_matrix = MemoryMappedMatrix(tmp_path / "matrix.f16", dim=2)
+
+    assert first_matrix.append(np.zeros((2, 2))) == 0
+    assert second_matrix.append(np.ones((1, 2))) == 2
+    assert len(first_matrix) == 2
+    assert first_matrix.refresh() == 3
+    np.testing.assert_array_equal(first_matrix[2], [1, 1])
+
+
+def test_scorer_with_a_cache_encodes_no_input(tmp_path):
+    scorer = SemanticSimilarityScorer(cache_dir=tmp_path)
+    scorer._backend = _HashBackend()
+    scorer._embedding_cache = EmbeddingCache(namespace="test", cache_dir=tmp_path)
+
+    assert scorer.encode([]).shape == (0, DIM)
+    assert scorer.encode_passages([]).shape == (0, DIM)
+    assert scorer.compute_similarities("query", []) == []
+    np.testing.assert_allclose(
+        scorer.encode(["a", "b", "a"]),
+        scorer._backend.encode(["a", "b", "a"]),
+        atol=1e-3,
+    )
@@ -0,0 +1,94 @@
+import math
+
+import numpy as np
+import pytest
+
+from common.lexical import BM25, InvertedIndex, tokenize
+
+DOCUMENTS = [
+    "Canberra is the capital city of Australia.",
+    "Sydney is the largest city of Australia, Sydney has an opera house.",
+    "The Griffins designed Canberra around a lake.",
+    "Python is a programming language.",
+]
+
+
+def test_tokenize():
+    assert tokenize("Canberra's population: 466,566 (2021)") == [
+        "canberra",
+        "s",
+        "population",
+        "466",
+        "566",
+        "2021",
+    ]
+
+
+def test_bm25_scores():
+    bm25 = BM25(DOCUMENTS)
+
+    scores = bm25.score("Canberra lake")
+
+    assert scores[3] == 0.0
+    assert scores[1] == 0.0
+    assert scores[2] > scores[0] > 0.0
+    assert int(scores.argmax()) == 2
+
+
+def test_bm25_idf_favours_rare_terms():
+    bm25 = BM25(DOCUMENTS)
+
+    assert bm25.idf("opera") > bm25.idf("canberra") > bm25.idf("is")
+    assert bm25.idf("unknown") == pytest.approx(math.log(1.0 + 4.5 / 0.5))
+
+
+def test_bm25_term_frequency_saturates():
+    bm25 = BM25(
+        ["sydney", "sydney sydney", "sydney sydney sydney sydney", "other"], b=0.0
+    )
+
+    scores = bm25.score("sydney")
+
+    assert scores[0] < scores[1] < scores[2]
+    assert scores[2] - scores[1] < scores[1] - scores[0]
+    assert scores[2] < bm25.idf("sydney") * (bm25.k1 + 1.0)
+
+
+def test_bm25_empty():
+    assert len(BM25([]).score("query")) == 0
+    assert BM25(["", "text"]).score("").tolist() == [0.0, 0.0]
+
+
+def test_inverted_index_matches_bm25():
+    index = InvertedIndex()
+    for document in DOCUMENTS:
+        index.add(document)
+    bm25 = BM25(DOCUMENTS)
+
+    for query in ["Canberra lake", "city of Australia", "sydney opera", "python"]:
+        scores = bm25.score(query)
+        matches = index.search(query, top_k=len(DOCUMENTS))
+        assert [doc_idx for doc_idx, _ in matches] == [
+            doc_idx
+            for doc_idx in np.argsort(-scores, kind="stable")
+            if scores[doc_idx] > 0
+        ]
+        for doc_idx, score in matches:
+            assert score == pytest.approx(scores[doc_idx])
+
+
+def test_inverted_index_search():
+    index = InvertedIndex()
+    assert index.search("anything") == []
+    assert [
+        index.add(document) for document in ["same text", "same text", "other"]
+    ] == [0, 1, 2]
+
+    # Ties are broken by document index
+    assert [doc_idx for doc_idx, _ in index.search("same text", top_k=5)] == [0, 1]
+    assert [doc_idx for doc_idx, _ in index.search("same", top_k=1)] == [0]
+    assert index.search("unknown") == []
+
+    # The index is still searchable after more documents are added
+    index.add("other text")
+    assert [doc_idx for doc_idx, _ in index.search("other")] == [2, 3]
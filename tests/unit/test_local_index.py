@@ -0,0 +1,109 @@
+from pathlib import Path
+
+import pytest
+
+from common.exceptions import CouldNotReadUrl
+from common.types import ResearchState
+from deep_research.visit_step import VisitStep
+from search.local_index import LocalIndexSearchProvider
+from utils.url_utils import PageFetcher
+
+CANBERRA_HTML = """<html>
+<head><title>Canberra</title></head>
+<body>
+<nav><a href="/">Home</a></nav>
+<main>
+<h1>Canberra</h1>
+<p>Canberra is the capital city of Australia.</p>
+<p>It was selected as the capital in 1908 as a compromise between Sydney and Melbourne.</p>
+</main>
+</body>
+</html>
+"""
+
+
+class _FirstSnippetPicker:
+    def cherry_pick_many(self, questions, text, source=None):
+        return [text[:200] for _ in questions]
+
+
+@pytest.fixture
+def local_dir(tmp_path: Path) -> Path:
+    (tmp_path / "canberra.html").write_text(CANBERRA_HTML)
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "sydney.md").write_text(
+        "# Sydney\n\nSydney is the largest city of Australia.\n\nIt hosted the 2000 Olympics."
+    )
+    (tmp_path / "sub" / "notes.txt").write_text("Melbourne hosted the 1956 Olympics.")
+    (tmp_path / "sub" / "image.bin").write_bytes(b"\x00\x01Olympics")
+    return tmp_path
+
+
+def test_indexes_html_markdown_and_text_files(local_dir: Path):
+    provider = LocalIndexSearchProvider(local_dir)
+
+    assert [document.title for document in provider.documents] == [
+        "Canberra",
+        "notes",
+        "Sydney",
+    ]
+    assert all(document.url.startswith("file://") for document in provider.documents)
+
+
+def test_search_returns_the_best_documents_with_their_best_paragraph(local_dir: Path):
+    provider = LocalIndexSearchProvider(local_dir)
+
+    results = provider.search("capital of Australia", max_results=2)
+
+    assert results[0].title == "Canberra"
+    assert results[0].url == (local_dir / "canberra.html").resolve().as_uri()
+    assert results[0].description == "Canberra is the capital city of Australia."
+    assert [result.title for result in provider.search("Olympics")] == [
+        "notes",
+        "Sydney",
+    ]
+    assert provider.search("unrelated") == []
+
+
+def test_missing_directory_is_rejected(tmp_path: Path):
+    with pytest.raises(ValueError):
+        LocalIndexSearchProvider(tmp_path / "missing")
+
+
+def test_local_files_are_only_read_under_the_local_dir(
+    local_dir: Path, tmp_path_factory
+):
+    outside = tmp_path_factory.mktemp("outside") / "secret.txt"
+    outside.write_text("secret")
+    page_fetcher = PageFetcher(local_dir=local_dir)
+
+    assert "Melbourne" in page_fetcher.fetch((local_dir / "sub" / "notes.txt").as_uri())
+    with pytest.raises(CouldNotReadUrl):
+        page_fetcher.fetch(outside.as_uri())
+    with pytest.raises(CouldNotReadUrl):
+        page_fetcher.fetch(
+            f"{local_dir.as_uri()}/sub/../../{outside.parent.name}/secret.txt"
+        )
+    with pytest.raises(CouldNotReadUrl):
+        PageFetcher().fetch((local_dir / "sub" / "notes.txt").as_uri())
+
+
+def test_local_index_results_are_visited(local_dir: Path):
+    state = ResearchState(user_query="What is the capital of Australia?")
+    state.current_question = state.user_query
+    results = LocalIndexSearchProvider(local_dir).search(
+        state.user_query, max_results=1
+    )
+
+    visit_step = VisitStep(
+        state=state,
+        urls=[result.url for result in results],
+        cherry_picker=_FirstSnippetPicker(),
+        page_fetcher=PageFetcher(local_dir=local_dir),
+    )
+    visit_step.handle()
+
+    assert state.visited_urls.urls() == [results[0].url]
+    assert len(state.bad_urls) == 0
+    assert "capital city of Australia" in state.knowledge_items[0].answer
+    assert state.knowledge_items[0].references == results[0].url
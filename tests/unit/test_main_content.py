@@ -0,0 +1,97 @@
+from pathlib import Path
+
+import pytest
+from bs4 import BeautifulSoup
+
+from utils.url_utils import extract_main_content, is_boilerplate
+
+FIXTURES = Path(__file__).parent / "fixtures" / "html"
+
+
+def read_fixture(name: str) -> str:
+    return (FIXTURES / name).read_text()
+
+
+def tag(html: str):
+    return BeautifulSoup(html, "html.parser").find()
+
+
+def test_wikipedia_article_is_extracted():
+    markdown = extract_main_content(read_fixture("wikipedia.html"))
+
+    assert "Canberra" in markdown.splitlines()[0]
+    assert "is the capital city of" in markdown
+    assert "as a compromise between" in markdown
+    for boilerplate in [
+        "Jump to content",
+        "Main page",
+        "Talk",
+        "Brisbane",
+        "last edited",
+    ]:
+        assert boilerplate not in markdown
+
+
+def test_blog_post_with_a_sidebar_is_extracted():
+    markdown = extract_main_content(read_fixture("blog_sidebar.html"))
+
+    assert "used to take forty minutes" in markdown
+    assert "shards that run in parallel" in markdown
+    for boilerplate in [
+        "About",
+        "Share on X",
+        "Related posts",
+        "Archives",
+        "cookies",
+        "Copyright",
+    ]:
+        assert boilerplate not in markdown
+
+
+def test_article_with_comments_enabled_is_extracted():
+    markdown = extract_main_content(read_fixture("news_comments.html"))
+
+    assert "voted eight to three" in markdown
+    assert "finish before the end of next year" in markdown
+    for boilerplate in [
+        "Sport",
+        "Advertisement",
+        "Great news for cyclists",
+        "Contact us",
+    ]:
+        assert boilerplate not in markdown
+
+
+@pytest.mark.parametrize(
+    "html",
+    [
+        '<html class="client-nojs vector-feature-main-menu-pinned-disabled"></html>',
+        '<body class="single-post has-sidebar"></body>',
+        '<main class="nav"></main>',
+        '<article class="comments"></article>',
+        '<div id="main-content" class="article-comments-enabled"></div>',
+        '<div class="vector-main-menu-container"></div>',
+        '<div class="download-button"></div>',
+        '<div class="header-shadow"></div>',
+    ],
+)
+def test_content_is_not_boilerplate(html: str):
+    assert not is_boilerplate(tag(html))
+
+
+@pytest.mark.parametrize(
+    "html",
+    [
+        "<nav></nav>",
+        '<div role="navigation"></div>',
+        '<div aria-hidden="true"></div>',
+        '<div class="menu"></div>',
+        '<div id="site-footer"></div>',
+        '<div class="widget cookie_banner"></div>',
+        '<div class="share-buttons"></div>',
+        '<section class="Related-Posts"></section>',
+        '<div class="ad-container"></div>',
+    ],
+)
+def test_boilerplate_is_detected(html: str):
+    assert is_boilerplate(tag(html))
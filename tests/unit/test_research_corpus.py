@@ -0,0 +1,138 @@
+import hashlib
+import multiprocessing
+
+import numpy as np
+
+from common.chunking import chunk_fixed
+from common.research_corpus import ResearchCorpus
+
+DIM = 8
+
+
+def embed(texts: list[str]) -> np.ndarray:
+    embeddings = []
+    for text in texts:
+        seed = int.from_bytes(hashlib.sha1(text.encode()).digest()[:4], "little")
+        embedding = np.random.default_rng(seed).standard_normal(DIM)
+        embeddings.append(embedding / np.linalg.norm(embedding))
+    return np.stack(embeddings).astype(np.float32)
+
+
+def add(corpus: ResearchCorpus, url: str, text: str) -> int:
+    chunks = chunk_fixed(text, chunk_size=20)
+    return corpus.add(url, text, chunks, embed([chunk.text for chunk in chunks]))
+
+
+def search(corpus: ResearchCorpus, text: str):
+    ((passage, score),) = corpus.search(embed([text]), top_k=1)[0]
+    return passage.source, passage.text, score
+
+
+def add_documents(directory: str, urls: list[str]) -> None:
+    corpus = ResearchCorpus(directory, namespace="test")
+    for url in urls:
+        add(corpus, url, f"The document of {url}, long enough for a few chunks.")
+
+
+def test_documents_are_searched_and_superseded(tmp_path):
+    corpus = ResearchCorpus(tmp_path, namespace="test")
+    text = "Canberra is the capital of Australia. It was designed by Griffin."
+
+    assert add(corpus, "https://a.org", text) == 4
+    assert add(corpus, "https://a.org", text) == 0
+    assert corpus.get_document("https://a.org") == text
+    source, passage_text, score = search(corpus, text[20:40])
+    assert (source, passage_text) == ("https://a.org", text[20:40])
+    assert score > 0.99
+
+    add(corpus, "https://a.org", "Another text")
+    assert len(corpus) == 1
+    assert corpus.get_document("https://a.org") == "Another text"
+
+    reloaded_corpus = ResearchCorpus(tmp_path, namespace="test")
+    assert len(reloaded_corpus) == 1
+    assert reloaded_corpus.get_document("https://a.org") == "Another text"
+
+
+def test_instances_sharing_a_directory_do_not_overwrite_each_other(tmp_path):
+    first_corpus = ResearchCorpus(tmp_path, namespace="test")
+    second_corpus = ResearchCorpus(tmp_path, namespace="test")
+
+    add(first_corpus, "https://a.org", "The first text, about Canberra.")
+    add(second_corpus, "https://b.org", "The second text, about Sydney.")
+    add(first_corpus, "https://c.org", "The third text, about Melbourne.")
+
+    corpus = ResearchCorpus(tmp_path, namespace="test")
+    assert len(corpus) == len(first_corpus) == 6
+    for url, text in [
+        ("https://a.org", "The first text, about Canberra."),
+        ("https://b.org", "The second text, about Sydney."),
+        ("https://c.org", "The third text, about Melbourne."),
+    ]:
+        assert corpus.get_document(url) == text
+        assert search(corpus, text[:20])[:2] == (url, text[:20])
+
+
+def test_compaction_by_another_instance_is_picked_up(tmp_path):
+    first_corpus = ResearchCorpus(tmp_path, namespace="test")
+    second_corpus = ResearchCorpus(tmp_path, namespace="test")
+    add(first_corpus, "https://a.org", "A first version of the page.")
+    add(first_corpus, "https://a.org", "A second version of the page.")
+    add(second_corpus, "https://b.org", "Another page, on another topic.")
+
+    first_corpus.compact()
+
+    assert sorted(path.name for path in first_corpus.directory.glob("*.1.*")) == [
+        "chunks.1.jsonl",
+        "documents.1.jsonl",
+        "embeddings.1.f16",
+    ]
+    assert list(first_corpus.directory.glob("*.0.*")) == []
+    # The second instance still had the files of the previous generation loaded
+    assert search(second_corpus, "Another page, on an")[0] == "https://b.org"
+    add(second_corpus, "https://c.org", "A third page, added after the compaction.")
+
+    corpus = ResearchCorpus(tmp_path, namespace="test")
+    assert corpus.dead_ratio == 0.0
+    assert corpus.get_document("https://a.org") == "A second version of the page."
+    assert corpus.get_document("https://b.org") == "Another page, on another topic."
+    assert search(corpus, "A third page, added ")[0] == "https://c.org"
+
+
+def test_processes_sharing_a_directory_do_not_overwrite_each_other(tmp_path):
+    all_urls = [[f"https://{p}.org/{i}" for i in range(20)] for p in range(4)]
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=add_documents, args=(str(tmp_path), urls))
+        for urls in all_urls
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    corpus = ResearchCorpus(tmp_path, namespace="test")
+    for urls in all_urls:
+        for url in urls:
+            text = f"The document of {url}, long enough for a few chunks."
+            assert corpus.get_document(url) == text
+            assert search(corpus, text[20:40])[:2] == (url, text[20:40])
+
+
+def test_interrupted_writes_are_dropped_on_load(tmp_path):
+    corpus = ResearchCorpus(tmp_path, namespace="test")
+    text = "Canberra is the capital of Australia."
+    add(corpus, "https://a.org", text)
+    with open(corpus.directory / "chunks.0.jsonl", "a") as f:
+        f.write('["abc", 0, 2')
+    with open(corpus.directory / "documents.0.jsonl", "a") as f:
+        f.write('{"doc_id": "abc"')
+
+    reloaded_corpus = ResearchCorpus(tmp_path, namespace="test")
+    add(reloaded_corpus, "https://b.org", "Sydney is the largest city of Australia.")
+
+    corpus = ResearchCorpus(tmp_path, namespace="test")
+    assert len(corpus) == 4
+    assert corpus.get_document("https://a.org") == text
+    assert search(corpus, "Sydney is the larges")[0] == "https://b.org"
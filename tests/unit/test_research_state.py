@@ -0,0 +1,78 @@
+from common.types import AgentStopReason, ResearchState
+from deep_research.reflect_step import ReflectStep
+
+
+class _NoDeduplication:
+    def dedup(self, new_questions, existing_questions):
+        return [
+            question for question in new_questions if question not in existing_questions
+        ]
+
+
+def reflect(state: ResearchState, questions: list[str]) -> None:
+    ReflectStep(
+        questions_to_answer=questions,
+        state=state,
+        question_deduplicator=_NoDeduplication(),
+        max_questions_to_answer=len(questions),
+    ).handle()
+
+
+def test_merge_brings_back_every_gap_of_a_reflecting_branch():
+    state = ResearchState(user_query="U")
+    branch = state.fork("U", step=1)
+    reflect(branch, ["sub1", "sub2"])
+    state.merge(branch)
+
+    assert state.gaps[0] == "U"
+    assert sorted(state.gaps[1:]) == ["sub1", "sub2"]
+    assert sorted(state.all_questions[1:]) == ["sub1", "sub2"]
+
+
+def test_merge_of_several_branches_keeps_the_gaps_of_each():
+    state = ResearchState(user_query="U")
+    state.gaps.append("a")
+    first_branch = state.fork("a", step=1)
+    second_branch = state.fork("U", step=1)
+    reflect(first_branch, ["a1"])
+    reflect(second_branch, ["u1", "u2"])
+    state.merge(first_branch)
+    state.merge(second_branch)
+
+    assert state.gaps[:3] == ["U", "a", "a1"]
+    assert sorted(state.gaps[3:]) == ["u1", "u2"]
+
+
+def test_merge_only_adds_what_the_branch_added():
+    state = ResearchState(user_query="U")
+    state.knowledge_items.append("known")
+    state.steps_trace.append("step 0")
+    branch = state.fork("U", step=1)
+    branch.knowledge_items.append("learned")
+    branch.steps_trace.append("step 1")
+    branch.bad_attempts += 1
+    state.merge(branch)
+
+    assert state.knowledge_items == ["known", "learned"]
+    assert state.steps_trace == ["step 0", "step 1"]
+    assert state.bad_attempts == 1
+    assert branch.gaps == []
+
+
+def test_merge_keeps_the_first_stop_reason_and_the_disabled_actions():
+    state = ResearchState(user_query="U")
+    first_branch = state.fork("U", step=1)
+    second_branch = state.fork("U", step=1)
+    third_branch = state.fork("U", step=1)
+    first_branch.allow_search = False
+    second_branch.stop_reason = AgentStopReason.MAX_BAD_ATTEMPTS
+    second_branch.allow_answer = False
+    third_branch.stop_reason = AgentStopReason.FINAL_ANSWER_OK
+    for branch in (first_branch, second_branch, third_branch):
+        state.merge(branch)
+
+    assert state.stop_reason == AgentStopReason.MAX_BAD_ATTEMPTS
+    assert not state.allow_search
+    assert not state.allow_answer
+    assert state.allow_reflect
+    assert state.allow_visit
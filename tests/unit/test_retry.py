@@ -0,0 +1,78 @@
+import time
+
+import pytest
+import requests
+import tenacity
+
+from common.exceptions import CouldNotReadUrl, CouldNotSearchQuery
+from utils.deadline import Deadline
+from utils.retry import stop_at_deadline, wait_within_deadline
+from utils.url_utils import download_page
+
+
+def failing_call(wait_seconds: float):
+    calls = []
+
+    @tenacity.retry(
+        wait=wait_within_deadline(tenacity.wait_fixed(wait_seconds)),
+        stop=tenacity.stop_after_attempt(3) | stop_at_deadline(),
+        retry=tenacity.retry_if_exception_type(CouldNotSearchQuery),
+        reraise=True,
+    )
+    def search(query, deadline=None):
+        calls.append(time.monotonic())
+        raise CouldNotSearchQuery(query)
+
+    return search, calls
+
+
+def test_retries_without_deadline():
+    search, calls = failing_call(wait_seconds=0.01)
+
+    with pytest.raises(CouldNotSearchQuery):
+        search("q")
+    assert len(calls) == 3
+
+
+def test_no_retry_once_the_work_time_is_over():
+    search, calls = failing_call(wait_seconds=4)
+    deadline = Deadline(seconds=0.0)
+
+    start = time.monotonic()
+    with pytest.raises(CouldNotSearchQuery):
+        search("q", deadline=deadline)
+    assert len(calls) == 1
+    assert time.monotonic() - start < 1
+
+
+def test_waits_are_capped_by_the_deadline():
+    search, calls = failing_call(wait_seconds=4)
+    # The deadline is passed positionally, the work time is over after the first wait
+    deadline = Deadline(seconds=0.3, reserve_share=0.0, min_timeout=0.2)
+
+    start = time.monotonic()
+    with pytest.raises(CouldNotSearchQuery):
+        search("q", deadline)
+    assert len(calls) == 2
+    assert time.monotonic() - start < 1
+
+
+def test_download_page_stops_retrying_at_the_deadline():
+    class _FailingSession:
+        calls = 0
+
+        def get(self, url, **kwargs):
+            self.calls += 1
+            raise requests.exceptions.ConnectionError(url)
+
+    session = _FailingSession()
+
+    start = time.monotonic()
+    with pytest.raises(CouldNotReadUrl):
+        download_page(
+            "https://example.org",
+            session=session,
+            deadline=Deadline(seconds=0.3, reserve_share=0.0, min_timeout=0.2),
+        )
+    assert session.calls == 2
+    assert time.monotonic() - start < 1
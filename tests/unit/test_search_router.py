@@ -0,0 +1,119 @@
+from typing import Optional
+
+import pytest
+
+from common.exceptions import CouldNotSearchQuery
+from common.types import SearchResult, SearchRouting
+from search.base_search import BaseSearchProvider
+from search.router import SearchRouter
+
+
+def result(url: str) -> SearchResult:
+    return SearchResult(url=url, title=url, description="", weight=1)
+
+
+class _StaticProvider(BaseSearchProvider):
+    def __init__(self, name: str, urls: Optional[list[str]]):
+        super().__init__()
+        self.name = name
+        self.urls = urls
+        self.queries = []
+
+    def search(self, query, max_results=5, deadline=None):
+        self.queries.append(query)
+        if self.urls is None:
+            raise CouldNotSearchQuery(query)
+        return [result(url) for url in self.urls[:max_results]]
+
+
+def test_merge_ranks_by_reciprocal_rank_fusion():
+    router = SearchRouter([_StaticProvider("a", [])])
+
+    merged = router.merge(
+        [
+            [result("https://a.com"), result("https://b.com")],
+            [result("https://c.com"), result("https://b.com/")],
+        ],
+        max_results=5,
+    )
+
+    # b.com is returned by both providers, a.com and c.com tie and keep the order of the providers
+    assert [search_result.url for search_result in merged] == [
+        "https://b.com",
+        "https://a.com",
+        "https://c.com",
+    ]
+
+
+def test_merge_keeps_max_results():
+    router = SearchRouter([_StaticProvider("a", [])])
+
+    merged = router.merge(
+        [[result(f"https://{i}.com") for i in range(10)]], max_results=3
+    )
+
+    assert [search_result.url for search_result in merged] == [
+        "https://0.com",
+        "https://1.com",
+        "https://2.com",
+    ]
+
+
+def test_seeded_route_is_reproducible_after_reset():
+    providers = [_StaticProvider("a", []), _StaticProvider("b", [])]
+    router = SearchRouter(providers, seed=0)
+    queries = [f"query {i}" for i in range(20)]
+
+    first_routes = router.route(queries)
+    router.reset()
+    second_routes = router.route(queries)
+
+    assert [route[0].name for route in first_routes] == [
+        route[0].name for route in second_routes
+    ]
+    assert {route[0].name for route in first_routes} == {"a", "b"}
+    assert SearchRouter(providers, seed=0).route(queries) == first_routes
+
+
+def test_route_follows_the_weights():
+    providers = [_StaticProvider("a", []), _StaticProvider("b", [])]
+    router = SearchRouter(providers, weights={"a": 0.0}, seed=1)
+
+    assert all(route[0].name == "b" for route in router.route(["q"] * 10))
+
+
+def test_failover_tries_the_next_provider():
+    failing = _StaticProvider("failing", None)
+    empty = _StaticProvider("empty", [])
+    working = _StaticProvider("working", ["https://a.com"])
+    router = SearchRouter([failing, empty, working], routing=SearchRouting.FAILOVER)
+
+    (providers,) = router.route(["q"])
+    search_results = router.search("q", providers)
+
+    assert [search_result.url for search_result in search_results] == ["https://a.com"]
+    assert failing.queries == empty.queries == working.queries == ["q"]
+
+
+def test_parallel_merges_all_providers():
+    router = SearchRouter(
+        [
+            _StaticProvider("a", ["https://a.com", "https://b.com"]),
+            _StaticProvider("b", None),
+            _StaticProvider("c", ["https://b.com"]),
+        ],
+        routing=SearchRouting.PARALLEL,
+    )
+
+    (providers,) = router.route(["q"])
+    search_results = router.search("q", providers)
+
+    assert [search_result.url for search_result in search_results] == [
+        "https://b.com",
+        "https://a.com",
+    ]
+
+
+def test_router_needs_a_provider():
+    with pytest.raises(ValueError):
+        SearchRouter([])
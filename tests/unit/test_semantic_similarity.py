@@ -0,0 +1,52 @@
+import numpy as np
+
+from common.semantic_similarity import SemanticSimilarityScorer
+
+
+class _WordBackend:
+    """Stands for an embedding model, a text is tokenized into its words and embedded as its own number of words."""
+
+    name = "words"
+    hidden_size = 2
+
+    def __init__(self):
+        self.batches = []
+
+    def tokenizer(self, inputs, max_length, truncation):
+        return {"input_ids": [text.split()[:max_length] for text in inputs]}
+
+    def encode(self, inputs, normalize_embeddings=True):
+        self.batches.append(inputs)
+        return np.array([[len(text.split()), 1.0] for text in inputs])
+
+
+def test_length_bucketed_batches_keep_the_input_order_and_the_budgets():
+    rng = np.random.default_rng(0)
+    inputs = [
+        " ".join(["word"] * int(length)) for length in rng.integers(1, 60, size=200)
+    ]
+    scorer = SemanticSimilarityScorer(
+        batch_size=8, max_length=50, max_tokens_per_batch=160
+    )
+    scorer._backend = _WordBackend()
+
+    embeddings = scorer.encode(inputs, normalize_embeddings=False)
+
+    np.testing.assert_array_equal(
+        embeddings[:, 0], [len(text.split()) for text in inputs]
+    )
+    batches = scorer._backend.batches
+    assert sum(len(batch) for batch in batches) == len(inputs)
+    for batch in batches:
+        assert len(batch) <= 8
+        padded_size = len(batch) * max(min(len(text.split()), 50) for text in batch)
+        assert len(batch) == 1 or padded_size <= 160
+    # The inputs are bucketed by length, not encoded in their original order
+    assert len(batches) > len(inputs) / 8
+
+
+def test_batches_without_token_budget_follow_the_input_order():
+    scorer = SemanticSimilarityScorer(batch_size=3)
+    scorer._backend = _WordBackend()
+
+    assert scorer.get_batches(["a"] * 7) == [[0, 1, 2], [3, 4, 5], [6]]
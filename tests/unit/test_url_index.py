@@ -0,0 +1,84 @@
+import pytest
+
+from common.types import SearchResult
+from common.url_index import UrlIndex
+from utils.url_utils import normalize_url
+
+
+def result(url: str, weight: float = 1.0, description: str = "") -> SearchResult:
+    return SearchResult(url=url, title=url, description=description, weight=weight)
+
+
+@pytest.mark.parametrize(
+    "url, normalized_url",
+    [
+        ("HTTPS://Example.COM/Page/", "https://example.com/Page"),
+        ("https://example.com:443/a", "https://example.com/a"),
+        ("http://example.com:80/a", "http://example.com/a"),
+        ("http://example.com:8080/a", "http://example.com:8080/a"),
+        ("https://example.com/a#section", "https://example.com/a"),
+        (
+            "https://example.com/a?utm_source=x&id=1&UTM_medium=y",
+            "https://example.com/a?id=1",
+        ),
+        ("https://user@Example.com/a", "https://user@example.com/a"),
+        ("  https://example.com/a  ", "https://example.com/a"),
+        # Malformed ports and URLs are kept as written instead of raising
+        ("http://host:abc/a/", "http://host:abc/a"),
+        ("http://Host:99999/a", "http://Host:99999/a"),
+        ("http://[::1/a", "http://[::1/a"),
+    ],
+)
+def test_normalize_url(url: str, normalized_url: str):
+    assert normalize_url(url) == normalized_url
+
+
+def test_urls_are_deduplicated_by_their_normalized_form():
+    index = UrlIndex()
+
+    assert index.add(result("https://example.com/a/"), source_query="q1")
+    assert not index.add(result("https://EXAMPLE.com/a#top"), source_query="q2")
+    assert index.add("https://example.com/b")
+
+    assert len(index) == 2
+    assert index.urls() == ["https://example.com/a/", "https://example.com/b"]
+    assert "https://example.com/a" in index
+    assert result("https://example.com/b/") in index
+    assert index.get("https://example.com/a").source_queries == ["q1", "q2"]
+
+
+def test_known_urls_keep_their_best_weight_and_first_description():
+    index = UrlIndex()
+    index.add(result("https://example.com/a", weight=0.5))
+    index.add(result("https://example.com/a", weight=2.0, description="first"))
+    index.add(result("https://example.com/a", weight=1.0, description="second"))
+
+    record = index.get("https://example.com/a")
+    assert record.best_weight == 2.0
+    assert record.result.weight == 2.0
+    assert record.result.description == "first"
+
+
+def test_copy_and_merge():
+    index = UrlIndex()
+    index.add(result("https://example.com/a", weight=1.0), source_query="q1")
+    branch = index.copy()
+    branch.add(result("https://example.com/a", weight=3.0), source_query="q2")
+    branch.add(result("https://example.com/b"), source_query="q2")
+
+    assert index.get("https://example.com/a").source_queries == ["q1"]
+    assert len(index) == 1
+
+    index.merge(branch)
+    assert index.urls() == ["https://example.com/a", "https://example.com/b"]
+    assert index.get("https://example.com/a").best_weight == 3.0
+    assert index.get("https://example.com/a").source_queries == ["q1", "q2"]
+
+
+def test_remove():
+    index = UrlIndex()
+    index.extend(["https://example.com/a", "https://example.com/b", "http://host:abc/"])
+
+    index.remove(["https://example.com/a/", "https://unknown.com", "http://host:abc"])
+
+    assert index.urls() == ["https://example.com/b"]
@@ -0,0 +1,38 @@
+from utils.deadline import Deadline
+from utils.url_prefetcher import UrlPrefetcher
+from utils.url_utils import normalize_url
+
+
+class _RecordingFetcher:
+    def __init__(self):
+        self.deadlines = []
+
+    def fetch(self, url, timeout=20, deadline=None):
+        self.deadlines.append(deadline)
+        return f"content of {url}"
+
+
+def test_prefetches_are_bounded_by_the_deadline():
+    page_fetcher = _RecordingFetcher()
+    prefetcher = UrlPrefetcher(page_fetcher=page_fetcher)
+    deadline = Deadline(seconds=60)
+
+    prefetcher.prefetch(["https://a.org"], deadline=deadline)
+
+    assert prefetcher.pop("https://a.org").result() == "content of https://a.org"
+    assert page_fetcher.deadlines == [deadline]
+
+
+def test_pages_never_visited_are_counted_as_waste():
+    prefetcher = UrlPrefetcher(max_cached_pages=1, page_fetcher=_RecordingFetcher())
+
+    prefetcher.prefetch(["https://a.org"])
+    prefetcher.pop("https://a.org").result()
+    prefetcher.prefetch(["https://b.org"])
+    prefetcher._pages[normalize_url("https://b.org")].result()
+    # b.org is complete when c.org evicts it, its waste is added by the thread evicting it
+    prefetcher.prefetch(["https://c.org"])
+
+    assert prefetcher.wasted_bytes == len("content of https://b.org")
+    prefetcher.clear()
+    assert prefetcher.wasted_bytes == 0
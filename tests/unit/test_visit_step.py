@@ -0,0 +1,61 @@
+import threading
+from concurrent.futures import Future
+
+from common.types import ResearchState
+from deep_research.visit_step import VisitStep
+from utils.deadline import Deadline
+
+
+class _Prefetcher:
+    def __init__(self, future: Future):
+        self.future = future
+
+    def pop(self, url):
+        return self.future
+
+
+class _PageFetcher:
+    def __init__(self):
+        self.urls = []
+
+    def fetch(self, url, timeout=20, deadline=None):
+        self.urls.append(url)
+        return f"content of {url}"
+
+
+def visit_step(future: Future, deadline: Deadline) -> VisitStep:
+    state = ResearchState(user_query="q")
+    state.deadline = deadline
+    return VisitStep(
+        state=state,
+        urls=[],
+        cherry_picker=None,
+        prefetcher=_Prefetcher(future),
+        page_fetcher=_PageFetcher(),
+    )
+
+
+def test_prefetched_content_is_used():
+    future = Future()
+    future.set_result("prefetched content")
+    step = visit_step(future, Deadline())
+
+    assert step.fetch_url("https://a.org") == "prefetched content"
+    assert step.page_fetcher.urls == []
+
+
+def test_stuck_prefetch_falls_back_to_a_direct_fetch():
+    # The prefetch never completes, the visit waits for it no longer than the deadline allows
+    step = visit_step(
+        Future(), Deadline(seconds=1.3, reserve_share=0.0, min_timeout=0.1)
+    )
+    fetched = threading.Event()
+
+    def fetch_url():
+        assert step.fetch_url("https://a.org") == "content of https://a.org"
+        fetched.set()
+
+    threading.Thread(target=fetch_url, daemon=True).start()
+
+    assert fetched.wait(timeout=5)
+    assert step.page_fetcher.urls == ["https://a.org"]